@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+# Copyright (C) 2018 Space Science and Engineering Center (SSEC),
+# University of Wisconsin-Madison.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# This file is part of the polar2grid software package. Polar2grid takes
+# satellite observation data, remaps it, and writes it to a file format for
+#     input into another program.
+# Documentation: http://www.ssec.wisc.edu/software/polar2grid/
+#
+# Written by David Hoese    November 2018
+# University of Wisconsin-Madison
+# Space Science and Engineering Center
+# 1225 West Dayton Street
+# Madison, WI  53706
+# david.hoese@ssec.wisc.edu
+"""Benchmarks for the Polar2Grid remapping kernels.
+
+The benchmarks are written for `airspeed velocity <https://asv.readthedocs.io/>`_
+(see ``asv.conf.json`` in the root of the repository) so results are stored as
+JSON and can be compared between versions with ``asv compare``. They can also be
+run without asv::
+
+    python -m benchmarks.run -o results.json
+
+Swaths are generated by :mod:`benchmarks.synthetic`. Set the ``P2G_BENCH_SIZE``
+environment variable to the fraction of a full granule to generate (default 0.5).
+
+:author:       David Hoese (davidh)
+:contact:      david.hoese@ssec.wisc.edu
+:organization: Space Science and Engineering Center (SSEC)
+:copyright:    Copyright (c) 2018 University of Wisconsin SSEC. All rights reserved.
+:date:         Nov 2018
+:license:      GNU GPLv3
+
+"""
+__docformat__ = "restructuredtext en"
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+# Copyright (C) 2018 Space Science and Engineering Center (SSEC),
+# University of Wisconsin-Madison.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# This file is part of the polar2grid software package. Polar2grid takes
+# satellite observation data, remaps it, and writes it to a file format for
+#     input into another program.
+# Documentation: http://www.ssec.wisc.edu/software/polar2grid/
+#
+# Written by David Hoese    November 2018
+# University of Wisconsin-Madison
+# Space Science and Engineering Center
+# 1225 West Dayton Street
+# Madison, WI  53706
+# david.hoese@ssec.wisc.edu
+"""Benchmarks for ll2cr, EWA, and nearest neighbor remapping of synthetic swaths.
+
+Every benchmark has a ``time_`` and a ``peakmem_`` version. Peak memory is the
+maximum resident set size of the process running the benchmark, including its
+setup.
+
+:author:       David Hoese (davidh)
+:contact:      david.hoese@ssec.wisc.edu
+:organization: Space Science and Engineering Center (SSEC)
+:copyright:    Copyright (c) 2018 University of Wisconsin SSEC. All rights reserved.
+:date:         Nov 2018
+:license:      GNU GPLv3
+
+"""
+__docformat__ = "restructuredtext en"
+
+import os
+import shutil
+import tempfile
+
+from polar2grid.core.containers import GridDefinition
+from polar2grid.remap import ll2cr, fornav
+from polar2grid.remap.remap import Remapper
+
+from benchmarks.synthetic import INSTRUMENTS, create_swath, create_swath_scene
+
+LATLONG = "+proj=latlong +datum=WGS84 +ellps=WGS84 +no_defs"
+LCC = "+proj=lcc +datum=WGS84 +ellps=WGS84 +lat_0=25 +lat_1=25 +lon_0=-95 +units=m +no_defs"
+POLAR = "+proj=stere +datum=WGS84 +ellps=WGS84 +lat_0=90 +lat_ts=60.0 +lon_0=-150 +units=m"
+# dynamic grids have their extents computed from the swath
+DYNAMIC_GRIDS = {
+    "wgs84_fit": (LATLONG, 0.0057, -0.0057),
+    "lcc_fit": (LCC, 1000.0, -1000.0),
+    "polar_fit": (POLAR, 1000.0, -1000.0),
+}
+# static grids are the same as a dynamic grid that fits the swath
+STATIC_GRIDS = {
+    "latlong": "wgs84_fit",
+    "lcc": "lcc_fit",
+    "polar": "polar_fit",
+}
+# every nth swath pixel is used to size static grids to the swath
+STATIC_GRID_STRIDE = 8
+
+
+def get_grid_definition(grid_name, lon_arr, lat_arr):
+    """Get a new grid definition for one of the benchmark grids.
+
+    Static grids are sized to a subsample of the swath.
+    """
+    if grid_name in STATIC_GRIDS:
+        grid_def = get_grid_definition(STATIC_GRIDS[grid_name], lon_arr, lat_arr)
+        ll2cr.ll2cr(lon_arr[::STATIC_GRID_STRIDE, ::STATIC_GRID_STRIDE].copy(),
+                    lat_arr[::STATIC_GRID_STRIDE, ::STATIC_GRID_STRIDE].copy(), grid_def)
+        grid_def["grid_name"] = grid_name
+        return grid_def
+    proj4_str, cell_width, cell_height = DYNAMIC_GRIDS[grid_name]
+    return GridDefinition(grid_name=grid_name, proj4_definition=proj4_str, width=None, height=None,
+                          origin_x=None, origin_y=None, cell_width=cell_width, cell_height=cell_height)
+
+
+class LL2CR(object):
+    """Map swath longitude and latitude to grid columns and rows."""
+    params = (sorted(INSTRUMENTS), sorted(DYNAMIC_GRIDS) + sorted(STATIC_GRIDS))
+    param_names = ["instrument", "grid"]
+    number = 1
+    repeat = 3
+    timeout = 300
+
+    def setup(self, instrument, grid_name):
+        # ll2cr works in place so every run needs new arrays
+        self.lon_arr, self.lat_arr, _ = create_swath(instrument)
+        self.grid_def = get_grid_definition(grid_name, self.lon_arr, self.lat_arr)
+
+    def time_ll2cr(self, instrument, grid_name):
+        ll2cr.ll2cr(self.lon_arr, self.lat_arr, self.grid_def)
+
+    def peakmem_ll2cr(self, instrument, grid_name):
+        ll2cr.ll2cr(self.lon_arr, self.lat_arr, self.grid_def)
+
+
+class EWA(object):
+    """Resample 1, 5, or 20 channels with elliptical weighted averaging."""
+    params = (sorted(INSTRUMENTS), [1, 5, 20], sorted(STATIC_GRIDS))
+    param_names = ["instrument", "channels", "grid"]
+    number = 1
+    repeat = 3
+    timeout = 600
+
+    def setup(self, instrument, channels, grid_name):
+        swath_scene = create_swath_scene(instrument, num_products=channels)
+        product_names = sorted(swath_scene.keys())
+        swath_def = swath_scene[product_names[0]]["swath_definition"]
+        self.grid_def = get_grid_definition(grid_name, swath_def["longitude"], swath_def["latitude"])
+        self.cols_array = swath_def["longitude"].copy()
+        self.rows_array = swath_def["latitude"].copy()
+        ll2cr.ll2cr(self.cols_array, self.rows_array, self.grid_def)
+        self.input_arrays = [swath_scene[pn]["swath_data"] for pn in product_names]
+        # same as the Remapper, one row per scan is processed as one large scan
+        self.rows_per_scan = swath_def["rows_per_scan"]
+        if self.rows_per_scan < 2:
+            self.rows_per_scan = swath_def["swath_rows"]
+        self.fornav_D = Remapper()._fornav_D(swath_def, self.grid_def)
+
+    def _fornav(self):
+        fornav.fornav(self.cols_array, self.rows_array, self.rows_per_scan, self.input_arrays,
+                      grid_cols=self.grid_def["width"], grid_rows=self.grid_def["height"],
+                      weight_delta_max=self.fornav_D, use_group_size=True)
+
+    def time_fornav(self, instrument, channels, grid_name):
+        self._fornav()
+
+    def peakmem_fornav(self, instrument, channels, grid_name):
+        self._fornav()
+
+
+class Nearest(object):
+    """Resample 5 channels with the Remapper's nearest neighbor methods."""
+    params = (sorted(INSTRUMENTS), ["nearest", "nearest_grid"], sorted(STATIC_GRIDS))
+    param_names = ["instrument", "method", "grid"]
+    number = 1
+    repeat = 3
+    timeout = 600
+
+    def setup(self, instrument, method, grid_name):
+        # anything that doesn't fit in memory is written to the current directory
+        self.orig_dir = os.getcwd()
+        self.work_dir = tempfile.mkdtemp(prefix="p2g_bench_")
+        os.chdir(self.work_dir)
+        self.swath_scene = create_swath_scene(instrument, num_products=5)
+        swath_def = self.swath_scene[sorted(self.swath_scene.keys())[0]]["swath_definition"]
+        self.grid_def = get_grid_definition(grid_name, swath_def["longitude"], swath_def["latitude"])
+        self.remapper = Remapper(in_memory=True)
+        # only time the resampling
+        self.remapper.run_ll2cr(swath_def, self.grid_def)
+
+    def teardown(self, instrument, method, grid_name):
+        os.chdir(self.orig_dir)
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def _remap(self, method):
+        self.remapper._remap_scene_nearest(self.swath_scene, self.grid_def, use_kdtree=method == "nearest",
+                                           grid_coverage=0)
+
+    def time_remap_scene_nearest(self, instrument, method, grid_name):
+        self._remap(method)
+
+    def peakmem_remap_scene_nearest(self, instrument, method, grid_name):
+        self._remap(method)
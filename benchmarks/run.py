@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+# Copyright (C) 2018 Space Science and Engineering Center (SSEC),
+# University of Wisconsin-Madison.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# This file is part of the polar2grid software package. Polar2grid takes
+# satellite observation data, remaps it, and writes it to a file format for
+#     input into another program.
+# Documentation: http://www.ssec.wisc.edu/software/polar2grid/
+#
+# Written by David Hoese    November 2018
+# University of Wisconsin-Madison
+# Space Science and Engineering Center
+# 1225 West Dayton Street
+# Madison, WI  53706
+# david.hoese@ssec.wisc.edu
+"""Run the remapping benchmarks without airspeed velocity and save the results as JSON.
+
+Every benchmark is run in a new process so the peak memory of one benchmark
+doesn't affect another. Results from two versions can be compared with::
+
+    python -m benchmarks.run -o old.json
+    python -m benchmarks.run -o new.json
+    python -m benchmarks.run --compare old.json new.json
+
+:author:       David Hoese (davidh)
+:contact:      david.hoese@ssec.wisc.edu
+:organization: Space Science and Engineering Center (SSEC)
+:copyright:    Copyright (c) 2018 University of Wisconsin SSEC. All rights reserved.
+:date:         Nov 2018
+:license:      GNU GPLv3
+
+"""
+__docformat__ = "restructuredtext en"
+
+import sys
+
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import re
+import resource
+import subprocess
+import timeit
+from datetime import datetime
+
+from benchmarks import remap_benchmarks
+from benchmarks.synthetic import DEFAULT_SIZE
+
+LOG = logging.getLogger(__name__)
+BENCHMARK_PREFIXES = ("time_", "peakmem_")
+
+
+def benchmark_cases(module=remap_benchmarks):
+    """Iterate over (benchmark name, class, method name, parameters) for every benchmark in `module`."""
+    for cls_name in sorted(dir(module)):
+        cls = getattr(module, cls_name)
+        if not isinstance(cls, type) or cls.__module__ != module.__name__:
+            continue
+        params = getattr(cls, "params", ())
+        if params and not isinstance(params[0], (list, tuple)):
+            params = (params,)
+        for method_name in sorted(dir(cls)):
+            if not method_name.startswith(BENCHMARK_PREFIXES):
+                continue
+            for param_values in itertools.product(*params):
+                name = "%s.%s(%s)" % (cls_name, method_name, ", ".join(str(p) for p in param_values))
+                yield name, cls, method_name, param_values
+
+
+def _peak_rss():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # linux reports kilobytes, mac reports bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _run_case(cls, method_name, param_values):
+    """Run one benchmark case, this is run in a new process."""
+    bench = cls()
+    method = getattr(bench, method_name)
+    repeat = getattr(cls, "repeat", 1) if method_name.startswith("time_") else 1
+    results = []
+    for _ in range(repeat):
+        if hasattr(bench, "setup"):
+            bench.setup(*param_values)
+        try:
+            start = timeit.default_timer()
+            method(*param_values)
+            results.append(timeit.default_timer() - start)
+        finally:
+            if hasattr(bench, "teardown"):
+                bench.teardown(*param_values)
+    if method_name.startswith("peakmem_"):
+        return _peak_rss()
+    return min(results)
+
+
+def run_benchmarks(pattern=None):
+    """Run every benchmark matching the regular expression `pattern` in its own process.
+
+    :returns: dictionary of benchmark name to result (seconds or bytes), None if the benchmark failed
+    """
+    ctx = multiprocessing.get_context("spawn")
+    results = {}
+    for name, cls, method_name, param_values in benchmark_cases():
+        if pattern and not re.search(pattern, name):
+            continue
+        LOG.info("Running %s", name)
+        with ctx.Pool(1) as pool:
+            try:
+                results[name] = pool.apply(_run_case, (cls, method_name, param_values))
+            except Exception:
+                LOG.error("Benchmark %s failed", name, exc_info=True)
+                results[name] = None
+        LOG.info("%s: %s", name, results[name])
+    return results
+
+
+def _git_version():
+    try:
+        return subprocess.check_output(["git", "describe", "--always", "--dirty"],
+                                       cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare_results(old_fn, new_fn):
+    """Print the ratio of new to old results for benchmarks in both files."""
+    with open(old_fn, "r") as old_file, open(new_fn, "r") as new_file:
+        old = json.load(old_file)
+        new = json.load(new_file)
+    print("%-70s %12s %12s %8s" % ("benchmark", old["version"], new["version"], "ratio"))
+    for name in sorted(set(old["results"]) & set(new["results"])):
+        old_result = old["results"][name]
+        new_result = new["results"][name]
+        if not old_result or new_result is None:
+            continue
+        print("%-70s %12.4g %12.4g %8.2f" % (name, old_result, new_result, new_result / old_result))
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Run the remapping benchmarks and save the results as JSON")
+    parser.add_argument("-b", "--bench", dest="pattern", default=None,
+                        help="Only run benchmarks whose name matches this regular expression")
+    parser.add_argument("-o", "--output", default="benchmark_results.json",
+                        help="JSON file to write the results to (default: benchmark_results.json)")
+    parser.add_argument("--list", action="store_true", help="List the benchmarks and exit")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"),
+                        help="Compare two result files instead of running benchmarks")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
+
+    if args.compare:
+        compare_results(*args.compare)
+        return 0
+    if args.list:
+        for name, _, _, _ in benchmark_cases():
+            print(name)
+        return 0
+
+    results = run_benchmarks(args.pattern)
+    output = {
+        "version": _git_version(),
+        "date": datetime.utcnow().isoformat(),
+        "machine": platform.node(),
+        "python": platform.python_version(),
+        "size": DEFAULT_SIZE,
+        "results": results,
+    }
+    with open(args.output, "w") as output_file:
+        json.dump(output, output_file, indent=4, sort_keys=True)
+    LOG.info("Saved results to '%s'", args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+# Copyright (C) 2018 Space Science and Engineering Center (SSEC),
+# University of Wisconsin-Madison.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# This file is part of the polar2grid software package. Polar2grid takes
+# satellite observation data, remaps it, and writes it to a file format for
+#     input into another program.
+# Documentation: http://www.ssec.wisc.edu/software/polar2grid/
+#
+# Written by David Hoese    November 2018
+# University of Wisconsin-Madison
+# Space Science and Engineering Center
+# 1225 West Dayton Street
+# Madison, WI  53706
+# david.hoese@ssec.wisc.edu
+"""Synthetic swaths for benchmarking the remapping kernels.
+
+Swaths are generated from a simple model of a cross-track scanning radiometer
+on a circular polar orbit over a spherical earth. Each scan of the mirror
+observes ``rows_per_scan`` rows at once and the along-track footprint of a scan
+grows with the distance from the satellite to the ground, so the edges of
+neighboring scans overlap like the "bow-tie" effect in real VIIRS and MODIS
+data. Instruments with one row per scan (AVHRR) have no bow-tie.
+
+:author:       David Hoese (davidh)
+:contact:      david.hoese@ssec.wisc.edu
+:organization: Space Science and Engineering Center (SSEC)
+:copyright:    Copyright (c) 2018 University of Wisconsin SSEC. All rights reserved.
+:date:         Nov 2018
+:license:      GNU GPLv3
+
+"""
+__docformat__ = "restructuredtext en"
+
+import os
+from datetime import datetime
+
+import numpy
+
+from polar2grid.core.containers import SwathDefinition, SwathProduct, SwathScene
+
+EARTH_RADIUS = 6371.0
+# approximate sizes of a single granule of data from each instrument
+# resolution is the nadir resolution in km, max_scan_angle in degrees, and altitude in km
+INSTRUMENTS = {
+    "viirs": dict(columns=3200, rows_per_scan=16, scans=48, resolution=0.742,
+                  max_scan_angle=56.06, altitude=829.0),
+    "modis": dict(columns=1354, rows_per_scan=10, scans=203, resolution=1.0,
+                  max_scan_angle=55.0, altitude=705.0),
+    "avhrr": dict(columns=2048, rows_per_scan=1, scans=1080, resolution=1.1,
+                  max_scan_angle=55.37, altitude=833.0),
+}
+# fraction of a granule to generate by default
+DEFAULT_SIZE = float(os.environ.get("P2G_BENCH_SIZE", 0.5))
+# default start of the ground track, a northbound pass over western North America
+DEFAULT_START = (-120.0, 35.0)
+DEFAULT_HEADING = -10.0
+
+
+def _unit_vector(lon, lat):
+    lon = numpy.radians(lon)
+    lat = numpy.radians(lat)
+    return numpy.array([numpy.cos(lat) * numpy.cos(lon), numpy.cos(lat) * numpy.sin(lon), numpy.sin(lat)])
+
+
+def scan_geometry(columns, max_scan_angle, altitude):
+    """Earth central angle and slant range (km) for every column of a scan.
+
+    :returns: tuple(central_angle, slant_range) with negative central angles on the left of the ground track
+    """
+    look_angle = numpy.radians(numpy.linspace(-max_scan_angle, max_scan_angle, columns))
+    central_angle = numpy.arcsin((EARTH_RADIUS + altitude) / EARTH_RADIUS * numpy.sin(look_angle)) - look_angle
+    with numpy.errstate(invalid="ignore", divide="ignore"):
+        slant_range = numpy.where(look_angle == 0, altitude,
+                                  EARTH_RADIUS * numpy.sin(central_angle) / numpy.sin(look_angle))
+    return central_angle, slant_range
+
+
+def create_swath(instrument="viirs", size=DEFAULT_SIZE, columns=None, start=DEFAULT_START,
+                 heading=DEFAULT_HEADING, dtype=numpy.float32):
+    """Create longitude and latitude arrays for a swath from `instrument`.
+
+    :param instrument: Name of the instrument to model (see `INSTRUMENTS`)
+    :param size: Number of scans as a fraction of a full granule (at least 2 scans are made)
+    :param columns: Number of columns per row if different from the instrument's
+    :param start: (longitude, latitude) of the first scan on the ground track
+    :param heading: Direction of the ground track at `start` in degrees clockwise from north
+    :returns: tuple(lon_arr, lat_arr, info) where info has the swath's 'rows_per_scan',
+              'nadir_resolution' and 'limb_resolution' (meters)
+    """
+    params = INSTRUMENTS[instrument]
+    rows_per_scan = params["rows_per_scan"]
+    columns = columns or params["columns"]
+    num_scans = max(int(round(params["scans"] * size)), 2)
+    resolution = params["resolution"]
+    # adjust the resolution so fewer columns still cover the whole swath
+    resolution *= params["columns"] / float(columns)
+
+    central_angle, slant_range = scan_geometry(columns, params["max_scan_angle"], params["altitude"])
+    # every detector's along-track offset from the center of its scan grows with the slant range (bow-tie)
+    detector_offset = (numpy.arange(rows_per_scan) - (rows_per_scan - 1) / 2.0) * resolution
+    scan_center = (numpy.arange(num_scans) + 0.5) * rows_per_scan * resolution
+    along_track = (scan_center[:, None, None] +
+                   detector_offset[None, :, None] * (slant_range / params["altitude"])[None, None, :])
+    along_track = along_track.reshape((num_scans * rows_per_scan, columns)) / EARTH_RADIUS
+    across_track = numpy.broadcast_to(central_angle, along_track.shape)
+
+    # position on the earth from the great circle of the ground track
+    origin = _unit_vector(*start)
+    north = numpy.array([0.0, 0.0, 1.0])
+    east = numpy.cross(north, origin)
+    east /= numpy.linalg.norm(east)
+    north = numpy.cross(origin, east)
+    direction = numpy.cos(numpy.radians(heading)) * north + numpy.sin(numpy.radians(heading)) * east
+    normal = numpy.cross(direction, origin)
+    track = (origin[:, None, None] * numpy.cos(along_track) + direction[:, None, None] * numpy.sin(along_track))
+    points = track * numpy.cos(across_track) + normal[:, None, None] * numpy.sin(across_track)
+    lon_arr = numpy.degrees(numpy.arctan2(points[1], points[0])).astype(dtype)
+    lat_arr = numpy.degrees(numpy.arcsin(numpy.clip(points[2], -1, 1))).astype(dtype)
+
+    limb_resolution = EARTH_RADIUS * abs(central_angle[-1] - central_angle[-2]) * 1000.0
+    info = {
+        "rows_per_scan": rows_per_scan,
+        "nadir_resolution": resolution * 1000.0,
+        "limb_resolution": float(max(limb_resolution, resolution * slant_range[-1] / params["altitude"] * 1000.0)),
+    }
+    return lon_arr, lat_arr, info
+
+
+def create_swath_scene(instrument="viirs", num_products=1, size=DEFAULT_SIZE, **kwargs):
+    """Create a `SwathScene` with `num_products` in-memory products on a synthetic swath.
+
+    Product data is a smooth field that is different for every product. See `create_swath` for other keywords.
+    """
+    lon_arr, lat_arr, info = create_swath(instrument, size=size, **kwargs)
+    rows, cols = lon_arr.shape
+    swath_def = SwathDefinition(swath_name="%s_%dx%d" % (instrument, rows, cols), longitude=lon_arr,
+                                latitude=lat_arr, data_type=lon_arr.dtype, swath_rows=rows, swath_columns=cols,
+                                fill_value=numpy.nan, **info)
+    swath_scene = SwathScene()
+    for idx in range(num_products):
+        product_name = "%s_band%02d" % (instrument, idx + 1)
+        data = (numpy.sin(numpy.radians(lon_arr) * (idx + 2)) * numpy.cos(numpy.radians(lat_arr) * (idx + 3)))
+        swath_scene[product_name] = SwathProduct(
+            product_name=product_name, satellite="synthetic", instrument=instrument,
+            begin_time=datetime(2018, 11, 1), end_time=datetime(2018, 11, 1), data_type=numpy.float32,
+            swath_data=data.astype(numpy.float32), swath_definition=swath_def, fill_value=numpy.nan,
+            swath_rows=rows, swath_columns=cols, rows_per_scan=info["rows_per_scan"])
+    return swath_scene
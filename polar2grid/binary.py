@@ -53,9 +53,11 @@ class Backend(roles.BackendRole):
 
     Rescale configuration files are only used for non-float data types.
     """
-    def __init__(self, rescale_configs=None, **kwargs):
+    def __init__(self, rescale_configs=None, block_rows=None, **kwargs):
         self.rescale_configs = rescale_configs or [DEFAULT_RCONFIG]
         self.rescaler = Rescaler(*self.rescale_configs)
+        # rescale and write this many rows at a time instead of whole products
+        self.block_rows = block_rows
         super(Backend, self).__init__(**kwargs)
 
     @property
@@ -91,19 +93,23 @@ class Backend(roles.BackendRole):
             else:
                 LOG.warning("Geotiff file already exists, will overwrite: %s", output_filename)
 
+        lazy_kwargs = {"lazy": True, "chunk_rows": self.block_rows} if self.block_rows else {}
         # if we have a floating point data type, then scaling doesn't make much sense
         if data_type == gridded_product["data_type"] and same_fill:
             LOG.info("Saving product %s to binary file %s", gridded_product["product_name"], output_filename)
-            shutil.copyfile(gridded_product["grid_data"], output_filename)
+            if isinstance(gridded_product["grid_data"], str):
+                shutil.copyfile(gridded_product["grid_data"], output_filename)
+            else:
+                gridded_product["grid_data"].tofile(output_filename)
             return output_filename
         elif numpy.issubclass_(data_type, numpy.floating):
             # we didn't rescale any data, but we need to convert it
-            data = gridded_product.get_data_array()
+            data = gridded_product.get_data_array(**lazy_kwargs)
         else:
             try:
                 LOG.debug("Scaling %s data to fit data type", gridded_product["product_name"])
                 data = self.rescaler.rescale_product(gridded_product, data_type,
-                                                     inc_by_one=inc_by_one, fill_value=fill_value)
+                                                     inc_by_one=inc_by_one, fill_value=fill_value, **lazy_kwargs)
                 data = clip_to_data_type(data, data_type)
             except ValueError:
                 if not self.keep_intermediate and os.path.isfile(output_filename):
@@ -111,10 +117,19 @@ class Backend(roles.BackendRole):
                 raise
 
         LOG.info("Saving product %s to binary file %s", gridded_product["product_name"], output_filename)
-        data = data.astype(data_type)
-        fill_mask = gridded_product.get_data_mask()
-        data[fill_mask] = fill_value
-        data.tofile(output_filename)
+        if isinstance(data, numpy.ndarray):
+            data = data.astype(data_type)
+            fill_mask = gridded_product.get_data_mask()
+            data[fill_mask] = fill_value
+            data.tofile(output_filename)
+        else:
+            # dask array, computed and written one block at a time
+            import dask.array as da
+            fill_mask = gridded_product.get_data_mask(**lazy_kwargs)
+            data = da.where(fill_mask, fill_value, data.astype(data_type)).astype(data_type)
+            output_data = numpy.memmap(output_filename, dtype=data_type, mode="w+", shape=data.shape)
+            da.store(data, output_data)
+            output_data.flush()
 
         return output_filename
 
@@ -124,6 +139,9 @@ def add_backend_argument_groups(parser):
     group = parser.add_argument_group(title="Backend Initialization")
     group.add_argument('--rescale-configs', nargs="*", dest="rescale_configs",
                        help="alternative rescale configuration files")
+    group.add_argument('--block-rows', dest="block_rows", type=int, default=None,
+                       help="rescale and write products this many rows at a time using multiple threads "
+                            "(default: entire product at once)")
     group = parser.add_argument_group(title="Backend Output Creation")
     group.add_argument("--output-pattern", default=DEFAULT_OUTPUT_PATTERN,
                        help="output filenaming pattern")
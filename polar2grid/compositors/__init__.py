@@ -209,7 +209,8 @@ def main(argv=sys.argv[1:]):
     if args.output_filename is None:
         stem, ext = os.path.splitext(args.scene)
         args.output_filename = stem + "_composite" + ext
-    scene.save(args.output_filename)
+    scene.save(args.output_filename, intermediate_format=args.intermediate_format,
+               compression=args.intermediate_compression)
 
 if __name__ == "__main__":
     sys.exit(main())
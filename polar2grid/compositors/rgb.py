@@ -95,10 +95,23 @@ import numpy as np
 import os
 
 from polar2grid.core import roles
+from polar2grid.core.containers import unpack_mask
 
 LOG = logging.getLogger(__name__)
 
 
+def combine_masks(gridded_scene, product_names):
+    """Get the mask of pixels that are invalid in any of the products.
+
+    The cached bit-packed masks of the products are combined so a product's data is only read if its
+    mask hasn't been computed yet.
+    """
+    product_names = list(product_names)
+    shape = gridded_scene[product_names[0]].get_data_array().shape
+    packed_mask = np.bitwise_or.reduce([gridded_scene[pname].get_packed_data_mask() for pname in product_names])
+    return unpack_mask(packed_mask, shape)
+
+
 class CreflRGBSharpenCompositor(roles.CompositorRole):
     """Compositor filter that sharpens all other products based on the ratio of a high resolution product to a low
     resolution product.
@@ -113,6 +126,8 @@ class CreflRGBSharpenCompositor(roles.CompositorRole):
         self.hires_products = lores_products if not isinstance(hires_products, str) else hires_products.split(",")
 
     def shared_mask(self, gridded_scene, product_names, axis=0):
+        if axis == 0:
+            return combine_masks(gridded_scene, product_names)
         return np.any([gridded_scene[pname].get_data_mask() for pname in product_names], axis=axis)
 
     def _get_first_available_product(self, gridded_scene, desired_products):
@@ -143,6 +158,9 @@ class CreflRGBSharpenCompositor(roles.CompositorRole):
                 # mask the hires product then update the product
                 lores_data[shared_mask] = fill_value
                 hires_data[shared_mask] = fill_value
+                # the masks cached while creating the shared mask are out of date now
+                gridded_scene[lores_product_name].clear_mask_cache()
+                gridded_scene[hires_product_name].clear_mask_cache()
             else:
                 shared_mask = None
 
@@ -217,10 +235,18 @@ class RGBCompositor(roles.CompositorRole):
             self.composite_products = self.composite_products.split(",")
         super(RGBCompositor, self).__init__(**kwargs)
 
-    def shared_mask(self, gridded_scene, product_names, axis=0):
+    def shared_mask(self, gridded_scene, product_names, axis=0, lazy=False):
+        if lazy:
+            import dask.array as da
+            return da.stack([gridded_scene[pname].get_data_mask(lazy=True) for pname in product_names]).any(axis=axis)
+        if axis == 0:
+            return combine_masks(gridded_scene, product_names)
         return np.any([gridded_scene[pname].get_data_mask() for pname in product_names], axis=axis)
 
-    def joined_array(self, gridded_scene, product_names):
+    def joined_array(self, gridded_scene, product_names, lazy=False):
+        if lazy:
+            import dask.array as da
+            return da.stack([gridded_scene[pname].get_data_array(lazy=True) for pname in product_names])
         return np.array([gridded_scene[pname].get_data_array() for pname in product_names])
 
     def modify_scene(self, gridded_scene, fill_value=None, **kwargs):
@@ -242,12 +268,15 @@ class RGBCompositor(roles.CompositorRole):
         fn = "grid_{}_{}.dat".format(grid_name, self.composite_name)
 
         try:
-            comp_data = self.joined_array(gridded_scene, self.composite_products)
+            # bands are joined and masked one block of rows at a time while writing the composite
+            import dask.array as da
+            comp_data = self.joined_array(gridded_scene, self.composite_products, lazy=True)
 
             if self.share_mask:
-                comp_data[:, self.shared_mask(gridded_scene, self.composite_products)] = fill_value
+                shared_mask = self.shared_mask(gridded_scene, self.composite_products, lazy=True)
+                comp_data = da.where(shared_mask, fill_value, comp_data).astype(comp_data.dtype)
 
-            comp_data.tofile(fn)
+            da.store(comp_data, np.memmap(fn, dtype=comp_data.dtype, mode="w+", shape=comp_data.shape))
             gridded_scene[self.composite_name] = self._create_gridded_product(self.composite_name, fn, base_product=base_product,
                                                                               data_kind=self.composite_data_kind)
         except (ValueError, KeyError):
@@ -45,15 +45,34 @@ import json
 import shutil
 import logging
 from datetime import datetime
+from functools import lru_cache
 
 import numpy
 
 from polar2grid.core.time_utils import iso8601
 from polar2grid.core.dtype import str_to_dtype, dtype_to_str
 from polar2grid.core.proj import Proj
+from polar2grid.core.scene_store import (STORE_EXTENSIONS, StoreArray, is_store_path, is_scene_store,
+                                         open_store_array, copy_store_array, save_scene_store, load_scene_store)
+from polar2grid.core.packed_metadata import (PACKED_EXTENSIONS, is_packed_metadata, save_packed_metadata,
+                                             load_packed_metadata)
 
 
 LOG = logging.getLogger(__name__)
+# number of rows in each block of a lazy (dask) product array
+LAZY_CHUNK_ROWS = 1024
+# default filename extension for each format of saved P2G objects
+INTERMEDIATE_EXTENSIONS = {
+    "json": ".json",
+    "hdf5": STORE_EXTENSIONS[0],
+    "msgpack": PACKED_EXTENSIONS[0],
+}
+# bit-packed validity masks are saved next to flat binary files with this suffix
+MASK_SUFFIX = ".mask"
+# Linux ioctl request to clone (reflink) a file on copy-on-write filesystems (btrfs, xfs)
+FICLONE = 0x40049409
+# save computed validity masks to disk so other processes using the same files can reuse them
+PERSIST_MASKS = os.getenv("P2G_PERSIST_MASKS", "0").lower() in ("1", "true", "yes")
 
 
 # FUTURE: Add a register function to register custom P2G objects so no imports and short __class__ names
@@ -63,6 +82,7 @@ class P2GJSONDecoder(json.JSONDecoder):
         super(P2GJSONDecoder, self).__init__(object_hook=self.dict_to_object, **kwargs)
 
     @staticmethod
+    @lru_cache(maxsize=None)
     def _jsonclass_to_pyclass(json_class_name):
         import importlib
         cls_name = json_class_name.split(".")[-1]
@@ -240,6 +260,7 @@ class BaseP2GObject(dict):
             if kw in self and isinstance(self[kw], str):
                 # Do we not want to delete this file because someone tried to save the state of this object
                 if hasattr(self, "persist") and not self.persist:
+                    remove_mask_file(self[kw])
                     try:
                         # LOG.debug("Removing associated file that is no longer needed: '%s'", self[kw])
                         os.remove(self[kw])
@@ -281,19 +302,25 @@ class BaseP2GObject(dict):
 
     @classmethod
     def load(cls, filename, object_class=None):
-        """Open a JSON file representing a Polar2Grid object.
+        """Open a JSON file, packed metadata file, or scene store representing a Polar2Grid object.
         """
         # Allow the caller to specify the preferred object class if one is not specified in the JSON
         if object_class is None:
             object_class = cls
-        if isinstance(filename, str):
-            # we are dealing with a string filename
-            file_obj = open(filename, "r")
+        if is_scene_store(filename):
+            # we are dealing with a single file HDF5 store
+            inst = load_scene_store(filename)
+        elif is_packed_metadata(filename):
+            # we are dealing with binary (msgpack) metadata
+            inst = load_packed_metadata(filename)
         else:
-            # we are dealing with a file-like object
-            file_obj = filename
-
-        inst = json.load(file_obj, cls=P2GJSONDecoder)
+            if isinstance(filename, str):
+                # we are dealing with a string filename
+                file_obj = open(filename, "r")
+            else:
+                # we are dealing with a file-like object
+                file_obj = filename
+            inst = json.load(file_obj, cls=P2GJSONDecoder)
 
         if not isinstance(inst, object_class):
             # Need to tell the class that we are loading something from a file so it can take care of persist and such
@@ -316,9 +343,25 @@ class BaseP2GObject(dict):
                 LOG.debug("Reinitializing child {} to {}".format(child_key, child_type.__name__))
                 self[child_key] = child_type(**self[child_key])
 
-    def save(self, filename):
+    def save(self, filename, intermediate_format=None, compression=None):
         """Write the JSON representation of this class to a file.
+
+        :param intermediate_format: 'json' for a JSON file referencing flat binary files, 'msgpack' for a
+                                    compact binary version of the JSON file, or 'hdf5' for a single file
+                                    scene store (default is determined by the filename extension)
+        :param compression: Compression for arrays in a scene store (see `polar2grid.core.scene_store`)
         """
+        if intermediate_format is None:
+            intermediate_format = intermediate_format_from_filename(filename)
+        if intermediate_format == "hdf5":
+            save_scene_store(self, filename, compression=compression)
+            return
+        elif intermediate_format == "msgpack":
+            save_packed_metadata(self, filename)
+            return
+        elif intermediate_format != "json":
+            raise ValueError("Unknown intermediate format '%s'" % (intermediate_format,))
+
         f = open(filename, "w")
         try:
             json.dump(self, f, cls=P2GJSONEncoder, indent=4, sort_keys=True)
@@ -358,10 +401,43 @@ class GeographicDefinition(BaseP2GObject):
     pass
 
 
+class _BlockReader(object):
+    """Minimal array-like object that dask reads blocks from.
+
+    Newer versions of `dask.array.from_array` copy anything with a ``copy``
+    method (numpy arrays, memory maps, `StoreArray`) when it is wrapped, which
+    reads whole files in to memory. This object only supports slicing.
+    """
+    def __init__(self, data):
+        self.data = data
+        self.shape = data.shape
+        self.dtype = data.dtype
+        self.ndim = data.ndim
+
+    def __getitem__(self, key):
+        return self.data[key]
+
+
+def dask_array_view(data, chunks, lock=False):
+    """Wrap `data` in a dask array that reads it one block at a time when computed, without copying it."""
+    import dask.array as da
+    return da.from_array(_BlockReader(data), chunks=chunks, name=False, lock=lock)
+
+
 class BaseProduct(BaseP2GObject):
     """Base product class for storing metadata.
     """
+    def __init__(self, *args, **kwargs):
+        # item -> (data filename or array, fill value, shape, bit-packed mask)
+        self._mask_cache = {}
+        # number of processing steps still reading the original data, None if unknown
+        self.consumers = None
+        super(BaseProduct, self).__init__(*args, **kwargs)
+
     def _memmap(self, fn, dtype, rows, cols, mode):
+        if is_store_path(fn):
+            # dataset in a single file scene store, already has the proper shape
+            return open_store_array(fn, mode)
         # load FBF data from a file if needed
         data = numpy.memmap(fn, dtype=dtype, mode=mode).reshape((-1, rows, cols))
         # the negative 1 in the above reshape makes it expand to the proper dimensions for the data without
@@ -370,56 +446,170 @@ class BaseProduct(BaseP2GObject):
             data = data.reshape((rows, cols))
         return data
 
-    def get_data_array(self, item, rows, cols, dtype, mode="r"):
+    def _lazy_array(self, data, chunk_rows=LAZY_CHUNK_ROWS):
+        # one block is `chunk_rows` full rows of one band
+        chunks = (1,) * (data.ndim - 2) + (min(chunk_rows, data.shape[-2]), data.shape[-1])
+        # h5py datasets can't be read from multiple threads at the same time
+        return dask_array_view(data, chunks, lock=isinstance(data, StoreArray))
+
+    def get_data_array(self, item, rows, cols, dtype, mode="r", lazy=False, chunk_rows=LAZY_CHUNK_ROWS):
         """Get FBF item as a numpy array.
 
-        File is loaded from disk as a memory mapped file if needed.
+        File is loaded from disk as a memory mapped file if needed. If `lazy` is True, a dask array of
+        `chunk_rows` row blocks is returned instead.
+
+        Opening the data with any `mode` other than "r" invalidates the cached validity mask for `item`.
         """
         data = self[item]
+        if mode != "r":
+            self.clear_mask_cache(item)
         if isinstance(data, str):
             data = self._memmap(data, dtype, rows, cols, mode)
+        if lazy:
+            data = self._lazy_array(data, chunk_rows)
 
         return data
 
-    def get_data_mask(self, item, fill=numpy.nan, fill_key=None):
-        """Return a boolean mask where the data for `item` is invalid/bad.
-        """
+    def clear_mask_cache(self, item=None):
+        """Forget the cached validity mask of `item` (all items by default) and remove any saved mask file."""
+        for key in ([item] if item is not None else list(self._mask_cache.keys())):
+            self._mask_cache.pop(key, None)
+            if isinstance(self.get(key), str):
+                remove_mask_file(self[key])
+
+    def _cached_mask(self, item, fill):
+        """Get the cache entry for `item` if it was computed for the current data and `fill`."""
+        cached = self._mask_cache.get(item)
+        if cached is None:
+            return None
+        data_ref, cached_fill = cached[:2]
+        # the cache is only valid for the same file (or array object) and fill value
+        same_data = data_ref is self[item] or isinstance(data_ref, str) and data_ref == self[item]
+        same_fill = cached_fill == fill or numpy.isnan(cached_fill) and numpy.isnan(fill)
+        return cached if same_data and same_fill else None
+
+    def _compute_packed_mask(self, item, fill):
         data = self.get_data_array(item)
+        data_ref = self[item]
+        mask_fn = data_ref + MASK_SUFFIX if isinstance(data_ref, str) and not is_store_path(data_ref) else None
+        packed_size = (data.size + 7) // 8
+        if mask_fn is not None and os.path.isfile(mask_fn) and os.path.getsize(mask_fn) == packed_size and \
+                os.path.getmtime(mask_fn) >= os.path.getmtime(data_ref):
+            LOG.debug("Loading saved validity mask '%s'", mask_fn)
+            return data.shape, numpy.fromfile(mask_fn, dtype=numpy.uint8)
 
+        if numpy.isnan(fill):
+            mask = numpy.isnan(data)
+        else:
+            mask = data == fill
+        packed = numpy.packbits(mask, axis=None)
+        if mask_fn is not None and PERSIST_MASKS:
+            LOG.debug("Saving validity mask '%s'", mask_fn)
+            try:
+                packed.tofile(mask_fn)
+            except OSError:
+                LOG.debug("Could not save validity mask '%s'", mask_fn, exc_info=True)
+        return data.shape, packed
+
+    def _get_mask_cache(self, item, fill):
+        cached = self._cached_mask(item, fill)
+        if cached is None:
+            cached = (self[item], fill) + self._compute_packed_mask(item, fill)
+            self._mask_cache[item] = cached
+        return cached
+
+    def get_packed_data_mask(self, item, fill=numpy.nan, fill_key=None):
+        """Return the validity mask for `item` as a bit-packed flattened array (see `numpy.packbits`).
+
+        The mask is only computed the first time it is requested. Use `unpack_mask` with the shape of
+        the data to get the boolean mask back.
+        """
         if fill_key is not None:
             fill = self[fill_key]
+        return self._get_mask_cache(item, fill)[3]
 
-        if numpy.isnan(fill):
-            return numpy.isnan(data)
-        else:
+    def get_data_mask(self, item, fill=numpy.nan, fill_key=None, lazy=False, chunk_rows=LAZY_CHUNK_ROWS):
+        """Return a boolean mask where the data for `item` is invalid/bad.
+
+        The mask is computed once and cached in bit-packed form. Lazy masks are only taken from the cache
+        if it is already filled, otherwise they are computed block by block.
+        """
+        if fill_key is not None:
+            fill = self[fill_key]
+
+        if lazy and self._cached_mask(item, fill) is None:
+            data = self.get_data_array(item, lazy=True, chunk_rows=chunk_rows)
+            if numpy.isnan(fill):
+                return numpy.isnan(data)
             return data == fill
 
+        shape, packed = self._get_mask_cache(item, fill)[2:]
+        mask = unpack_mask(packed, shape)
+        if lazy:
+            mask = self._lazy_array(mask, chunk_rows)
+        return mask
+
+    def set_consumers(self, count):
+        """Set the number of processing steps that still need the original data of this product.
+
+        When the caller is the only consumer left (`count` of 1) `copy_array` can hand out the data
+        itself instead of a copy. Products start with an unknown number of consumers and are never
+        modified in place.
+        """
+        self.consumers = count
+
+    def owns_data(self, item):
+        """Check if the data for `item` can be modified in place without another consumer seeing it."""
+        data = self[item]
+        if self.persist or self.consumers is None or self.consumers > 1:
+            # the files belong to a saved scene or someone else still needs the original
+            return False
+        if isinstance(data, str):
+            return not is_store_path(data) and os.access(data, os.W_OK)
+        return isinstance(data, numpy.ndarray) and data.flags.writeable
+
     def copy_array(self, item, rows, cols, dtype, filename=None, read_only=True):
         """Copy the array item of this swath.
 
         If the `filename` keyword is passed the data will be written to that file. The copy returned
         will be a memory map. If `read_only` is False, the memory map will be opened with mode "r+".
 
+        Without a `filename` and with `read_only` False, the data itself is returned if this product is
+        the last consumer of it (see `set_consumers`). Otherwise data on disk is returned as a
+        copy-on-write memory map so only the parts that are modified get copied.
+
         The 'read_only' keyword is ignored if `filename` is None.
         """
         mode = "r" if read_only else "r+"
         data = self[item]
 
+        if not filename and not read_only and self.owns_data(item):
+            LOG.debug("Modifying '%s' in place, no other consumers need the original", item)
+            if isinstance(data, str):
+                # avoid get_data_array so the cached mask of the original data is kept
+                return self._memmap(data, dtype, rows, cols, "r+")
+            return data
+
         if isinstance(data, str):
             # we have a binary filename
             if filename:
                 # the user wants to copy the FBF
-                shutil.copyfile(data, filename)
+                if is_store_path(data):
+                    copy_store_array(data, filename)
+                else:
+                    clone_file(data, filename)
                 data = filename
                 return self._memmap(data, dtype, rows, cols, mode)
             if mode == "r":
                 return self._memmap(data, dtype, rows, cols, "r")
             else:
-                return self._memmap(data, dtype, rows, cols, "r").copy()
+                data = self._memmap(data, dtype, rows, cols, "c")
+                # compressed scene store datasets can't be memory mapped
+                return data.copy() if isinstance(data, StoreArray) else data
         else:
             if filename:
                 data.tofile(filename)
-                return self._memmap(data, dtype, rows, cols, mode)
+                return self._memmap(filename, dtype, rows, cols, mode)
             return data.copy()
 
 
@@ -492,12 +682,13 @@ class SwathDefinition(GeographicDefinition, BaseProduct):
         "latitude",
     )
 
-    def get_data_array(self, item, mode="r"):
+    def get_data_array(self, item, mode="r", lazy=False, chunk_rows=LAZY_CHUNK_ROWS):
         # Need this because otherwise get_data_mask won't work properly
         dtype = self["data_type"]
         rows = self["swath_rows"]
         cols = self["swath_columns"]
-        return super(SwathDefinition, self).get_data_array(item, rows, cols, dtype)
+        return super(SwathDefinition, self).get_data_array(item, rows, cols, dtype, mode=mode, lazy=lazy,
+                                                           chunk_rows=chunk_rows)
 
     def get_longitude_array(self):
         return self.get_data_array("longitude")
@@ -834,14 +1025,18 @@ class SwathProduct(BaseProduct):
     def shape(self):
         return self["swath_rows"], self["swath_columns"]
 
-    def get_data_array(self, item="swath_data", mode="r"):
+    def get_data_array(self, item="swath_data", mode="r", lazy=False, chunk_rows=LAZY_CHUNK_ROWS):
         dtype = self["data_type"]
         rows = self["swath_definition"]["swath_rows"]
         cols = self["swath_definition"]["swath_columns"]
-        return super(SwathProduct, self).get_data_array(item, rows, cols, dtype, mode=mode)
+        return super(SwathProduct, self).get_data_array(item, rows, cols, dtype, mode=mode, lazy=lazy,
+                                                        chunk_rows=chunk_rows)
+
+    def get_data_mask(self, item="swath_data", lazy=False, chunk_rows=LAZY_CHUNK_ROWS):
+        return super(SwathProduct, self).get_data_mask(item, fill_key="fill_value", lazy=lazy, chunk_rows=chunk_rows)
 
-    def get_data_mask(self, item="swath_data"):
-        return super(SwathProduct, self).get_data_mask(item, fill_key="fill_value")
+    def get_packed_data_mask(self, item="swath_data"):
+        return super(SwathProduct, self).get_packed_data_mask(item, fill_key="fill_value")
 
     def copy_array(self, item="swath_data", filename=None, read_only=True):
         dtype = self["data_type"]
@@ -912,18 +1107,24 @@ class GriddedProduct(BaseProduct):
             info.pop(k, None)
         self.update(**info)
 
-    def get_data_array(self, item="grid_data", mode="r"):
+    def get_data_array(self, item="grid_data", mode="r", lazy=False, chunk_rows=LAZY_CHUNK_ROWS):
         """Get FBF item as a numpy array.
 
-        File is loaded from disk as a memory mapped file if needed.
+        File is loaded from disk as a memory mapped file if needed. If `lazy` is True, a dask array of
+        `chunk_rows` row blocks is returned instead.
         """
         dtype = self["data_type"]
         rows = self["grid_definition"]["height"]
         cols = self["grid_definition"]["width"]
-        return super(GriddedProduct, self).get_data_array(item, rows, cols, dtype, mode=mode)
+        return super(GriddedProduct, self).get_data_array(item, rows, cols, dtype, mode=mode, lazy=lazy,
+                                                          chunk_rows=chunk_rows)
+
+    def get_data_mask(self, item="grid_data", lazy=False, chunk_rows=LAZY_CHUNK_ROWS):
+        return super(GriddedProduct, self).get_data_mask(item, fill_key="fill_value", lazy=lazy,
+                                                         chunk_rows=chunk_rows)
 
-    def get_data_mask(self, item="grid_data"):
-        return super(GriddedProduct, self).get_data_mask(item, fill_key="fill_value")
+    def get_packed_data_mask(self, item="grid_data"):
+        return super(GriddedProduct, self).get_packed_data_mask(item, fill_key="fill_value")
 
     def copy_array(self, item="grid_data", filename=None, read_only=True):
         """Copy the array item of this swath.
@@ -994,7 +1195,53 @@ class GriddedScene(BaseScene):
 
 
 
+def intermediate_format_from_filename(filename):
+    """Get the format ('json', 'msgpack', or 'hdf5') a P2G object should be saved as based on the filename."""
+    if filename.endswith(STORE_EXTENSIONS):
+        return "hdf5"
+    elif filename.endswith(PACKED_EXTENSIONS):
+        return "msgpack"
+    return "json"
+
+
+def clone_file(src_filename, dst_filename):
+    """Copy a file, sharing the data blocks of the original if the filesystem supports it (reflink).
+
+    Falls back to a regular copy on filesystems without copy-on-write support.
+    """
+    try:
+        import fcntl
+        with open(src_filename, "rb") as src_file, open(dst_filename, "wb") as dst_file:
+            fcntl.ioctl(dst_file.fileno(), FICLONE, src_file.fileno())
+        return
+    except (ImportError, OSError):
+        LOG.debug("Could not clone '%s', copying it instead", src_filename)
+    shutil.copyfile(src_filename, dst_filename)
+
+
+def unpack_mask(packed_mask, shape):
+    """Unpack a bit-packed mask from `BaseProduct.get_packed_data_mask` to a boolean array of `shape`."""
+    size = int(numpy.prod(shape))
+    return numpy.unpackbits(packed_mask, count=size).reshape(shape).view(numpy.bool_)
+
+
+def remove_mask_file(filename):
+    """Remove the saved validity mask of the flat binary file `filename` if there is one."""
+    mask_fn = filename + MASK_SUFFIX
+    if not is_store_path(filename) and os.path.isfile(mask_fn):
+        try:
+            os.remove(mask_fn)
+        except OSError:
+            LOG.debug("Could not remove validity mask '%s'", mask_fn)
+
+
 def remove_json(json_filename, binary_only=False):
+    if is_scene_store(json_filename):
+        # all arrays are in the store itself
+        LOG.info("Deleting scene store '%s'", json_filename)
+        os.remove(json_filename)
+        return
+
     obj = BaseP2GObject.load(json_filename)
     if not binary_only:
         for json_key in obj.loadable_kwargs:
@@ -1032,6 +1279,18 @@ def info_json(json_filename):
         print("ERROR: Unknown object from file '%s'" % (json_filename,))
 
 
+def convert_json(input_filename, output_filename, intermediate_format=None):
+    """Save the P2G object in `input_filename` in another format (ex. packed metadata as JSON for inspection).
+
+    Binary files referenced by the object are not copied.
+    """
+    obj = BaseP2GObject.load(input_filename)
+    if output_filename == "-":
+        print(obj.dumps(persist=True))
+        return
+    obj.save(output_filename, intermediate_format=intermediate_format)
+
+
 def main():
     from argparse import ArgumentParser
     parser = ArgumentParser(description="Utility for working with Polar2Grid metadata objects on disk")
@@ -1046,6 +1305,13 @@ def main():
     sp_info.set_defaults(func=info_json)
     sp_info.add_argument("json_filename", help="JSON file to recursively remove")
 
+    sp_convert = subparsers.add_parser("convert", help="Save a P2G JSON, msgpack, or HDF5 file in another format")
+    sp_convert.set_defaults(func=convert_json)
+    sp_convert.add_argument("--format", dest="intermediate_format", choices=("json", "msgpack", "hdf5"),
+                            help="Output format (default: based on the output filename extension)")
+    sp_convert.add_argument("input_filename", help="P2G file to convert")
+    sp_convert.add_argument("output_filename", help="Output filename or '-' to print as JSON")
+
     args = parser.parse_args()
 
     logging.basicConfig(level=logging.INFO)
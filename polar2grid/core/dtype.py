@@ -161,7 +161,11 @@ def clip_to_data_type(data, data_type):
 
     rmin, rmax = dtype2range[data_type]
     log.debug("Clipping data to a %d - %d data range" % (rmin, rmax))
-    numpy.clip(data, rmin, rmax, out=data)
+    if isinstance(data, numpy.ndarray):
+        numpy.clip(data, rmin, rmax, out=data)
+    else:
+        # lazy (dask) arrays can't be modified in place
+        data = data.clip(rmin, rmax)
 
     return convert_to_data_type(data, data_type)
 
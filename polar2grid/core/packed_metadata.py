@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+# Copyright (C) 2018 Space Science and Engineering Center (SSEC),
+# University of Wisconsin-Madison.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# This file is part of the polar2grid software package. Polar2grid takes
+# satellite observation data, remaps it, and writes it to a file format for
+#     input into another program.
+# Documentation: http://www.ssec.wisc.edu/software/polar2grid/
+#
+# Written by David Hoese    November 2018
+# University of Wisconsin-Madison
+# Space Science and Engineering Center
+# 1225 West Dayton Street
+# Madison, WI  53706
+# david.hoese@ssec.wisc.edu
+"""Compact binary (msgpack) serialization of Polar2Grid metadata objects.
+
+JSON files are easy to read but slow to write and load for scenes with
+hundreds of products: every string in a JSON file has to be checked for
+dates and data types and shared objects (swath and grid definitions) are
+repeated for every product. Packed metadata files store the same objects
+with msgpack. Dates and data types are typed extensions and each shared
+object is stored once and referenced after that.
+
+A packed metadata file is `PACKED_SIGNATURE` followed by a msgpack array of
+``[PACKED_VERSION, object]``. Arrays are not stored in these files, they
+still reference flat binary files (or scene store datasets) like JSON files.
+
+:author:       David Hoese (davidh)
+:contact:      david.hoese@ssec.wisc.edu
+:organization: Space Science and Engineering Center (SSEC)
+:copyright:    Copyright (c) 2018 University of Wisconsin SSEC. All rights reserved.
+:date:         Nov 2018
+:license:      GNU GPLv3
+
+"""
+__docformat__ = "restructuredtext en"
+
+import os
+import struct
+import logging
+from datetime import datetime, timedelta, timezone
+
+import numpy
+
+from polar2grid.core.dtype import str_to_dtype, dtype_to_str
+
+LOG = logging.getLogger(__name__)
+
+PACKED_SIGNATURE = b"\x89P2GMETA"
+PACKED_VERSION = 1
+PACKED_EXTENSIONS = (".msgpack",)
+# msgpack extension type codes
+EXT_DATETIME = 1
+EXT_DTYPE = 2
+EXT_REFERENCE = 3
+# key holding the index of a P2G object so later references to the same object can find it
+OBJECT_ID_KEY = "__p2g_id__"
+EPOCH = datetime(1970, 1, 1)
+
+
+def is_packed_metadata(filename):
+    """Check if `filename` is a packed metadata file instead of a JSON file."""
+    if not isinstance(filename, str) or not os.path.isfile(filename):
+        return False
+    with open(filename, "rb") as file_obj:
+        return file_obj.read(len(PACKED_SIGNATURE)) == PACKED_SIGNATURE
+
+
+class _ObjectPacker(object):
+    """Convert objects msgpack doesn't know about while packing one metadata object."""
+    def __init__(self):
+        # id(P2G object) -> index of the object in the order it was packed
+        self.object_ids = {}
+
+    def default(self, obj):
+        import msgpack
+        from polar2grid.core.containers import BaseP2GObject
+        if isinstance(obj, BaseP2GObject):
+            if id(obj) in self.object_ids:
+                return msgpack.ExtType(EXT_REFERENCE, struct.pack(">I", self.object_ids[id(obj)]))
+            self.object_ids[id(obj)] = len(self.object_ids)
+            info = obj.copy(as_dict=True)
+            info["__class__"] = "%s.%s" % (obj.__class__.__module__, obj.__class__.__name__)
+            info[OBJECT_ID_KEY] = self.object_ids[id(obj)]
+            return info
+        elif isinstance(obj, datetime):
+            if obj.tzinfo is not None:
+                # times are stored as naive UTC times like everywhere else in polar2grid
+                obj = obj.astimezone(timezone.utc).replace(tzinfo=None)
+            return msgpack.ExtType(EXT_DATETIME, struct.pack(">q", (obj - EPOCH) // timedelta(microseconds=1)))
+        elif isinstance(obj, numpy.dtype) or isinstance(obj, type) and issubclass(obj, numpy.number):
+            return msgpack.ExtType(EXT_DTYPE, dtype_to_str(obj).encode("utf-8"))
+        elif isinstance(obj, dict):
+            # dict subclasses (OrderedDict, etc)
+            return dict(obj)
+        elif isinstance(obj, (tuple, list)):
+            return list(obj)
+        elif isinstance(obj, str):
+            return str(obj)
+        elif isinstance(obj, bytes):
+            return bytes(obj)
+        elif isinstance(obj, (bool, numpy.bool_)):
+            return bool(obj)
+        elif hasattr(obj, 'dtype'):
+            if obj.size > 1:
+                return obj.tolist()
+            return int(obj) if numpy.issubdtype(obj.dtype, numpy.integer) else float(obj)
+        elif isinstance(obj, int):
+            return int(obj)
+        elif isinstance(obj, float):
+            return float(obj)
+        raise TypeError("Can not pack object of type %r" % (type(obj),))
+
+
+class _ObjectUnpacker(object):
+    """Recreate P2G objects and typed extensions while unpacking one metadata object."""
+    def __init__(self):
+        # index of the object when it was packed -> unpacked P2G object
+        self.objects = {}
+
+    def object_hook(self, obj):
+        if "__class__" not in obj:
+            return obj
+        from polar2grid.core.containers import P2GJSONDecoder
+        object_id = obj.pop(OBJECT_ID_KEY, None)
+        inst = P2GJSONDecoder._jsonclass_to_pyclass(obj["__class__"])(**obj)
+        if object_id is not None:
+            # objects are completely unpacked before anything can reference them
+            self.objects[object_id] = inst
+        return inst
+
+    def ext_hook(self, code, data):
+        import msgpack
+        if code == EXT_DATETIME:
+            return EPOCH + timedelta(microseconds=struct.unpack(">q", data)[0])
+        elif code == EXT_DTYPE:
+            return str_to_dtype(data.decode("utf-8"))
+        elif code == EXT_REFERENCE:
+            return self.objects[struct.unpack(">I", data)[0]]
+        return msgpack.ExtType(code, data)
+
+
+def pack_object(obj):
+    """Pack a Polar2Grid object in to bytes (without the file signature)."""
+    import msgpack
+    packer = _ObjectPacker()
+    return msgpack.packb([PACKED_VERSION, obj], default=packer.default, use_bin_type=True, strict_types=True)
+
+
+def unpack_object(data):
+    """Unpack bytes created by `pack_object` in to a Polar2Grid object."""
+    import msgpack
+    unpacker = _ObjectUnpacker()
+    version, obj = msgpack.unpackb(data, raw=False, object_hook=unpacker.object_hook, ext_hook=unpacker.ext_hook)
+    if version != PACKED_VERSION:
+        raise ValueError("Unsupported packed metadata version '%s'" % (version,))
+    return obj
+
+
+def save_packed_metadata(obj, filename):
+    """Save a Polar2Grid object to a packed metadata file.
+
+    Any files referenced by the object are kept on disk after this (see `set_persist`).
+    """
+    try:
+        data = pack_object(obj)
+    except TypeError:
+        LOG.error("Could not write P2G object to packed metadata file: '%s'", filename, exc_info=True)
+        raise
+    with open(filename, "wb") as file_obj:
+        file_obj.write(PACKED_SIGNATURE)
+        file_obj.write(data)
+    obj.set_persist()
+
+
+def load_packed_metadata(filename):
+    """Load the Polar2Grid object saved in a packed metadata file."""
+    with open(filename, "rb") as file_obj:
+        if file_obj.read(len(PACKED_SIGNATURE)) != PACKED_SIGNATURE:
+            raise ValueError("Not a packed metadata file: '%s'" % (filename,))
+        data = file_obj.read()
+    return unpack_object(data)
@@ -55,10 +55,13 @@ import logging
 import numpy
 
 from polar2grid.core.dtype import dtype_to_str, dtype2range
+from polar2grid.core.containers import LAZY_CHUNK_ROWS
 from . import roles
 
 LOG = logging.getLogger(__name__)
 DEFAULT_RCONFIG = "polar2grid.core:rescale_configs/rescale.ini"
+# methods that compute the input limits from the entire image when they aren't configured
+DATA_LIMIT_METHODS = ("linear", "linear_brightness_temperature")
 
 
 def mask_helper(img, fill_value):
@@ -590,14 +593,66 @@ class Rescaler(roles.INIConfigReader):
             rescale_options['colormap'] = colormap
         return rescale_options
 
+    def _rescale_block(self, block, method, rescale_options, fill_in, fill_value, separate_rgb=True,
+                       band_options=None, block_info=None, **kwargs):
+        """Rescale one block of a lazy array (called by dask)."""
+        # rescaling functions modify the data in place
+        data = numpy.array(block)
+        good_data_mask = ~mask_helper(data, fill_in)
+        if separate_rgb and data.ndim == 3:
+            # blocks hold one band each so the band options can be found from the block's location
+            first_band = block_info[0]["array-location"][0][0] if block_info else 0
+            for idx in range(data.shape[0]):
+                options = band_options[first_band + idx] if band_options else rescale_options
+                data[idx] = self._rescale_data(method, data[idx], good_data_mask[idx], options.copy(),
+                                               fill_value, **kwargs)
+            return data
+        data = self._rescale_data(method, data, good_data_mask, rescale_options.copy(), fill_value, **kwargs)
+        return data.astype(block.dtype, copy=False)
+
+    def _rescale_product_lazy(self, gridded_product, method, rescale_options, fill_value, chunk_rows, **kwargs):
+        import dask.array as da
+        data = gridded_product.get_data_array(lazy=True, chunk_rows=chunk_rows)
+        separate_rgb = rescale_options.pop("separate_rgb", True)
+        # only needed by the colormap methods which aren't run lazily
+        rescale_options.pop("attrs", None)
+        band_options = None
+        if method in DATA_LIMIT_METHODS and (rescale_options.get("min_in") is None or
+                                             rescale_options.get("max_in") is None):
+            # every block has to be scaled with the limits of the entire image (or band)
+            LOG.debug("Computing input limits for %s", gridded_product["product_name"])
+            good_data = da.where(gridded_product.get_data_mask(lazy=True, chunk_rows=chunk_rows), numpy.nan, data)
+            axis = tuple(range(1, data.ndim)) if separate_rgb and data.ndim == 3 else None
+            min_in, max_in = da.compute(da.nanmin(good_data, axis=axis), da.nanmax(good_data, axis=axis))
+            # keep the limits in the data type of the image like the in-memory rescaling does
+            min_in = numpy.atleast_1d(min_in)
+            max_in = numpy.atleast_1d(max_in)
+            band_options = []
+            for band_min, band_max in zip(min_in, max_in):
+                options = rescale_options.copy()
+                if options.get("min_in") is None:
+                    options["min_in"] = band_min
+                if options.get("max_in") is None:
+                    options["max_in"] = band_max
+                band_options.append(options)
+            if axis is None:
+                rescale_options = band_options[0]
+                band_options = None
+
+        return data.map_blocks(self._rescale_block, method, rescale_options, gridded_product["fill_value"],
+                               fill_value, separate_rgb=separate_rgb, band_options=band_options,
+                               dtype=data.dtype, **kwargs)
+
     def rescale_product(self, gridded_product, data_type, inc_by_one=False, fill_value=None, rescale_options=None,
-                        clip_zero=False):
+                        clip_zero=False, lazy=False, chunk_rows=LAZY_CHUNK_ROWS):
         """Rescale a gridded product based on how the rescaler is configured.
 
         The caller should know if it wants to increment the output data by 1 (`inc_by_one` keyword).
 
         :param data_type: Desired data type of the output data
         :param inc_by_one: After rescaling should 1 be added to all data values to leave the minumum value as the fill
+        :param lazy: Return a dask array that rescales `chunk_rows` rows at a time instead of rescaling a full copy
+                     of the data (colormap methods are always run on the full image)
 
         FUTURE: dec_by_one (mutually exclusive to inc_by_one)
 
@@ -611,8 +666,15 @@ class Rescaler(roles.INIConfigReader):
         mask_clip = rescale_options.pop("mask_clip", None)
         inc_by_one = rescale_options.pop("inc_by_one")
 
-        data = gridded_product.copy_array(read_only=False)
+        if lazy and not ('palettize' in method or 'colorize' in method):
+            LOG.debug("Rescaling %s in blocks of %d rows", gridded_product["product_name"], chunk_rows)
+            return self._rescale_product_lazy(gridded_product, method, rescale_options, fill_value, chunk_rows,
+                                              clip=clip, mask_clip=mask_clip, inc_by_one=inc_by_one,
+                                              clip_zero=clip_zero)
+
+        # get the mask first, the data may be rescaled in place if no one else needs the original
         good_data_mask = ~gridded_product.get_data_mask()
+        data = gridded_product.copy_array(read_only=False)
         rescale_options['attrs'] = gridded_product  # copy metadata as keyword argument
         if rescale_options.get("separate_rgb", True) and data.ndim == 3:
             data = numpy.concatenate((
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+# Copyright (C) 2018 Space Science and Engineering Center (SSEC),
+# University of Wisconsin-Madison.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# This file is part of the polar2grid software package. Polar2grid takes
+# satellite observation data, remaps it, and writes it to a file format for
+#     input into another program.
+# Documentation: http://www.ssec.wisc.edu/software/polar2grid/
+#
+# Written by David Hoese    November 2018
+# University of Wisconsin-Madison
+# Space Science and Engineering Center
+# 1225 West Dayton Street
+# Madison, WI  53706
+# david.hoese@ssec.wisc.edu
+"""Single file HDF5 storage for Polar2Grid scenes and products.
+
+Instead of a JSON file plus one flat binary file for every array, a scene
+store keeps the JSON metadata as an attribute of one HDF5 file and every
+array as a dataset in that file. Arrays in the metadata are replaced by
+store paths of the form ``<filename>::<dataset name>`` which
+`BaseProduct.get_data_array` opens on demand.
+
+Compressed datasets are chunked by rows and read lazily, one chunk at a time,
+through `StoreArray`. Uncompressed datasets are stored contiguously so they can
+be memory mapped like flat binary files.
+
+:author:       David Hoese (davidh)
+:contact:      david.hoese@ssec.wisc.edu
+:organization: Space Science and Engineering Center (SSEC)
+:copyright:    Copyright (c) 2018 University of Wisconsin SSEC. All rights reserved.
+:date:         Nov 2018
+:license:      GNU GPLv3
+
+"""
+__docformat__ = "restructuredtext en"
+
+import os
+import json
+import logging
+
+import numpy
+from numpy.lib.mixins import NDArrayOperatorsMixin
+
+LOG = logging.getLogger(__name__)
+
+STORE_SEPARATOR = "::"
+STORE_VERSION = 1
+METADATA_ATTR = "p2g_metadata"
+VERSION_ATTR = "p2g_store_version"
+HDF5_SIGNATURE = b"\x89HDF\r\n\x1a\n"
+STORE_EXTENSIONS = (".h5", ".hdf5")
+# number of rows in each chunk of a compressed dataset
+DEFAULT_CHUNK_ROWS = 256
+COMPRESSION_TYPES = ("gzip", "lzf")
+
+
+def is_store_path(value):
+    """Check if `value` is a reference to a dataset in a scene store."""
+    return isinstance(value, str) and STORE_SEPARATOR in value
+
+
+def split_store_path(store_path):
+    """Split a store path in to (HDF5 filename, dataset name)."""
+    filename, dataset_name = store_path.rsplit(STORE_SEPARATOR, 1)
+    return filename, dataset_name
+
+
+def is_scene_store(filename):
+    """Check if `filename` is an HDF5 scene store instead of a JSON file."""
+    if not isinstance(filename, str) or not os.path.isfile(filename):
+        return False
+    with open(filename, "rb") as file_obj:
+        return file_obj.read(len(HDF5_SIGNATURE)) == HDF5_SIGNATURE
+
+
+class StoreArray(NDArrayOperatorsMixin):
+    """Array-like view of a chunked dataset in a scene store.
+
+    Slicing with integers and slices only reads the chunks needed. Anything
+    else (fancy indexing, numpy functions, array methods) works on the full
+    array read from the file.
+    """
+    def __init__(self, dataset):
+        self.dataset = dataset
+
+    @property
+    def shape(self):
+        return self.dataset.shape
+
+    @property
+    def dtype(self):
+        return self.dataset.dtype
+
+    @property
+    def ndim(self):
+        return self.dataset.ndim
+
+    @property
+    def size(self):
+        return self.dataset.size
+
+    @property
+    def chunks(self):
+        return self.dataset.chunks
+
+    def __len__(self):
+        return self.shape[0]
+
+    @staticmethod
+    def _is_basic_index(key):
+        if not isinstance(key, tuple):
+            key = (key,)
+        return all(isinstance(k, (int, numpy.integer, slice)) or k is Ellipsis for k in key)
+
+    def __getitem__(self, key):
+        if self._is_basic_index(key):
+            return self.dataset[key]
+        return numpy.asarray(self)[key]
+
+    def __setitem__(self, key, value):
+        if self._is_basic_index(key):
+            self.dataset[key] = value
+            return
+        data = numpy.asarray(self)
+        data[key] = value
+        self.dataset[...] = data
+
+    def __array__(self, dtype=None, copy=None):
+        data = self.dataset[()]
+        if dtype is not None:
+            data = data.astype(dtype, copy=False)
+        return data
+
+    def __array_ufunc__(self, ufunc, method, *inputs, **kwargs):
+        inputs = tuple(numpy.asarray(x) if isinstance(x, StoreArray) else x for x in inputs)
+        if "out" in kwargs:
+            kwargs["out"] = tuple(numpy.asarray(x) if isinstance(x, StoreArray) else x for x in kwargs["out"])
+        return getattr(ufunc, method)(*inputs, **kwargs)
+
+    def __getattr__(self, name):
+        if name == "dataset" or name.startswith("__"):
+            # numpy checks for special attributes when converting this object
+            raise AttributeError(name)
+        # numpy array methods (min, max, astype, reshape, tofile, ...)
+        return getattr(numpy.asarray(self), name)
+
+    def copy(self):
+        return numpy.asarray(self)
+
+
+def open_store_array(store_path, mode="r"):
+    """Open a dataset in a scene store as an array.
+
+    :param store_path: Store path as ``<filename>::<dataset name>``
+    :param mode: Mode used by `numpy.memmap` ('r', 'r+', or 'c')
+    :returns: `numpy.memmap` for contiguous datasets, `StoreArray` for chunked datasets
+    """
+    import h5py
+    filename, dataset_name = split_store_path(store_path)
+    h5_file = h5py.File(filename, "r+" if mode == "r+" else "r")
+    dataset = h5_file[dataset_name]
+    offset = dataset.id.get_offset()
+    if dataset.chunks is None and offset is not None:
+        shape = dataset.shape
+        dtype = dataset.dtype
+        h5_file.close()
+        return numpy.memmap(filename, dtype=dtype, mode=mode, offset=offset, shape=shape)
+    return StoreArray(dataset)
+
+
+def copy_store_array(store_path, filename, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Write a dataset from a scene store to a flat binary file, `chunk_rows` rows at a time."""
+    data = open_store_array(store_path)
+    with open(filename, "wb") as output_file:
+        for start_row in range(0, data.shape[-2], chunk_rows):
+            numpy.ascontiguousarray(data[..., start_row:start_row + chunk_rows, :]).tofile(output_file)
+
+
+def _write_array(h5_file, dataset_name, data, compression=None, chunk_rows=DEFAULT_CHUNK_ROWS):
+    chunks = None
+    if compression and data.ndim >= 2:
+        chunks = (1,) * (data.ndim - 2) + (min(chunk_rows, data.shape[-2]), data.shape[-1])
+    dataset = h5_file.create_dataset(dataset_name, shape=data.shape, dtype=data.dtype, chunks=chunks,
+                                     compression=compression)
+    if data.ndim < 2:
+        dataset[...] = data
+        return
+    # copy by rows so memory mapped files and other stores are never read entirely in to memory
+    for start_row in range(0, data.shape[-2], chunk_rows):
+        dataset[..., start_row:start_row + chunk_rows, :] = data[..., start_row:start_row + chunk_rows, :]
+
+
+def _store_object(h5_file, obj, group_name, stored, **kwargs):
+    """Write the arrays of `obj` to `h5_file` and return its metadata with store paths in place of arrays."""
+    from polar2grid.core.containers import BaseP2GObject, BaseProduct
+    if id(obj) in stored:
+        # objects shared between products (swath definitions) are stored once
+        return stored[id(obj)]
+
+    info = {"__class__": "%s.%s" % (obj.__class__.__module__, obj.__class__.__name__)}
+    array_keys = obj.cleanup_kwargs if isinstance(obj, BaseProduct) else tuple()
+    for key, value in obj.items():
+        if key in array_keys and value is not None:
+            dataset_name = group_name + "/" + key
+            LOG.debug("Storing '%s' as dataset '%s'", key, dataset_name)
+            _write_array(h5_file, dataset_name, obj.get_data_array(key), **kwargs)
+            info[key] = STORE_SEPARATOR + dataset_name
+        elif isinstance(value, BaseP2GObject):
+            info[key] = _store_object(h5_file, value, group_name + "/" + key, stored, **kwargs)
+        else:
+            info[key] = value
+    stored[id(obj)] = info
+    return info
+
+
+def save_scene_store(obj, filename, compression=None, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """Save a Polar2Grid scene or product and all of its arrays to one HDF5 file.
+
+    The file is written to a temporary file first so a store can be saved over
+    the file it was loaded from.
+
+    :param compression: HDF5 compression for the arrays (see `COMPRESSION_TYPES`), None to store them uncompressed
+    :param chunk_rows: Number of rows in each chunk of compressed arrays
+    """
+    import h5py
+    from polar2grid.core.containers import P2GJSONEncoder
+    if compression is not None and compression not in COMPRESSION_TYPES:
+        raise ValueError("Unknown scene store compression '%s'" % (compression,))
+
+    tmp_filename = filename + ".tmp"
+    try:
+        with h5py.File(tmp_filename, "w") as h5_file:
+            metadata = _store_object(h5_file, obj, "", {}, compression=compression, chunk_rows=chunk_rows)
+            h5_file.attrs[METADATA_ATTR] = json.dumps(metadata, cls=P2GJSONEncoder, sort_keys=True)
+            h5_file.attrs[VERSION_ATTR] = STORE_VERSION
+        os.replace(tmp_filename, filename)
+    except Exception:
+        LOG.error("Could not write P2G object to scene store: '%s'", filename)
+        if os.path.isfile(tmp_filename):
+            os.remove(tmp_filename)
+        raise
+    obj.set_persist()
+
+
+def load_scene_store(filename):
+    """Load the Polar2Grid object saved in a scene store.
+
+    Arrays are not read until they are requested with `get_data_array`.
+    """
+    import h5py
+    from polar2grid.core.containers import P2GJSONDecoder
+
+    class StoreJSONDecoder(P2GJSONDecoder):
+        def dict_to_object(self, obj):
+            for k, v in obj.items():
+                if isinstance(v, str) and v.startswith(STORE_SEPARATOR):
+                    obj[k] = store_prefix + v
+            return super(StoreJSONDecoder, self).dict_to_object(obj)
+
+    store_prefix = os.path.abspath(filename)
+    with h5py.File(filename, "r") as h5_file:
+        version = h5_file.attrs.get(VERSION_ATTR)
+        if version != STORE_VERSION:
+            raise ValueError("Unsupported scene store version '%s' in '%s'" % (version, filename))
+        metadata = h5_file.attrs[METADATA_ATTR]
+    if isinstance(metadata, bytes):
+        metadata = metadata.decode("utf-8")
+    return json.loads(metadata, cls=StoreJSONDecoder)
@@ -312,6 +312,12 @@ def create_basic_parser(*args, **kwargs):
     parser.add_argument('--debug', dest="keep_intermediate", default=False,
                         action='store_true',
                         help="Keep intermediate files for future use.")
+    parser.add_argument('--intermediate-format', choices=("json", "msgpack", "hdf5"), default=None,
+                        help="Save intermediate scenes as JSON or compact binary (msgpack) metadata with one binary "
+                             "file per array or as one HDF5 file (default: based on the filename extension, JSON "
+                             "if not '.msgpack' or '.h5')")
+    parser.add_argument('--intermediate-compression', choices=("gzip", "lzf"), default=None,
+                        help="Compress arrays in HDF5 intermediate scenes (default: uncompressed)")
     parser.add_argument('--overwrite', dest="overwrite_existing", action="store_true",
                         help="Overwrite intermediate or output files if they exist already")
     parser.add_argument('--exit-on-error', dest="exit_on_error", action="store_true",
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+# Copyright (C) 2018 Space Science and Engineering Center (SSEC),
+# University of Wisconsin-Madison.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# This file is part of the polar2grid software package. Polar2grid takes
+# satellite observation data, remaps it, and writes it to a file format for
+#     input into another program.
+# Documentation: http://www.ssec.wisc.edu/software/polar2grid/
+#
+# Written by David Hoese    November 2018
+# University of Wisconsin-Madison
+# Space Science and Engineering Center
+# 1225 West Dayton Street
+# Madison, WI  53706
+# david.hoese@ssec.wisc.edu
+"""Workspace owning the intermediate files of one processing run.
+
+Intermediate files (frontend swath data, ll2cr results, gridded data,
+composites) used to be cleaned up by whichever step created them. A run that
+crashed or was killed left them behind. A `Workspace` tracks every
+intermediate file of a run and removes them all when the run ends: normally,
+from an exception, or from SIGTERM/SIGHUP.
+
+Frequently accessed files (ll2cr columns and rows, remapped data) can be
+placed in a private directory on a fast filesystem like tmpfs
+(``/dev/shm``). The total size of files there is capped and files spill to
+the regular workspace directory when the cap is reached. Private
+directories left by runs that were killed (SIGKILL, power loss) are removed
+the next time a workspace is created in the same place.
+
+:author:       David Hoese (davidh)
+:contact:      david.hoese@ssec.wisc.edu
+:organization: Space Science and Engineering Center (SSEC)
+:copyright:    Copyright (c) 2018 University of Wisconsin SSEC. All rights reserved.
+:date:         Nov 2018
+:license:      GNU GPLv3
+
+"""
+__docformat__ = "restructuredtext en"
+
+import os
+import re
+import atexit
+import shutil
+import signal
+import logging
+import tempfile
+from multiprocessing import util as mp_util
+
+LOG = logging.getLogger(__name__)
+
+# private fast directories are named '<prefix><pid>_<random>'
+WORKSPACE_PREFIX = "p2g_workspace_"
+WORKSPACE_RE = re.compile(re.escape(WORKSPACE_PREFIX) + r"(?P<pid>\d+)_")
+# fraction of the fast filesystem's free space that is left free
+FAST_RESERVE = 0.1
+# signals that should clean up the workspace before the process exits
+CLEANUP_SIGNALS = (signal.SIGTERM, signal.SIGHUP) if hasattr(signal, "SIGHUP") else (signal.SIGTERM,)
+
+
+def _pid_is_running(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # some other user's process
+        return True
+    return True
+
+
+def remove_stale_workspaces(parent_dir):
+    """Remove private workspace directories in `parent_dir` whose processes are not running anymore.
+
+    :returns: list of directories that were removed
+    """
+    removed = []
+    try:
+        names = os.listdir(parent_dir)
+    except OSError:
+        return removed
+    for name in names:
+        match = WORKSPACE_RE.match(name)
+        path = os.path.join(parent_dir, name)
+        if match is None or not os.path.isdir(path) or _pid_is_running(int(match.group("pid"))):
+            continue
+        LOG.warning("Removing workspace left by a previous run: %s", path)
+        shutil.rmtree(path, ignore_errors=True)
+        removed.append(path)
+    return removed
+
+
+class Workspace(object):
+    """Owner of the intermediate files created during one processing run.
+
+    Use as a context manager or call `cleanup` when the run is done. Files are only
+    removed by the process that created the workspace. Forked workers that call
+    `start_worker` own and remove the files they create themselves.
+
+    :param directory: Directory for intermediate files (default: current directory)
+    :param fast_dir: Directory on a fast filesystem (tmpfs) for frequently accessed files (default: not used)
+    :param fast_size: Maximum number of bytes of files to put in `fast_dir` (default: limited by free space)
+    :param keep: Keep intermediate files instead of removing them when the run is done
+    """
+    def __init__(self, directory=None, fast_dir=None, fast_size=None, keep=False):
+        self.directory = directory or ""
+        self.keep = keep
+        self.fast_size = fast_size
+        self.pid = os.getpid()
+        self.files = set()
+        # fast directory file -> number of bytes reserved for it
+        self.fast_files = {}
+        self._old_handlers = {}
+        self.fast_dir = None
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        if fast_dir is not None:
+            if keep:
+                LOG.info("Intermediate files are being kept, not using fast workspace directory '%s'", fast_dir)
+            else:
+                remove_stale_workspaces(fast_dir)
+                self.fast_dir = tempfile.mkdtemp(prefix="%s%d_" % (WORKSPACE_PREFIX, self.pid), dir=fast_dir)
+                LOG.debug("Using fast workspace directory '%s'", self.fast_dir)
+        # backstop for exits that don't go through `cleanup` (sys.exit, uncaught exceptions)
+        atexit.register(self.cleanup)
+
+    def __enter__(self):
+        self.install_signal_handlers()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.cleanup()
+        self.restore_signal_handlers()
+
+    def start_worker(self, num_workers=1):
+        """Make this (forked) worker process the owner of the files it creates from now on.
+
+        The worker's files are removed when it exits, including when it is terminated (SIGTERM), and
+        files in the fast directory go to a private subdirectory. The fast directory space left in the
+        parent is split evenly between `num_workers` workers. Files tracked by the parent process are
+        left to the parent.
+        """
+        parent_fast_used = sum(max(reserved, written) for reserved, written in self._fast_sizes())
+        self.pid = os.getpid()
+        self.files = set()
+        self.fast_files = {}
+        if self.fast_dir is not None:
+            self.fast_dir = tempfile.mkdtemp(prefix="worker%d_" % (self.pid,), dir=self.fast_dir)
+            if self.fast_size is not None:
+                self.fast_size = max(self.fast_size - parent_fast_used, 0) // num_workers
+        # worker processes exit without running atexit functions, only multiprocessing finalizers
+        mp_util.Finalize(None, self.cleanup, exitpriority=10)
+        self.install_signal_handlers()
+
+    def _handle_signal(self, signum, frame):
+        if os.getpid() != self.pid:
+            # forked worker processes die as if the handler was never installed
+            signal.signal(signum, signal.SIG_DFL)
+            os.kill(os.getpid(), signum)
+            return
+        LOG.warning("Received signal %d, cleaning up intermediate files", signum)
+        # unwinds the stack so files being written are closed before they are removed
+        raise SystemExit(128 + signum)
+
+    def install_signal_handlers(self):
+        """Clean up when the process is terminated (SIGTERM) or its terminal goes away (SIGHUP)."""
+        for signum in CLEANUP_SIGNALS:
+            try:
+                self._old_handlers[signum] = signal.signal(signum, self._handle_signal)
+            except ValueError:
+                # signal handlers can only be installed in the main thread
+                LOG.debug("Could not install handler for signal %d", signum)
+
+    def restore_signal_handlers(self):
+        for signum, handler in self._old_handlers.items():
+            signal.signal(signum, handler)
+        self._old_handlers = {}
+
+    def _fast_sizes(self):
+        """Yield the bytes reserved for and the bytes written to each file in the fast directory."""
+        for fp, reserved in self.fast_files.items():
+            yield reserved, os.path.getsize(fp) if os.path.isfile(fp) else 0
+
+    def _fits_in_fast_dir(self, nbytes):
+        if self.fast_dir is None:
+            return False
+        # files that haven't been written yet count with the size they will be
+        sizes = list(self._fast_sizes())
+        used = sum(max(reserved, written) for reserved, written in sizes)
+        if self.fast_size is not None and used + nbytes > self.fast_size:
+            return False
+        pending = sum(max(reserved - written, 0) for reserved, written in sizes)
+        stat = os.statvfs(self.fast_dir)
+        return pending + nbytes <= stat.f_bavail * stat.f_frsize * (1 - FAST_RESERVE)
+
+    def path(self, filename, nbytes=None, fast=False):
+        """Get the path for a new intermediate file and track it.
+
+        :param filename: Name of the file, placed in the workspace directory if there is one
+        :param nbytes: Size the file will be, required to put it in the fast directory where it is reserved
+                       until the file is removed
+        :param fast: Put the file in the fast directory if there is room for it
+        """
+        basename = os.path.basename(filename)
+        if fast and nbytes is not None and self._fits_in_fast_dir(nbytes):
+            path = os.path.join(self.fast_dir, basename)
+            self.fast_files[path] = nbytes
+        else:
+            if fast and self.fast_dir is not None:
+                LOG.debug("Fast workspace directory is full, writing '%s' to disk", basename)
+            path = os.path.join(self.directory, basename) if self.directory else filename
+        self.files.add(path)
+        return path
+
+    def track(self, *filepaths):
+        """Make the workspace responsible for removing files that were created elsewhere."""
+        for fp in filepaths:
+            if isinstance(fp, str):
+                self.files.add(fp)
+
+    def adopt(self, p2g_obj):
+        """Track every binary file referenced by a P2G scene or product (and any objects inside it)."""
+        from polar2grid.core.containers import BaseP2GObject
+        from polar2grid.core.scene_store import is_store_path
+        for key, value in p2g_obj.items():
+            if isinstance(value, BaseP2GObject):
+                self.adopt(value)
+            elif key in p2g_obj.cleanup_kwargs and isinstance(value, str) and not is_store_path(value):
+                self.files.add(value)
+
+    def remove(self, *filepaths):
+        """Remove intermediate files that aren't needed anymore (unless they are being kept)."""
+        for fp in filepaths:
+            if not isinstance(fp, str):
+                continue
+            self.files.discard(fp)
+            self.fast_files.pop(fp, None)
+            if not self.keep and os.path.isfile(fp):
+                LOG.debug("Removing intermediate file '%s'...", fp)
+                try:
+                    os.remove(fp)
+                except OSError:
+                    LOG.warning("Could not remove intermediate file '%s'", fp)
+
+    def cleanup(self):
+        """Remove all intermediate files (unless they are being kept) and the private fast directory."""
+        if os.getpid() != self.pid:
+            return
+        if not self.keep and self.files:
+            LOG.debug("Removing %d intermediate files", len(self.files))
+        self.remove(*list(self.files))
+        if self.fast_dir is not None:
+            shutil.rmtree(self.fast_dir, ignore_errors=True)
+            self.fast_dir = None
+        self.fast_files = {}
+
+
+def add_workspace_arguments(parser):
+    """Add the command line arguments used by `workspace_from_args`."""
+    group = parser.add_argument_group(title="Workspace")
+    group.add_argument("--workspace-dir", dest="workspace_dir", default=None,
+                       help="Directory for intermediate files (default: current directory)")
+    group.add_argument("--tmpfs-dir", dest="tmpfs_dir", default=None,
+                       help="Put frequently accessed intermediate files (ll2cr and remapping results) in a private "
+                            "directory here, usually a tmpfs like '/dev/shm' (default: not used)")
+    group.add_argument("--tmpfs-size", dest="tmpfs_size", type=float, default=None,
+                       help="Maximum size in GB of intermediate files in '--tmpfs-dir', files are written to the "
+                            "workspace directory when it is full (default: limited by free space)")
+    return group
+
+
+def workspace_from_args(args):
+    """Create a `Workspace` from the arguments added by `add_workspace_arguments`."""
+    fast_size = None if args.tmpfs_size is None else int(args.tmpfs_size * 1024 ** 3)
+    return Workspace(args.workspace_dir, fast_dir=args.tmpfs_dir, fast_size=fast_size,
+                     keep=args.keep_intermediate)
@@ -42,14 +42,18 @@ __docformat__ = "restructuredtext en"
 import sys
 
 import logging
-import numpy as np
+import multiprocessing
 import pkg_resources
+import queue
 from polar2grid.readers import ReaderWrapper, convert_satpy_to_p2g_swath, convert_satpy_to_p2g_gridded
-from polar2grid.readers import dataarray_to_gridded_product
+from polar2grid.readers import dataarray_to_gridded_product, gridded_product_to_dataarray, merge_rgb_channels
+from polar2grid.readers import rgb_channels_to_dataarray
 from polar2grid.remap import Remapper, add_remap_argument_groups, SATPY_RESAMPLERS
-from satpy import Scene, DatasetID, CHUNK_SIZE
+from polar2grid.remap.remap import init_worker
+from polar2grid.core.containers import INTERMEDIATE_EXTENSIONS, intermediate_format_from_filename
+from polar2grid.core.workspace import add_workspace_arguments, workspace_from_args
+from satpy import Scene, DatasetID
 from satpy.utils import TRACE_LEVEL
-from xarray import DataArray
 import dask.array as da
 
 ### Return Status Values ###
@@ -136,6 +140,16 @@ def main_frontend(argv=sys.argv[1:]):
         return 0
 
     scene = f.create_scene(**args.subgroup_args["Frontend Swath Extraction"])
+    intermediate_format = args.intermediate_format
+    if intermediate_format is None and args.output_filename:
+        intermediate_format = intermediate_format_from_filename(args.output_filename)
+    if args.output_filename and intermediate_format != "json":
+        scene.save(args.output_filename, intermediate_format=intermediate_format,
+                   compression=args.intermediate_compression)
+        return 0
+    elif intermediate_format not in (None, "json"):
+        raise ValueError("An output filename ('-o') is required to save a %s scene" % (intermediate_format,))
+
     json_str = scene.dumps(persist=True)
     if args.output_filename:
         with open(args.output_filename, 'w') as output_file:
@@ -192,8 +206,229 @@ def main_backend(argv=sys.argv[1:]):
     return 0
 
 
+def intermediate_extension(args):
+    """Filename extension for intermediate scenes saved with '--debug'."""
+    return INTERMEDIATE_EXTENSIONS[args.intermediate_format or "json"]
+
+
+def process_grid(grid_name, glue_name, args, frontend, scene, remapper, remap_kwargs, compositor_objects, backend):
+    """Remap, composite, and write the scene for one grid.
+
+    :returns: status value for this grid
+    """
+    LOG = logging.getLogger(glue_name)
+    f = frontend
+    LOG.info("Remapping to grid %s", grid_name)
+    try:
+        gridded_scene = remapper.remap_scene(scene, grid_name, **remap_kwargs)
+        if args.keep_intermediate:
+            filename = glue_name + "_gridded_scene_" + grid_name + intermediate_extension(args)
+            LOG.debug("saving intermediate gridded scene as '%s'", filename)
+            gridded_scene.save(filename, compression=args.intermediate_compression)
+    except (ValueError, KeyError, RuntimeError):
+        LOG.debug("Remapping data exception: ", exc_info=True)
+        LOG.error("Remapping data failed")
+        return STATUS_REMAP_FAIL
+
+    if not isinstance(scene, Scene):
+        # Composition
+        for c, comp in compositor_objects.items():
+            try:
+                LOG.info("Running gridded scene through '%s' compositor", c)
+                gridded_scene = comp.modify_scene(gridded_scene, **args.subgroup_args[c + " Modification"])
+                if args.keep_intermediate:
+                    filename = glue_name + "_gridded_scene_" + grid_name + intermediate_extension(args)
+                    LOG.debug("Updating saved intermediate gridded scene (%s) after compositor", filename)
+                    gridded_scene.save(filename, compression=args.intermediate_compression)
+            except (KeyError, ValueError, RuntimeError):
+                LOG.debug("Compositor Error: ", exc_info=True)
+                LOG.error("Could not properly modify scene using compositor '%s'" % (c,))
+                if args.exit_on_error:
+                    raise RuntimeError("Could not properly modify scene using compositor '%s'" % (c,))
+
+    if isinstance(f, ReaderWrapper) and not isinstance(gridded_scene, Scene):
+        this_grid_definition = None
+        # HACK: Create SatPy composites that were either separated before
+        # resampling or needed resampling to be created
+        rgbs = {}
+        for product_name in gridded_scene.keys():
+            rgb_name = product_name[:-6]
+            # Keep track of one of the grid definitions
+            if this_grid_definition is None:
+                this_grid_definition = gridded_scene[product_name]["grid_definition"]
+
+            if product_name.endswith("rgb_0") or product_name.endswith("rgb_1") or product_name.endswith("rgb_2"):
+                if rgb_name not in rgbs:
+                    rgbs[rgb_name] = [None, None, None]
+                chn_idx = int(product_name[-1])
+                rgbs[rgb_name][chn_idx] = product_name
+        # Satpy reads the remapped channels of RGBs directly. Only the RGBs still needed after compositing are
+        # merged and everything is written with one dask store at the end.
+        rgb_channels = {}
+        for rgb_name, v in rgbs.items():
+            rgb_channels[rgb_name] = [gridded_scene.pop(channel_name) for channel_name in v]
+
+        # Create composites that satpy couldn't complete until after remapping
+        stores = []
+        composite_names = f.missing_datasets
+        if composite_names:
+            area = this_grid_definition.to_satpy_area()
+            tmp_scene = Scene()
+            satpy_products = list(gridded_scene.values()) + [v[0] for v in rgb_channels.values()]
+            for v in satpy_products:
+                ds_id = DatasetID.from_dict(v)
+                if v["product_name"] in gridded_scene:
+                    tmp_scene[ds_id] = gridded_product_to_dataarray(v, area)
+                else:
+                    rgb_name = v["product_name"][:-6]
+                    tmp_scene[ds_id] = rgb_channels_to_dataarray(rgb_channels[rgb_name], area, v)
+                if isinstance(v, set):
+                    tmp_scene.attrs["sensor"].update(v["sensor"])
+                else:
+                    tmp_scene.attrs["sensor"].add(v["sensor"])
+            # Overwrite the wishlist that will include the above assigned datasets
+            tmp_scene.wishlist = f.wishlist.copy()
+            comps, mods = tmp_scene.cpl.load_compositors(tmp_scene.attrs["sensor"])
+            tmp_scene.dep_tree.compositors = comps
+            tmp_scene.dep_tree.modifiers = mods
+            tmp_scene.dep_tree.find_dependencies(tmp_scene.wishlist.copy())
+            tmp_scene.generate_composites()
+            tmp_scene.unload()
+            # Add any new Datasets to our P2G Scene if SatPy created them
+            for ds in tmp_scene:
+                ds_id = DatasetID.from_dict(ds.attrs)
+                if ds_id.name not in gridded_scene and ds_id.name not in rgb_channels:
+                    LOG.debug("Adding Dataset from SatPy Commpositing: %s", ds_id)
+                    gridded_scene[ds_id.name] = dataarray_to_gridded_product(ds, this_grid_definition,
+                                                                             stores=stores)
+            # Remove any Products from P2G Scene that SatPy decided it didn't need anymore
+            for k, v in list(gridded_scene.items()):
+                if v['name'] not in tmp_scene:
+                    LOG.debug("Removing Dataset that is no longer used: %s", k)
+                    del gridded_scene[k]
+            for k, v in list(rgb_channels.items()):
+                if v[0]['name'] not in tmp_scene:
+                    LOG.debug("Removing Dataset that is no longer used: %s", k)
+                    del rgb_channels[k]
+            del tmp_scene, v
+
+        LOG.debug("Putting RGBs back together again")
+        for rgb_name, v in rgb_channels.items():
+            gridded_scene[rgb_name] = merge_rgb_channels(rgb_name, v, stores=stores)
+        if stores:
+            sources, targets = zip(*stores)
+            da.store(list(sources), list(targets))
+        del stores, rgb_channels
+
+    if isinstance(gridded_scene, Scene):
+        LOG.debug("Converting satpy Scene to P2G Gridded Scene")
+        # Convert it to P2G Gridded Scene
+        gridded_scene = convert_satpy_to_p2g_gridded(f, gridded_scene)
+
+    if remapper.workspace is not None:
+        # gridded files made by compositors and satpy conversion are intermediate files too
+        remapper.workspace.adopt(gridded_scene)
+
+    # Writer
+    # the backend is the last step that needs the gridded data so it may rescale products in place
+    for gridded_product in gridded_scene.values():
+        gridded_product.set_consumers(1)
+    try:
+        LOG.info("Creating output from data mapped to grid %s", grid_name)
+        backend.create_output_from_scene(gridded_scene, **args.subgroup_args["Backend Output Creation"])
+    except (ValueError, KeyError, RuntimeError):
+        LOG.debug("Writer output creation exception: ", exc_info=True)
+        LOG.error("Writer output creation failed (see log for details)")
+        return STATUS_BACKEND_FAIL
+
+    LOG.info("Processing data for grid %s complete", grid_name)
+    # Force deletion and eventual garbage collection of the scene objects
+    del gridded_scene
+    return STATUS_SUCCESS
+
+
+# Arguments to `process_grid` inherited by forked grid worker processes.
+# The scene and other objects are never pickled so workers share the memory mapped swath data.
+_GRID_JOB_ARGS = None
+
+
+def _init_grid_worker(workspace, num_workers):
+    init_worker()
+    if workspace is not None:
+        workspace.start_worker(num_workers)
+
+
+def _process_grid_job(grid_name):
+    return process_grid(grid_name, *_GRID_JOB_ARGS)
+
+
+def process_grids(grids, grid_workers, *args, workspace=None):
+    """Run `process_grid` for every grid, `grid_workers` grids at a time in separate processes.
+
+    A grid is only sent to a worker when one is free so no new grids are started after a failure
+    with `exit_on_error`. Grids that are already running are allowed to finish writing their output.
+    Each worker removes the intermediate files it created in `workspace` when it exits.
+
+    :returns: combined status value for all grids that were processed
+    """
+    global _GRID_JOB_ARGS
+    LOG = logging.getLogger(args[0])
+    exit_on_error = args[1].exit_on_error
+    status_to_return = STATUS_SUCCESS
+    if grid_workers <= 1 or len(grids) <= 1:
+        for grid_name in grids:
+            status = process_grid(grid_name, *args)
+            status_to_return |= status
+            if status != STATUS_SUCCESS and exit_on_error:
+                break
+        return status_to_return
+
+    grids = list(grids)
+    num_workers = min(grid_workers, len(grids))
+    LOG.info("Processing %d grids with %d worker processes", len(grids), num_workers)
+    _GRID_JOB_ARGS = args
+    pool = multiprocessing.get_context("fork").Pool(num_workers, _init_grid_worker, (workspace, num_workers))
+    # statuses (or exceptions) of finished grids
+    results = queue.Queue()
+    next_grid = 0
+    running = 0
+    stop = False
+    error = None
+    try:
+        while True:
+            while not stop and next_grid < len(grids) and running < num_workers:
+                pool.apply_async(_process_grid_job, (grids[next_grid],),
+                                 callback=results.put, error_callback=results.put)
+                next_grid += 1
+                running += 1
+            if not running:
+                break
+            result = results.get()
+            running -= 1
+            if isinstance(result, BaseException):
+                LOG.error("Processing a grid failed: %s", result)
+                error = error or result
+                stop = True
+                continue
+            status_to_return |= result
+            if result != STATUS_SUCCESS and exit_on_error:
+                LOG.debug("Waiting for %d running grids to finish before exiting", running)
+                stop = True
+        pool.close()
+    except BaseException:
+        # interrupted (Ctrl+C, SIGTERM), running grids are stopped
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+        _GRID_JOB_ARGS = None
+    if error is not None:
+        raise error
+    return status_to_return
+
+
 def main(argv=sys.argv[1:]):
-    from polar2grid.core.script_utils import setup_logging, create_basic_parser, create_exc_handler, rename_log_file, ExtendAction
+    from polar2grid.core.script_utils import setup_logging, create_basic_parser, create_exc_handler, ExtendAction
     from polar2grid.compositors import CompositorManager
     frontends = available_frontends()
     backends = available_backends()
@@ -232,6 +467,9 @@ def main(argv=sys.argv[1:]):
                         help="List of files or directories to extract data from")
     parser.add_argument('-d', dest='data_files', nargs="+", default=[], action=ExtendAction,
                         help="Data directories to look for input data files (equivalent to -f)")
+    parser.add_argument('--grid-workers', dest='grid_workers', type=int, default=1,
+                        help="Number of grids to remap and write at the same time in separate processes (default 1)")
+    add_workspace_arguments(parser)
     global_keywords = ("keep_intermediate", "overwrite_existing", "exit_on_error")
     args = parser.parse_args(argv, global_keywords=global_keywords, subgroup_titles=subgroup_titles)
 
@@ -250,6 +488,18 @@ def main(argv=sys.argv[1:]):
     sys.excepthook = create_exc_handler(LOG.name)
     LOG.debug("Starting script with arguments: %s", " ".join(sys.argv))
 
+    # every intermediate file created from here on is owned by the workspace and removed when we are done
+    with workspace_from_args(args) as workspace:
+        return process_files(args, glue_name, fcls, bcls, compositor_manager, rename_log, workspace)
+
+
+def process_files(args, glue_name, fcls, bcls, compositor_manager, rename_log, workspace):
+    """Run the frontend, remapping, compositors, and backend for the parsed command line arguments.
+
+    :returns: status value for the entire run
+    """
+    from polar2grid.core.script_utils import rename_log_file
+    LOG = logging.getLogger(glue_name)
     # Keep track of things going wrong to tell the user what went wrong (we want to create as much as possible)
     status_to_return = STATUS_SUCCESS
 
@@ -298,8 +548,12 @@ def main(argv=sys.argv[1:]):
 
     try:
         LOG.info("Initializing remapping...")
-        remapper = Remapper(**args.subgroup_args["Remapping Initialization"])
+        remapper = Remapper(workspace=workspace, **args.subgroup_args["Remapping Initialization"])
         remap_kwargs = args.subgroup_args["Remapping"]
+        # arrays kept in memory can only be saved in to an HDF5 scene
+        if remapper.in_memory and args.keep_intermediate and (args.intermediate_format or "json") != "hdf5":
+            LOG.warning("Intermediate gridded scenes are saved as JSON or msgpack files, ignoring '--in-memory'")
+            remapper.in_memory = False
     except (ValueError, KeyError):
         LOG.debug("Remapping initialization exception: ", exc_info=True)
         LOG.error("Remapping initialization failed (see log for details)")
@@ -347,10 +601,11 @@ def main(argv=sys.argv[1:]):
             if (isinstance(scene, Scene) and not scene.datasets) or not scene:
                 LOG.error("No products were returned by the frontend")
                 raise RuntimeError("No products were returned by the frontend")
+            workspace.adopt(scene)
             if args.keep_intermediate:
-                filename = glue_name + "_swath_scene.json"
+                filename = glue_name + "_swath_scene" + intermediate_extension(args)
                 LOG.info("Saving intermediate swath scene as '%s'", filename)
-                scene.save(filename)
+                scene.save(filename, compression=args.intermediate_compression)
     except (ValueError, KeyError, RuntimeError):
         LOG.debug("Frontend data extraction exception: ", exc_info=True)
         LOG.error("Frontend data extraction failed (see log for details)")
@@ -380,124 +635,12 @@ def main(argv=sys.argv[1:]):
     LOG.debug("Grids that will be mapped to: %r", grids)
 
     # Remap
-    for grid_name in grids:
-        LOG.info("Remapping to grid %s", grid_name)
-        try:
-            gridded_scene = remapper.remap_scene(scene, grid_name, **remap_kwargs)
-            if args.keep_intermediate:
-                filename = glue_name + "_gridded_scene_" + grid_name + ".json"
-                LOG.debug("saving intermediate gridded scene as '%s'", filename)
-                gridded_scene.save(filename)
-        except (ValueError, KeyError, RuntimeError):
-            LOG.debug("Remapping data exception: ", exc_info=True)
-            LOG.error("Remapping data failed")
-            status_to_return |= STATUS_REMAP_FAIL
-            if args.exit_on_error:
-                return status_to_return
-            continue
-
-        if not isinstance(scene, Scene):
-            # Composition
-            for c, comp in compositor_objects.items():
-                try:
-                    LOG.info("Running gridded scene through '%s' compositor", c)
-                    gridded_scene = comp.modify_scene(gridded_scene, **args.subgroup_args[c + " Modification"])
-                    if args.keep_intermediate:
-                        filename = glue_name + "_gridded_scene_" + grid_name + ".json"
-                        LOG.debug("Updating saved intermediate gridded scene (%s) after compositor", filename)
-                        gridded_scene.save(filename)
-                except (KeyError, ValueError, RuntimeError):
-                    LOG.debug("Compositor Error: ", exc_info=True)
-                    LOG.error("Could not properly modify scene using compositor '%s'" % (c,))
-                    if args.exit_on_error:
-                        raise RuntimeError("Could not properly modify scene using compositor '%s'" % (c,))
-
-        if isinstance(f, ReaderWrapper) and not isinstance(gridded_scene, Scene):
-            this_grid_definition = None
-            # HACK: Create SatPy composites that were either separated before
-            # resampling or needed resampling to be created
-            rgbs = {}
-            for product_name in gridded_scene.keys():
-                rgb_name = product_name[:-6]
-                # Keep track of one of the grid definitions
-                if this_grid_definition is None:
-                    this_grid_definition = gridded_scene[product_name]["grid_definition"]
-
-                if product_name.endswith("rgb_0") or product_name.endswith("rgb_1") or product_name.endswith("rgb_2"):
-                    if rgb_name not in rgbs:
-                        rgbs[rgb_name] = [None, None, None]
-                    chn_idx = int(product_name[-1])
-                    rgbs[rgb_name][chn_idx] = product_name
-            LOG.debug("Putting RGBs back together again")
-            for rgb_name, v in rgbs.items():
-                r = gridded_scene.pop(v[0])
-                g = gridded_scene.pop(v[1])
-                b = gridded_scene.pop(v[2])
-                new_info = r.copy()
-                new_info["grid_data"] = new_info["grid_data"].replace(v[0], rgb_name)
-                new_info["product_name"] = rgb_name
-                data = np.memmap(new_info["grid_data"], dtype=new_info["data_type"],
-                                 mode="w+", shape=(3, new_info["grid_definition"]["height"], new_info["grid_definition"]["width"]))
-                data[0] = r.get_data_array()[:]
-                data[1] = g.get_data_array()[:]
-                data[2] = b.get_data_array()[:]
-                gridded_scene[rgb_name] = new_info
-                del data, new_info
-
-            # Create composites that satpy couldn't complete until after remapping
-            composite_names = f.missing_datasets
-            if composite_names:
-                tmp_scene = Scene()
-                for k, v in gridded_scene.items():
-                    ds_id = DatasetID.from_dict(v)
-                    dask_arr = da.from_array(v.get_data_array(), chunks=CHUNK_SIZE)
-                    tmp_scene[ds_id] = DataArray(dask_arr, attrs=v)
-                    tmp_scene[ds_id].attrs["area"] = this_grid_definition.to_satpy_area()
-                    if isinstance(v, set):
-                        tmp_scene.attrs["sensor"].update(v["sensor"])
-                    else:
-                        tmp_scene.attrs["sensor"].add(v["sensor"])
-                # Overwrite the wishlist that will include the above assigned datasets
-                tmp_scene.wishlist = f.wishlist.copy()
-                comps, mods = tmp_scene.cpl.load_compositors(tmp_scene.attrs["sensor"])
-                tmp_scene.dep_tree.compositors = comps
-                tmp_scene.dep_tree.modifiers = mods
-                tmp_scene.dep_tree.find_dependencies(tmp_scene.wishlist.copy())
-                tmp_scene.generate_composites()
-                tmp_scene.unload()
-                # Add any new Datasets to our P2G Scene if SatPy created them
-                for ds in tmp_scene:
-                    ds_id = DatasetID.from_dict(ds.attrs)
-                    if ds_id.name not in gridded_scene:
-                        LOG.debug("Adding Dataset from SatPy Commpositing: %s", ds_id)
-                        gridded_scene[ds_id.name] = dataarray_to_gridded_product(ds, this_grid_definition)
-                # Remove any Products from P2G Scene that SatPy decided it didn't need anymore
-                for k, v in list(gridded_scene.items()):
-                    if v['name'] not in tmp_scene:
-                        LOG.debug("Removing Dataset that is no longer used: %s", k)
-                        del gridded_scene[k]
-                del tmp_scene, v
-
-        if isinstance(gridded_scene, Scene):
-            LOG.debug("Converting satpy Scene to P2G Gridded Scene")
-            # Convert it to P2G Gridded Scene
-            gridded_scene = convert_satpy_to_p2g_gridded(f, gridded_scene)
-
-        # Writer
-        try:
-            LOG.info("Creating output from data mapped to grid %s", grid_name)
-            backend.create_output_from_scene(gridded_scene, **args.subgroup_args["Backend Output Creation"])
-        except (ValueError, KeyError, RuntimeError):
-            LOG.debug("Writer output creation exception: ", exc_info=True)
-            LOG.error("Writer output creation failed (see log for details)")
-            status_to_return |= STATUS_BACKEND_FAIL
-            if args.exit_on_error:
-                return status_to_return
-            continue
-
-        LOG.info("Processing data for grid %s complete", grid_name)
-        # Force deletion and eventual garbage collection of the scene objects
-        del gridded_scene
+    grid_workers = args.grid_workers
+    if grid_workers > 1 and isinstance(scene, Scene):
+        LOG.warning("Grid workers are not supported with satpy resampling, grids will be processed one at a time")
+        grid_workers = 1
+    status_to_return |= process_grids(grids, grid_workers, glue_name, args, f, scene, remapper, remap_kwargs,
+                                      compositor_objects, backend, workspace=workspace)
     del scene
     return status_to_return
 
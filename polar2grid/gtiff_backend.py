@@ -75,6 +75,19 @@ def _proj4_to_srs(proj4_str):
     return srs
 
 
+class _GeotiffBandWriter(object):
+    """Target for `dask.array.store` that writes blocks of data to a geotiff band."""
+    def __init__(self, gtiff_band, output_filename):
+        self.gtiff_band = gtiff_band
+        self.output_filename = output_filename
+
+    def __setitem__(self, key, value):
+        y_slice, x_slice = key
+        if self.gtiff_band.WriteArray(np.asarray(value), x_slice.start or 0, y_slice.start or 0) != 0:
+            LOG.error("Could not write band data to geotiff '%s'" % (self.output_filename,))
+            raise ValueError("Could not write band data to geotiff '%s'" % (self.output_filename,))
+
+
 def create_geotiff(data, output_filename, proj4_str, geotransform, etype=gdal.GDT_UInt16, compress=None,
                    quicklook=False, tiled=False, blockxsize=None, blockysize=None, colormap=None,
                    fill_value=None, **kwargs):
@@ -143,7 +156,11 @@ def create_geotiff(data, output_filename, proj4_str, geotransform, etype=gdal.GD
             LOG.debug("Data min: %f, max: %f" % (band_data.min(), band_data.max()))
 
         # Write the data
-        if gtiff_band.WriteArray(band_data) != 0:
+        if not isinstance(band_data, np.ndarray):
+            # dask array, blocks are computed in parallel but GDAL can only write one at a time
+            import dask.array as da
+            da.store(band_data, _GeotiffBandWriter(gtiff_band, output_filename), lock=True)
+        elif gtiff_band.WriteArray(band_data) != 0:
             LOG.error("Could not write band 1 data to geotiff '%s'" % (output_filename,))
             raise ValueError("Could not write band 1 data to geotiff '%s'" % (output_filename,))
 
@@ -170,9 +187,11 @@ np2etype = {
 
 
 class Backend(roles.BackendRole):
-    def __init__(self, rescale_configs=None, **kwargs):
+    def __init__(self, rescale_configs=None, block_rows=None, **kwargs):
         self.rescale_configs = rescale_configs or [DEFAULT_RCONFIG]
         self.rescaler = Rescaler(*self.rescale_configs)
+        # rescale and write this many rows at a time instead of whole products
+        self.block_rows = block_rows
         super(Backend, self).__init__(**kwargs)
 
     @property
@@ -208,10 +227,11 @@ class Backend(roles.BackendRole):
             else:
                 LOG.warning("Geotiff file already exists, will overwrite: %s", output_filename)
 
+        lazy_kwargs = {"lazy": True, "chunk_rows": self.block_rows} if self.block_rows else {}
         try:
             if np.issubdtype(data_type, np.floating):
                 # assume they don't want to scale floating point
-                data = gridded_product.get_data_array()
+                data = gridded_product.get_data_array(**lazy_kwargs)
                 rescale_options = {}
             else:
                 LOG.debug("Scaling %s data to fit in geotiff...", gridded_product["product_name"])
@@ -219,7 +239,8 @@ class Backend(roles.BackendRole):
                                                                     data_type,
                                                                     inc_by_one=inc_by_one,
                                                                     fill_value=fill_value)
-                data = self.rescaler.rescale_product(gridded_product, data_type, rescale_options=rescale_options.copy())
+                data = self.rescaler.rescale_product(gridded_product, data_type, rescale_options=rescale_options.copy(),
+                                                     **lazy_kwargs)
 
             # Create the geotiff
             # X and Y rotation are 0 in most cases so we just hard-code it
@@ -247,6 +268,9 @@ def add_backend_argument_groups(parser):
     group = parser.add_argument_group(title="Backend Initialization")
     group.add_argument('--rescale-configs', nargs="*", dest="rescale_configs",
                        help="alternative rescale configuration files")
+    group.add_argument('--block-rows', dest="block_rows", type=int, default=None,
+                       help="rescale and write products this many rows at a time using multiple threads "
+                            "(default: entire product at once)")
     group = parser.add_argument_group(title="Backend Output Creation")
     group.add_argument("--output-pattern", default=DEFAULT_OUTPUT_PATTERN,
                        help="output filenaming pattern")
@@ -44,6 +44,7 @@ import logging
 import numpy as np
 import os
 from pyresample.geometry import AreaDefinition
+from satpy import CHUNK_SIZE
 from satpy.scene import Scene
 import dask.array as da
 import xarray as xr
@@ -52,6 +53,8 @@ from polar2grid.core import containers, roles
 
 LOG = logging.getLogger(__name__)
 
+RGB_BANDS = ("R", "G", "B", "A")
+
 
 def normalize_satellite_name(input_sat):
     """Normalize satellite names for Polar2Grid (not Geo2Grid)."""
@@ -71,7 +74,32 @@ def normalize_satellite_name(input_sat):
     return input_sat
 
 
-def area_to_swath_def(area, chunks=4096, overwrite_existing=False):
+def _store(source, target, stores=None):
+    """Write a dask array to `target` now or add it to `stores` to be written later.
+
+    When `stores` is a list the (source, target) pair is appended to it so the
+    caller can write everything with one `dask.array.store` call. Tasks shared
+    between sources (file reads, calibration, geolocation) are then only
+    computed once.
+    """
+    if stores is None:
+        da.store(source, target)
+    else:
+        stores.append((source, target))
+
+
+def _geolocation_key(area):
+    """Identify the geolocation arrays of `area` so swath definitions built from the same arrays are shared."""
+    lons = getattr(area, "lons", None)
+    lats = getattr(area, "lats", None)
+    lons = getattr(lons, "data", lons)
+    lats = getattr(lats, "data", lats)
+    if isinstance(lons, da.Array) and isinstance(lats, da.Array):
+        return lons.name, lats.name
+    return None
+
+
+def area_to_swath_def(area, chunks=4096, overwrite_existing=False, stores=None):
     if hasattr(area, 'lons') and area.lons is not None:
         lons = area.lons
         lats = area.lats
@@ -111,7 +139,7 @@ def area_to_swath_def(area, chunks=4096, overwrite_existing=False):
             LOG.warning("Binary file already exists, will overwrite: %s", filename)
     LOG.info("Writing longitude data to disk cache...")
     lon_arr = np.memmap(filename, mode="w+", dtype=lons.dtype, shape=lons.shape)
-    da.store(lons, lon_arr)
+    _store(lons, lon_arr, stores)
 
     # Write lats to disk
     filename = info["latitude"]
@@ -123,7 +151,7 @@ def area_to_swath_def(area, chunks=4096, overwrite_existing=False):
             LOG.warning("Binary file already exists, will overwrite: %s", filename)
     LOG.info("Writing latitude data to disk cache...")
     lat_arr = np.memmap(filename, mode="w+", dtype=lats.dtype, shape=lats.shape)
-    da.store(lats, lat_arr)
+    _store(lats, lat_arr, stores)
     return containers.SwathDefinition(**info)
 
 
@@ -155,7 +183,7 @@ def area_to_grid_definition(area, overwrite_existing=False):
         )
 
 
-def dataarray_to_swath_product(ds, swath_def, overwrite_existing=False):
+def dataarray_to_swath_product(ds, swath_def, overwrite_existing=False, stores=None):
     info = ds.attrs.copy()
     info.pop("area")
     if ds.ndim == 3:
@@ -218,7 +246,7 @@ def dataarray_to_swath_product(ds, swath_def, overwrite_existing=False):
         LOG.info("Writing band data to disk cache...")
         p2g_arr = np.memmap(filename, mode="w+", dtype=dtype, shape=ds.shape)
         ds = ds.where(ds.notnull(), np.nan)
-        da.store(ds.data.astype(dtype), p2g_arr)
+        _store(ds.data.astype(dtype), p2g_arr, stores)
         yield containers.SwathProduct(**info)
     else:
         for chn_idx in range(channels):
@@ -234,11 +262,11 @@ def dataarray_to_swath_product(ds, swath_def, overwrite_existing=False):
                     LOG.warning("Binary file already exists, will overwrite: %s", filename)
             LOG.info("Writing band data to disk cache...")
             p2g_arr = np.memmap(filename, mode="w+", dtype=dtype, shape=ds.shape[-2:])
-            da.store(ds.data[chn_idx].astype(dtype), p2g_arr)
+            _store(ds.data[chn_idx].astype(dtype), p2g_arr, stores)
             yield containers.SwathProduct(**tmp_info)
 
 
-def dataarray_to_gridded_product(ds, grid_def, overwrite_existing=False):
+def dataarray_to_gridded_product(ds, grid_def, overwrite_existing=False, stores=None):
     info = ds.attrs.copy()
     info.pop("area", None)
     if ds.ndim == 3:
@@ -285,10 +313,56 @@ def dataarray_to_gridded_product(ds, grid_def, overwrite_existing=False):
         else:
             LOG.warning("Binary file already exists, will overwrite: %s", filename)
     p2g_arr = np.memmap(filename, mode="w+", dtype=dtype, shape=ds.shape)
-    da.store(ds.data.astype(dtype), p2g_arr)
+    _store(ds.data.astype(dtype), p2g_arr, stores)
     return containers.GriddedProduct(**info)
 
 
+def _product_dataarray(data, attrs, area):
+    attrs = dict(attrs)
+    attrs["area"] = area
+    if data.ndim == 3:
+        return xr.DataArray(data, dims=("bands", "y", "x"), coords={"bands": list(RGB_BANDS[:data.shape[0]])},
+                            attrs=attrs)
+    return xr.DataArray(data, dims=("y", "x"), attrs=attrs)
+
+
+def gridded_product_to_dataarray(gridded_product, area, chunks=CHUNK_SIZE):
+    """Wrap the data of a gridded product in a DataArray without copying it.
+
+    The memory mapped file (or in-memory array) of the product is only read,
+    one chunk at a time, when the DataArray is computed.
+    """
+    data = gridded_product.get_data_array()
+    chunks = (1,) * (data.ndim - 2) + (chunks, chunks)
+    return _product_dataarray(containers.dask_array_view(data, chunks), gridded_product, area)
+
+
+def rgb_channels_to_dataarray(channel_products, area, attrs, chunks=CHUNK_SIZE):
+    """Stack gridded channel products in to one RGB DataArray without copying them."""
+    channels = [containers.dask_array_view(p.get_data_array(), chunks) for p in channel_products]
+    return _product_dataarray(da.stack(channels), attrs, area)
+
+
+def merge_rgb_channels(rgb_name, channel_products, stores=None):
+    """Create the 3D product of an RGB that was remapped one channel at a time.
+
+    Each channel is written directly to its band of the new product's array
+    (see `_store` for how `stores` is used).
+    """
+    rgb_info = channel_products[0].copy()
+    rgb_info["product_name"] = rgb_name
+    rgb_shape = (len(channel_products), rgb_info["grid_definition"]["height"], rgb_info["grid_definition"]["width"])
+    if isinstance(rgb_info["grid_data"], str):
+        rgb_info["grid_data"] = rgb_info["grid_data"].replace(channel_products[0]["product_name"], rgb_name)
+        data = np.memmap(rgb_info["grid_data"], dtype=rgb_info["data_type"], mode="w+", shape=rgb_shape)
+    else:
+        # in-memory remapping results
+        data = rgb_info["grid_data"] = np.empty(rgb_shape, dtype=rgb_info["data_type"])
+    for chn_idx, channel_product in enumerate(channel_products):
+        _store(channel_product.get_data_array(lazy=True), data[chn_idx], stores)
+    return rgb_info
+
+
 def convert_satpy_to_p2g_swath(frontend, scene, convert_area_defs=True):
     """Convert a Satpy Scene in to a Polar2Grid SwathScene.
 
@@ -297,31 +371,49 @@ def convert_satpy_to_p2g_swath(frontend, scene, convert_area_defs=True):
     their longitude and latitude arrays. If ``False`` then an exception
     is raised when an `AreaDefinition` is encountered.
 
+    All binary files are created first and then written with one
+    `dask.array.store` call so tasks shared between datasets are computed
+    once.
+
     """
     p2g_scene = containers.SwathScene()
     overwrite_existing = frontend.overwrite_existing
     areas = {}
+    geolocations = {}
+    stores = []
     for ds in scene:
         a = ds.attrs['area']
         area_name = getattr(a, 'name', getattr(a, 'description', None))
         if area_name is None:
             # generate an identifying name
             a.name = area_name = "{}_{}".format(a.lons.attrs['name'], a.lats.attrs['name'])
+        geo_key = _geolocation_key(a)
         if area_name in areas:
             swath_def = areas[area_name]
+        elif geo_key is not None and geo_key in geolocations:
+            # different area objects using the same longitude and latitude arrays
+            areas[area_name] = swath_def = geolocations[geo_key]
         elif isinstance(a, AreaDefinition) and not convert_area_defs:
             raise ValueError("AreaDefinition found in SwathScene, will not convert to swath")
         else:
             areas[area_name] = swath_def = area_to_swath_def(ds.attrs["area"],
                                                              chunks=ds.data.chunks,
-                                                             overwrite_existing=overwrite_existing)
+                                                             overwrite_existing=overwrite_existing,
+                                                             stores=stores)
+            if geo_key is not None:
+                geolocations[geo_key] = swath_def
             def_rps = ds.shape[0] if ds.ndim <= 2 else ds.shape[-2]
             swath_def.setdefault("rows_per_scan", ds.attrs.get("rows_per_scan", def_rps))
 
-        for swath_product in dataarray_to_swath_product(ds, swath_def, overwrite_existing=overwrite_existing):
+        for swath_product in dataarray_to_swath_product(ds, swath_def, overwrite_existing=overwrite_existing,
+                                                        stores=stores):
             swath_product.setdefault('reader', frontend.reader)
             p2g_scene[swath_product["product_name"]] = swath_product
 
+    if stores:
+        LOG.info("Writing %d arrays to disk cache...", len(stores))
+        sources, targets = zip(*stores)
+        da.store(list(sources), list(targets))
     return p2g_scene
 
 
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+# Copyright (C) 2018 Space Science and Engineering Center (SSEC),
+# University of Wisconsin-Madison.
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# This file is part of the polar2grid software package. Polar2grid takes
+# satellite observation data, remaps it, and writes it to a file format for
+# input into another program.
+# Documentation: http://www.ssec.wisc.edu/software/polar2grid/
+#
+#     Written by David Hoese    November 2018
+#     University of Wisconsin-Madison
+#     Space Science and Engineering Center
+#     1225 West Dayton Street
+#     Madison, WI  53706
+#     david.hoese@ssec.wisc.edu
+"""Find the swath pixels surrounding every grid cell and their bilinear interpolation weights.
+
+:author:       David Hoese (davidh)
+:contact:      david.hoese@ssec.wisc.edu
+:organization: Space Science and Engineering Center (SSEC)
+:copyright:    Copyright (c) 2018 University of Wisconsin SSEC. All rights reserved.
+:date:         Nov 2018
+:license:      GNU GPLv3
+"""
+__docformat__ = "restructuredtext en"
+
+import numpy
+cimport cython
+cimport numpy
+from libc.math cimport ceil, fabs, floor, isnan, sqrt
+
+ctypedef fused cr_dtype:
+    float
+    double
+
+# tolerance for grid cells that fall exactly on the edge of a swath quadrilateral
+cdef double EDGE_TOLERANCE = 1e-6
+
+
+@cython.cdivision(True)
+cdef inline double _cross(double ax, double ay, double bx, double by) nogil:
+    return ax * by - ay * bx
+
+
+@cython.cdivision(True)
+cdef inline double _solve_u(double hx, double hy, double ex, double ey, double fx, double fy,
+                            double gx, double gy, double v) nogil:
+    # use whichever component is better conditioned
+    cdef double denom_x = ex + gx * v
+    cdef double denom_y = ey + gy * v
+    if fabs(denom_x) >= fabs(denom_y):
+        return (hx - fx * v) / denom_x
+    return (hy - fy * v) / denom_y
+
+
+@cython.cdivision(True)
+cdef bint _inverse_bilinear(double px, double py, double ax, double ay, double bx, double by,
+                            double cx, double cy, double dx, double dy, double *u, double *v) nogil:
+    """Find the fractional location (u, v) of point P in the quadrilateral ABCD.
+
+    U goes from A to B and V goes from A to D.
+
+    :returns: True if the point is inside the quadrilateral
+    """
+    cdef double ex = bx - ax, ey = by - ay
+    cdef double fx = dx - ax, fy = dy - ay
+    cdef double gx = ax - bx + cx - dx, gy = ay - by + cy - dy
+    cdef double hx = px - ax, hy = py - ay
+    cdef double k2 = _cross(gx, gy, fx, fy)
+    cdef double k1 = _cross(ex, ey, fx, fy) + _cross(hx, hy, gx, gy)
+    cdef double k0 = _cross(hx, hy, ex, ey)
+    cdef double w
+    if fabs(k2) < 1e-12:
+        # parallelogram
+        if k1 == 0:
+            return False
+        v[0] = -k0 / k1
+        u[0] = _solve_u(hx, hy, ex, ey, fx, fy, gx, gy, v[0])
+    else:
+        w = k1 * k1 - 4.0 * k0 * k2
+        if w < 0:
+            return False
+        w = sqrt(w)
+        v[0] = (-k1 - w) / (2.0 * k2)
+        u[0] = _solve_u(hx, hy, ex, ey, fx, fy, gx, gy, v[0])
+        if not (-EDGE_TOLERANCE <= u[0] <= 1 + EDGE_TOLERANCE and -EDGE_TOLERANCE <= v[0] <= 1 + EDGE_TOLERANCE):
+            v[0] = (-k1 + w) / (2.0 * k2)
+            u[0] = _solve_u(hx, hy, ex, ey, fx, fy, gx, gy, v[0])
+    if not (-EDGE_TOLERANCE <= u[0] <= 1 + EDGE_TOLERANCE and -EDGE_TOLERANCE <= v[0] <= 1 + EDGE_TOLERANCE):
+        return False
+    u[0] = min(max(u[0], 0.0), 1.0)
+    v[0] = min(max(v[0], 0.0), 1.0)
+    return True
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+cdef void _grid_bilinear_index(const cr_dtype[:, ::1] cols, const cr_dtype[:, ::1] rows, double max_quad_size,
+                               numpy.int64_t[:, ::1] quad_index, numpy.float32_t[:, ::1] u_arr,
+                               numpy.float32_t[:, ::1] v_arr) nogil:
+    cdef Py_ssize_t height = quad_index.shape[0]
+    cdef Py_ssize_t width = quad_index.shape[1]
+    cdef Py_ssize_t swath_rows = cols.shape[0]
+    cdef Py_ssize_t swath_cols = cols.shape[1]
+    cdef Py_ssize_t swath_row, swath_col, cell_row, cell_col, row_start, row_end, col_start, col_end
+    cdef double ax, ay, bx, by, cx, cy, dx, dy
+    cdef double min_x, max_x, min_y, max_y, u, v
+
+    for swath_row in range(swath_rows - 1):
+        for swath_col in range(swath_cols - 1):
+            ax = cols[swath_row, swath_col]
+            ay = rows[swath_row, swath_col]
+            bx = cols[swath_row, swath_col + 1]
+            by = rows[swath_row, swath_col + 1]
+            cx = cols[swath_row + 1, swath_col + 1]
+            cy = rows[swath_row + 1, swath_col + 1]
+            dx = cols[swath_row + 1, swath_col]
+            dy = rows[swath_row + 1, swath_col]
+            if isnan(ax) or isnan(ay) or isnan(bx) or isnan(by) or isnan(cx) or isnan(cy) or isnan(dx) or isnan(dy):
+                continue
+            min_x = min(min(ax, bx), min(cx, dx))
+            max_x = max(max(ax, bx), max(cx, dx))
+            min_y = min(min(ay, by), min(cy, dy))
+            max_y = max(max(ay, by), max(cy, dy))
+            # skip quadrilaterals that can't contain a cell and ones stretched by bad geolocation
+            if max_x < 0 or max_y < 0 or min_x > width - 1 or min_y > height - 1:
+                continue
+            if max_x - min_x > max_quad_size or max_y - min_y > max_quad_size:
+                continue
+            row_start = max(<Py_ssize_t>ceil(min_y - EDGE_TOLERANCE), 0)
+            row_end = min(<Py_ssize_t>floor(max_y + EDGE_TOLERANCE) + 1, height)
+            col_start = max(<Py_ssize_t>ceil(min_x - EDGE_TOLERANCE), 0)
+            col_end = min(<Py_ssize_t>floor(max_x + EDGE_TOLERANCE) + 1, width)
+            for cell_row in range(row_start, row_end):
+                for cell_col in range(col_start, col_end):
+                    # the first quadrilateral found for a cell is used (overlapping scans)
+                    if quad_index[cell_row, cell_col] >= 0:
+                        continue
+                    if _inverse_bilinear(cell_col, cell_row, ax, ay, bx, by, cx, cy, dx, dy, &u, &v):
+                        quad_index[cell_row, cell_col] = swath_row * swath_cols + swath_col
+                        u_arr[cell_row, cell_col] = <numpy.float32_t>u
+                        v_arr[cell_row, cell_col] = <numpy.float32_t>v
+
+
+def grid_bilinear_index(const cr_dtype[:, ::1] cols, const cr_dtype[:, ::1] rows, unsigned int height,
+                        unsigned int width, double max_quad_size):
+    """Find the swath quadrilateral containing the center of every grid cell.
+
+    Every group of 4 neighboring swath pixels makes a quadrilateral in grid space. The grid
+    cells inside each quadrilateral get the flattened index of its upper-left swath pixel and
+    the fractional location of the cell inside it.
+
+    :param cols: 2D array of swath pixel column locations in the grid, NaN for invalid pixels
+    :param rows: 2D array of swath pixel row locations in the grid, NaN for invalid pixels
+    :param height: Number of rows in the output grid
+    :param width: Number of columns in the output grid
+    :param max_quad_size: Quadrilaterals larger than this many grid cells in either direction are skipped
+    :returns: tuple(quad_index, u, v) 2D arrays of the grid's shape, `quad_index` is -1 where no
+              quadrilateral was found, `u` and `v` are the fractional swath column and row offsets
+    """
+    if cols.shape[0] != rows.shape[0] or cols.shape[1] != rows.shape[1]:
+        raise ValueError("Column and row arrays must be the same shape")
+    cdef numpy.ndarray[numpy.int64_t, ndim=2] quad_index = numpy.empty((height, width), dtype=numpy.int64)
+    cdef numpy.ndarray[numpy.float32_t, ndim=2] u_arr = numpy.zeros((height, width), dtype=numpy.float32)
+    cdef numpy.ndarray[numpy.float32_t, ndim=2] v_arr = numpy.zeros((height, width), dtype=numpy.float32)
+    quad_index.fill(-1)
+    cdef numpy.int64_t[:, ::1] quad_index_view = quad_index
+    cdef numpy.float32_t[:, ::1] u_view = u_arr
+    cdef numpy.float32_t[:, ::1] v_view = v_arr
+    with nogil:
+        _grid_bilinear_index(cols, rows, max_quad_size, quad_index_view, u_view, v_view)
+    return quad_index, u_arr, v_arr
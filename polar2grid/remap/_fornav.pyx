@@ -3,10 +3,11 @@ cimport cython
 import numpy
 cimport numpy
 cimport cpython
+from cython.parallel cimport parallel, prange, threadid
 from libc.stdlib cimport calloc, malloc, free
 from libc.math cimport log, exp, sqrt, isnan, NAN
 
-cdef extern from "_fornav_templates.h":
+cdef extern from "_fornav_templates.h" nogil:
     ctypedef float weight_type
     ctypedef float ewa_param_type
     ctypedef float accum_type
@@ -41,6 +42,9 @@ cdef extern from "_fornav_templates.h":
     cdef accum_type **initialize_grid_accums(size_t chan_count, size_t grid_cols, size_t grid_rows)
     cdef weight_type **initialize_grid_weights(size_t chan_count, size_t grid_cols, size_t grid_rows)
     cdef void deinitialize_grids(size_t chan_count, void **grids)
+    cdef void merge_grids(size_t chan_count, size_t grid_cols, size_t grid_rows, int maximum_weight_mode,
+        accum_type **grid_accums, weight_type **grid_weights,
+        accum_type **other_accums, weight_type **other_weights)
 
     cdef int compute_ewa_parameters[CR_TYPE](size_t swath_cols, size_t swath_rows,
         CR_TYPE *uimg, CR_TYPE *vimg, ewa_weight *ewaw, ewa_parameters *ewap)
@@ -70,105 +74,273 @@ ctypedef fused cr_dtype:
     numpy.float64_t
 
 # FUTURE: Add other types, but for now these are the basics
-ctypedef fused image_dtype:
-    numpy.float32_t
-    numpy.float64_t
-    numpy.int8_t
+cdef enum image_type:
+    IMAGE_FLOAT32
+    IMAGE_FLOAT64
+    IMAGE_INT8
+
+IMAGE_TYPES = {
+    numpy.dtype(numpy.float32): IMAGE_FLOAT32,
+    numpy.dtype(numpy.float64): IMAGE_FLOAT64,
+    numpy.dtype(numpy.int8): IMAGE_INT8,
+}
+
+# Channels of the same data type, fill values, and weighting mode that are accumulated together
+ctypedef struct channel_group:
+    image_type dtype
+    size_t start
+    size_t count
+    bint maximum_weight_mode
+    double input_fill
+    double output_fill
 
-ctypedef fused grid_dtype:
-    numpy.float32_t
-    numpy.float64_t
-    numpy.int8_t
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef int compute_group_ewa(channel_group *group, size_t row_offset,
+        size_t swath_cols, size_t rows_per_scan, size_t grid_cols, size_t grid_rows,
+        cr_dtype *cols_pointer, cr_dtype *rows_pointer, void **input_arrays, void **images,
+        accum_type **grid_accums, weight_type **grid_weights, ewa_weight *ewaw, ewa_parameters *ewap) nogil:
+    cdef size_t idx
+    cdef size_t start = group.start
+    if group.dtype == IMAGE_FLOAT32:
+        for idx in range(start, start + group.count):
+            images[idx] = &(<numpy.float32_t *>input_arrays[idx])[row_offset]
+        return compute_ewa(group.count, group.maximum_weight_mode,
+                           swath_cols, rows_per_scan, grid_cols, grid_rows, cols_pointer, rows_pointer,
+                           <numpy.float32_t **>&images[start], <numpy.float32_t>group.input_fill,
+                           &grid_accums[start], &grid_weights[start], ewaw, ewap)
+    elif group.dtype == IMAGE_FLOAT64:
+        for idx in range(start, start + group.count):
+            images[idx] = &(<numpy.float64_t *>input_arrays[idx])[row_offset]
+        return compute_ewa(group.count, group.maximum_weight_mode,
+                           swath_cols, rows_per_scan, grid_cols, grid_rows, cols_pointer, rows_pointer,
+                           <numpy.float64_t **>&images[start], <numpy.float64_t>group.input_fill,
+                           &grid_accums[start], &grid_weights[start], ewaw, ewap)
+    else:
+        for idx in range(start, start + group.count):
+            images[idx] = &(<numpy.int8_t *>input_arrays[idx])[row_offset]
+        return compute_ewa(group.count, group.maximum_weight_mode,
+                           swath_cols, rows_per_scan, grid_cols, grid_rows, cols_pointer, rows_pointer,
+                           <numpy.int8_t **>&images[start], <numpy.int8_t>group.input_fill,
+                           &grid_accums[start], &grid_weights[start], ewaw, ewap)
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef unsigned int write_group_image(channel_group *group, size_t idx, void *output_array, size_t grid_cols, size_t grid_rows,
+        accum_type *grid_accum, weight_type *grid_weights, weight_type weight_sum_min) nogil:
+    if group.dtype == IMAGE_FLOAT32:
+        return write_grid_image(<numpy.float32_t *>output_array, <numpy.float32_t>group.output_fill, grid_cols, grid_rows,
+                                grid_accum, grid_weights, group.maximum_weight_mode, weight_sum_min)
+    elif group.dtype == IMAGE_FLOAT64:
+        return write_grid_image(<numpy.float64_t *>output_array, <numpy.float64_t>group.output_fill, grid_cols, grid_rows,
+                                grid_accum, grid_weights, group.maximum_weight_mode, weight_sum_min)
+    else:
+        return write_grid_image(<numpy.int8_t *>output_array, <numpy.int8_t>group.output_fill, grid_cols, grid_rows,
+                                grid_accum, grid_weights, group.maximum_weight_mode, weight_sum_min)
 
 @cython.boundscheck(False)
 @cython.wraparound(False)
 cdef int fornav(unsigned int *valid_list, size_t chan_count, size_t swath_cols, size_t swath_rows, size_t grid_cols, size_t grid_rows,
             cr_dtype *cols_pointer, cr_dtype *rows_pointer,
-           image_dtype **input_arrays, grid_dtype **output_arrays,
-           image_dtype input_fill, grid_dtype output_fill, size_t rows_per_scan,
-           unsigned int weight_count, weight_type weight_min, weight_type weight_distance_max, weight_type weight_delta_max,
-           weight_type weight_sum_min, bint maximum_weight_mode) except -1:
-    cdef unsigned int row_idx
-    cdef unsigned int idx
+            void **input_arrays, void **output_arrays, channel_group *groups, size_t num_groups, size_t rows_per_scan,
+            unsigned int weight_count, weight_type weight_min, weight_type weight_distance_max, weight_type weight_delta_max,
+            weight_type weight_sum_min, int num_threads) except -1:
+    cdef Py_ssize_t scan_idx
+    cdef Py_ssize_t num_scans = swath_rows // rows_per_scan
+    cdef size_t row_idx
+    cdef size_t idx
+    cdef size_t group_idx
+    cdef int tid
     cdef bint got_point = 0
-    cdef bint tmp_got_point
     cdef int func_result
     cdef cr_dtype *tmp_cols_pointer
     cdef cr_dtype *tmp_rows_pointer
-    cdef image_dtype **input_images
     cdef ewa_weight ewaw
-    cdef ewa_parameters *ewap
+    # Each thread gets its own accumulation and weight grids, parameters, and image pointers
+    # Thread 0's grids are the final grids that the other threads' results are merged in to
+    cdef accum_type ***thread_accums = NULL
+    cdef weight_type ***thread_weights = NULL
+    cdef ewa_parameters **thread_ewap = NULL
+    cdef void ***thread_images = NULL
+    cdef int *thread_got_point = NULL
 
     # other defaults
     if weight_sum_min == -1.0:
         weight_sum_min = weight_min
+    # every thread needs its own grids so there is no point in having more threads than scans
+    if num_threads < 1:
+        num_threads = 1
+    if num_threads > num_scans:
+        num_threads = max(<int>num_scans, 1)
 
     func_result = initialize_weight(chan_count, weight_count, weight_min, weight_distance_max, weight_delta_max,
                       weight_sum_min, &ewaw)
     if func_result < 0:
         raise RuntimeError("Could not initialize weight structure for EWA resampling")
 
-    # Allocate location for storing the sum of all of the pixels involved in each grid cell
-    # XXX: Do these need to be initialized to a fill value?
-    cdef accum_type **grid_accums = initialize_grid_accums(chan_count, grid_cols, grid_rows)
-    if grid_accums is NULL:
-        raise MemoryError()
-    cdef weight_type **grid_weights = initialize_grid_weights(chan_count, grid_cols, grid_rows)
-    if grid_weights is NULL:
-        raise MemoryError()
-    # Allocate memory for the parameters specific to each column
-    ewap = <ewa_parameters *>malloc(swath_cols * sizeof(ewa_parameters))
-    if ewap is NULL:
-        raise MemoryError()
-    # Allocate pointers to the correct portion of the data arrays that we will use
-    input_images = <image_dtype **>malloc(chan_count * sizeof(image_dtype *))
-    if input_images is NULL:
-        raise MemoryError()
-
-
-    # NOTE: Have to use old school pyrex for loop because cython only supports compile-time known steps
-    for row_idx from 0 <= row_idx < swath_rows by rows_per_scan:
-        tmp_cols_pointer = &cols_pointer[row_idx * swath_cols]
-        tmp_rows_pointer = &rows_pointer[row_idx * swath_cols]
-        # print "Current cols pointer: %d" % (<int>tmp_cols_pointer,)
-
-        # Assign the python/numpy array objects to a pointer location for the rest of the functions
-        for idx in range(chan_count):
-            input_images[idx] = &input_arrays[idx][row_idx * swath_cols]
-        # print "Current input 0 pointer: %d" % (<int>input_images[idx],)
-
-        # Calculate EWA parameters for each column index
-        func_result = compute_ewa_parameters(swath_cols, rows_per_scan, tmp_cols_pointer, tmp_rows_pointer, &ewaw, ewap)
-        if func_result < 0:
-            got_point = got_point or 0
-            # raise RuntimeError("Could compute EWA parameters for EWA resampling")
-            continue
-
-        # NOTE: In the C version this is where the image array data is loaded
-        tmp_got_point = compute_ewa(chan_count, maximum_weight_mode,
-                    swath_cols, rows_per_scan, grid_cols, grid_rows,
-                    tmp_cols_pointer, tmp_rows_pointer,
-                    input_images, input_fill, grid_accums, grid_weights, &ewaw, ewap)
-
-        got_point = got_point or tmp_got_point
-
-    free(input_images)
-    free(ewap)
-
-    if not got_point:
-        raise RuntimeError("EWA Resampling: No swath pixels found inside grid to be resampled")
-
-    for idx in range(chan_count):
-        valid_list[idx] = write_grid_image(output_arrays[idx], output_fill, grid_cols, grid_rows,
-                                          grid_accums[idx], grid_weights[idx], maximum_weight_mode, weight_sum_min)
-
-    # free(grid_accums)
-    deinitialize_weight(&ewaw)
-    deinitialize_grids(chan_count, <void **>grid_accums)
-    deinitialize_grids(chan_count, <void **>grid_weights)
+    try:
+        thread_accums = <accum_type ***>calloc(num_threads, sizeof(accum_type **))
+        thread_weights = <weight_type ***>calloc(num_threads, sizeof(weight_type **))
+        thread_ewap = <ewa_parameters **>calloc(num_threads, sizeof(ewa_parameters *))
+        thread_images = <void ***>calloc(num_threads, sizeof(void **))
+        thread_got_point = <int *>calloc(num_threads, sizeof(int))
+        if thread_accums is NULL or thread_weights is NULL or thread_ewap is NULL or thread_images is NULL or thread_got_point is NULL:
+            raise MemoryError()
+        for tid in range(num_threads):
+            # Allocate location for storing the sum of all of the pixels involved in each grid cell
+            thread_accums[tid] = initialize_grid_accums(chan_count, grid_cols, grid_rows)
+            if thread_accums[tid] is NULL:
+                raise MemoryError()
+            thread_weights[tid] = initialize_grid_weights(chan_count, grid_cols, grid_rows)
+            if thread_weights[tid] is NULL:
+                raise MemoryError()
+            # Allocate memory for the parameters specific to each column
+            thread_ewap[tid] = <ewa_parameters *>malloc(swath_cols * sizeof(ewa_parameters))
+            if thread_ewap[tid] is NULL:
+                raise MemoryError()
+            # Allocate pointers to the correct portion of the data arrays that we will use
+            thread_images[tid] = <void **>malloc(chan_count * sizeof(void *))
+            if thread_images[tid] is NULL:
+                raise MemoryError()
+
+        with nogil, parallel(num_threads=num_threads):
+            tid = threadid()
+            for scan_idx in prange(num_scans, schedule='dynamic'):
+                row_idx = scan_idx * rows_per_scan
+                tmp_cols_pointer = &cols_pointer[row_idx * swath_cols]
+                tmp_rows_pointer = &rows_pointer[row_idx * swath_cols]
+
+                # Calculate EWA parameters for each column index once for every channel
+                func_result = compute_ewa_parameters(swath_cols, rows_per_scan, tmp_cols_pointer, tmp_rows_pointer,
+                                                     &ewaw, thread_ewap[tid])
+                if func_result < 0:
+                    continue
+
+                # NOTE: In the C version this is where the image array data is loaded
+                for group_idx in range(num_groups):
+                    if compute_group_ewa(&groups[group_idx], row_idx * swath_cols,
+                                         swath_cols, rows_per_scan, grid_cols, grid_rows,
+                                         tmp_cols_pointer, tmp_rows_pointer, input_arrays, thread_images[tid],
+                                         thread_accums[tid], thread_weights[tid], &ewaw, thread_ewap[tid]):
+                        thread_got_point[tid] = 1
+
+        for tid in range(num_threads):
+            got_point = got_point or thread_got_point[tid]
+            if tid != 0:
+                # channels can use different weighting modes so they are merged separately
+                for group_idx in range(num_groups):
+                    for idx in range(groups[group_idx].start, groups[group_idx].start + groups[group_idx].count):
+                        merge_grids(1, grid_cols, grid_rows, groups[group_idx].maximum_weight_mode,
+                                    &thread_accums[0][idx], &thread_weights[0][idx],
+                                    &thread_accums[tid][idx], &thread_weights[tid][idx])
+                # merged grids aren't needed anymore
+                deinitialize_grids(chan_count, <void **>thread_accums[tid])
+                deinitialize_grids(chan_count, <void **>thread_weights[tid])
+                thread_accums[tid] = NULL
+                thread_weights[tid] = NULL
+
+        if not got_point:
+            raise RuntimeError("EWA Resampling: No swath pixels found inside grid to be resampled")
+
+        for group_idx in range(num_groups):
+            for idx in range(groups[group_idx].start, groups[group_idx].start + groups[group_idx].count):
+                valid_list[idx] = write_group_image(&groups[group_idx], idx, output_arrays[idx], grid_cols, grid_rows,
+                                                    thread_accums[0][idx], thread_weights[0][idx], weight_sum_min)
+    finally:
+        # also frees everything that was allocated before an allocation failed
+        for tid in range(num_threads):
+            if thread_accums is not NULL and thread_accums[tid] is not NULL:
+                deinitialize_grids(chan_count, <void **>thread_accums[tid])
+            if thread_weights is not NULL and thread_weights[tid] is not NULL:
+                deinitialize_grids(chan_count, <void **>thread_weights[tid])
+            if thread_ewap is not NULL:
+                free(thread_ewap[tid])
+            if thread_images is not NULL:
+                free(thread_images[tid])
+        free(thread_accums)
+        free(thread_weights)
+        free(thread_ewap)
+        free(thread_images)
+        free(thread_got_point)
+        deinitialize_weight(&ewaw)
 
     return 0
 
+def _per_channel(value, size_t num_items, name):
+    """Get a list with one `value` for every channel."""
+    if isinstance(value, (list, tuple)):
+        if len(value) != num_items:
+            raise ValueError("Must provide one '%s' for every input array" % (name,))
+        return list(value)
+    return [value] * num_items
+
+def _fill_key(fill):
+    # NaN never equals itself so it needs a special key to be grouped
+    return "nan" if numpy.isnan(fill) else float(fill)
+
+def _channel_groups(dtypes, input_fill, output_fill, maximum_weight_mode):
+    """Group channels that can be accumulated together, in the order they are first seen.
+
+    :returns: list of (image type, input fill, output fill, maximum weight mode) for each group,
+              list of group sizes, and the channel indexes ordered so each group is contiguous
+    """
+    cdef size_t num_items = len(dtypes)
+    input_fill = _per_channel(input_fill, num_items, "input_fill")
+    output_fill = _per_channel(output_fill, num_items, "output_fill")
+    maximum_weight_mode = _per_channel(maximum_weight_mode, num_items, "maximum_weight_mode")
+
+    group_members = {}
+    group_keys = []
+    for i, in_type in enumerate(dtypes):
+        if in_type not in IMAGE_TYPES:
+            raise ValueError("Unknown input and output data type")
+        key = (IMAGE_TYPES[in_type], _fill_key(input_fill[i]), _fill_key(output_fill[i]), bool(maximum_weight_mode[i]))
+        if key not in group_members:
+            group_members[key] = []
+            group_keys.append(key)
+        group_members[key].append(i)
+
+    group_info = []
+    for key in group_keys:
+        first_channel = group_members[key][0]
+        group_info.append((key[0], input_fill[first_channel], output_fill[first_channel], key[3]))
+    group_sizes = [len(group_members[key]) for key in group_keys]
+    channel_order = [i for key in group_keys for i in group_members[key]]
+    return group_info, group_sizes, channel_order
+
+cdef channel_group *_create_groups(list group_info, list group_sizes) except NULL:
+    cdef size_t num_groups = len(group_info)
+    cdef size_t group_idx
+    cdef size_t start = 0
+    cdef channel_group *groups = <channel_group *>malloc(num_groups * sizeof(channel_group))
+    if not groups:
+        raise MemoryError()
+    for group_idx in range(num_groups):
+        groups[group_idx].dtype = group_info[group_idx][0]
+        groups[group_idx].start = start
+        groups[group_idx].count = group_sizes[group_idx]
+        groups[group_idx].input_fill = group_info[group_idx][1]
+        groups[group_idx].output_fill = group_info[group_idx][2]
+        groups[group_idx].maximum_weight_mode = group_info[group_idx][3]
+        start += group_sizes[group_idx]
+    return groups
+
+cdef void *_image_pointer(numpy.ndarray arr) except NULL:
+    """Get the data pointer of a C-contiguous 2D image array."""
+    cdef numpy.ndarray[numpy.float32_t, ndim=2, mode='c'] tmp_arr_f32
+    cdef numpy.ndarray[numpy.float64_t, ndim=2, mode='c'] tmp_arr_f64
+    cdef numpy.ndarray[numpy.int8_t, ndim=2, mode='c'] tmp_arr_i8
+    if arr.dtype == numpy.float32:
+        tmp_arr_f32 = arr
+        return &tmp_arr_f32[0, 0]
+    elif arr.dtype == numpy.float64:
+        tmp_arr_f64 = arr
+        return &tmp_arr_f64[0, 0]
+    elif arr.dtype == numpy.int8:
+        tmp_arr_i8 = arr
+        return &tmp_arr_i8[0, 0]
+    raise ValueError("Unknown input and output data type")
+
 @cython.boundscheck(False)
 @cython.wraparound(False)
 def fornav_wrapper(numpy.ndarray[cr_dtype, ndim=2, mode='c'] cols_array,
@@ -176,85 +348,165 @@ def fornav_wrapper(numpy.ndarray[cr_dtype, ndim=2, mode='c'] cols_array,
            tuple input_arrays, tuple output_arrays, input_fill, output_fill,
            size_t rows_per_scan,
            unsigned int weight_count=10000, weight_type weight_min=0.01, weight_type weight_distance_max=1.0, weight_type weight_delta_max=10.0, weight_type weight_sum_min=-1.0,
-           cpython.bool maximum_weight_mode=False):
+           maximum_weight_mode=False, int num_threads=1):
+    """Resample every input array to its output array in one pass over the swath.
+
+    Input arrays may have different data types, but each output array must be the same type as its input.
+    `input_fill`, `output_fill`, and `maximum_weight_mode` can be a single value used for every input array or a
+    sequence with one value per input array. The EWA parameters for each scan are only computed once and shared
+    by all of the input arrays.
+    """
     cdef size_t num_items = len(input_arrays)
     cdef size_t num_outputs = len(output_arrays)
     cdef size_t swath_cols = cols_array.shape[1]
     cdef size_t swath_rows = cols_array.shape[0]
     cdef size_t grid_cols = output_arrays[0].shape[1]
     cdef size_t grid_rows = output_arrays[0].shape[0]
-    cdef unsigned int i
+    cdef size_t i
     if num_items != num_outputs:
         raise ValueError("Must have same number of inputs and outputs")
     if num_items <= 0:
         raise ValueError("No input arrays given")
     if rows_per_scan < 2 or swath_rows % rows_per_scan != 0:
         raise ValueError("EWA requires 2 or more rows_per_scan and must be a factor of the total number of input rows")
+    for i in range(num_items):
+        if input_arrays[i].dtype != output_arrays[i].dtype:
+            raise ValueError("Input and Output must be of the same type")
 
-    cdef numpy.dtype in_type = input_arrays[0].dtype
-    cdef numpy.dtype out_type = output_arrays[0].dtype
-    if in_type != out_type:
-        raise ValueError("Input and Output must be of the same type")
-    if not all(input_array.dtype == in_type for input_array in input_arrays):
-        raise ValueError("Input arrays must all be of the same data type")
-    if not all(output_array.dtype == out_type for output_array in output_arrays):
-        raise ValueError("Input arrays must all be of the same data type")
-
+    group_info, group_sizes, channel_order = _channel_groups([ia.dtype for ia in input_arrays], input_fill,
+                                                             output_fill, maximum_weight_mode)
+    cdef size_t num_groups = len(group_info)
+    cdef channel_group *groups = _create_groups(group_info, group_sizes)
     cdef void **input_pointer = <void **>malloc(num_items * sizeof(void *))
-    if not input_pointer:
-        raise MemoryError()
     cdef void **output_pointer = <void **>malloc(num_items * sizeof(void *))
-    if not output_pointer:
-        raise MemoryError()
     cdef unsigned int *valid_arr = <unsigned int *>malloc(num_items * sizeof(unsigned int))
-    valid_list = []
-    cdef numpy.ndarray[numpy.float32_t, ndim=2] tmp_arr_f32
-    cdef numpy.ndarray[numpy.float64_t, ndim=2] tmp_arr_f64
-    cdef numpy.ndarray[numpy.int8_t, ndim=2] tmp_arr_i8
     cdef cr_dtype *cols_pointer = &cols_array[0, 0]
     cdef cr_dtype *rows_pointer = &rows_array[0, 0]
-    cdef int func_result
+    try:
+        if not input_pointer or not output_pointer or not valid_arr:
+            raise MemoryError()
+        for i, channel_idx in enumerate(channel_order):
+            input_pointer[i] = _image_pointer(input_arrays[channel_idx])
+            output_pointer[i] = _image_pointer(output_arrays[channel_idx])
+
+        fornav(valid_arr, num_items, swath_cols, swath_rows, grid_cols, grid_rows, cols_pointer, rows_pointer,
+               input_pointer, output_pointer, groups, num_groups, rows_per_scan,
+               weight_count, weight_min, weight_distance_max, weight_delta_max, weight_sum_min, num_threads)
+        valid_list = [0] * num_items
+        for i, channel_idx in enumerate(channel_order):
+            valid_list[channel_idx] = valid_arr[i]
+    finally:
+        free(groups)
+        free(input_pointer)
+        free(output_pointer)
+        free(valid_arr)
 
-    if in_type == numpy.float32:
-        for i in range(num_items):
-            tmp_arr_f32 = input_arrays[i]
-            input_pointer[i] = &tmp_arr_f32[0, 0]
-            tmp_arr_f32 = output_arrays[i]
-            output_pointer[i] = &tmp_arr_f32[0, 0]
-        func_result = fornav(valid_arr, num_items, swath_cols, swath_rows, grid_cols, grid_rows, cols_pointer, rows_pointer,
-                     <numpy.float32_t **>input_pointer, <numpy.float32_t **>output_pointer,
-                     <numpy.float32_t>input_fill, <numpy.float32_t>output_fill, rows_per_scan,
-                     weight_count, weight_min, weight_distance_max, weight_delta_max, weight_sum_min,
-                     <bint>maximum_weight_mode)
-    elif in_type == numpy.float64:
-        for i in range(num_items):
-            tmp_arr_f64 = input_arrays[i]
-            input_pointer[i] = &tmp_arr_f64[0, 0]
-            tmp_arr_f64 = output_arrays[i]
-            output_pointer[i] = &tmp_arr_f64[0, 0]
-        func_result = fornav(valid_arr, num_items, swath_cols, swath_rows, grid_cols, grid_rows, cols_pointer, rows_pointer,
-                     <numpy.float64_t **>input_pointer, <numpy.float64_t **>output_pointer,
-                     <numpy.float64_t>input_fill, <numpy.float64_t>output_fill, rows_per_scan,
-                     weight_count, weight_min, weight_distance_max, weight_delta_max, weight_sum_min,
-                     <bint>maximum_weight_mode)
-    elif in_type == numpy.int8:
-        for i in range(num_items):
-            tmp_arr_i8 = input_arrays[i]
-            input_pointer[i] = &tmp_arr_i8[0, 0]
-            tmp_arr_i8 = output_arrays[i]
-            output_pointer[i] = &tmp_arr_i8[0, 0]
-        func_result = fornav(valid_arr, num_items, swath_cols, swath_rows, grid_cols, grid_rows, cols_pointer, rows_pointer,
-                     <numpy.int8_t **>input_pointer, <numpy.int8_t **>output_pointer,
-                     <numpy.int8_t>input_fill, <numpy.int8_t>output_fill, rows_per_scan,
-                     weight_count, weight_min, weight_distance_max, weight_delta_max, weight_sum_min,
-                     <bint>maximum_weight_mode)
-    else:
-        raise ValueError("Unknown input and output data type")
-
-    for i in range(num_items):
-        valid_list.append(valid_arr[i])
+    return valid_list
 
-    free(input_pointer)
-    free(output_pointer)
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def accumulate_block(numpy.ndarray[cr_dtype, ndim=2, mode='c'] cols_array,
+           numpy.ndarray[cr_dtype, ndim=2, mode='c'] rows_array,
+           tuple input_arrays, input_fill, size_t rows_per_scan,
+           numpy.ndarray[numpy.float32_t, ndim=3, mode='c'] grid_accums,
+           numpy.ndarray[numpy.float32_t, ndim=3, mode='c'] grid_weights,
+           unsigned int weight_count=10000, weight_type weight_min=0.01, weight_type weight_distance_max=1.0, weight_type weight_delta_max=10.0,
+           maximum_weight_mode=False):
+    """Add a block of swath scans to existing accumulation and weight grids.
+
+    This is the first half of what `fornav_wrapper` does and is used to resample a swath a few scans at a time.
+    The grids have shape (channels, rows, columns) and can be any subset of rows of the output grid as long as
+    `rows_array` is relative to the first row of the subset. Use `write_grid_rows` to produce the final image
+    once no more swath pixels will be added to a row.
+
+    :returns: True if any swath pixel was inside the grids
+    """
+    cdef size_t num_items = len(input_arrays)
+    cdef size_t swath_cols = cols_array.shape[1]
+    cdef size_t swath_rows = cols_array.shape[0]
+    cdef size_t grid_cols = grid_accums.shape[2]
+    cdef size_t grid_rows = grid_accums.shape[1]
+    cdef size_t num_scans = swath_rows // rows_per_scan
+    cdef size_t scan_idx
+    cdef size_t row_idx
+    cdef size_t group_idx
+    cdef size_t i
+    cdef size_t channel_idx
+    cdef bint got_point = 0
+    cdef ewa_weight ewaw
+    if num_items <= 0 or <size_t>grid_accums.shape[0] != num_items or <size_t>grid_weights.shape[0] != num_items:
+        raise ValueError("Must have one accumulation and weight grid for every input array")
+    if rows_per_scan < 2 or swath_rows % rows_per_scan != 0:
+        raise ValueError("EWA requires 2 or more rows_per_scan and must be a factor of the total number of input rows")
+    if grid_rows == 0:
+        return False
+
+    # output fills don't matter until the image is written
+    group_info, group_sizes, channel_order = _channel_groups([ia.dtype for ia in input_arrays], input_fill,
+                                                             0, maximum_weight_mode)
+    cdef size_t num_groups = len(group_info)
+    cdef channel_group *groups = _create_groups(group_info, group_sizes)
+    cdef void **input_pointer = <void **>malloc(num_items * sizeof(void *))
+    cdef void **images = <void **>malloc(num_items * sizeof(void *))
+    cdef accum_type **accum_pointer = <accum_type **>malloc(num_items * sizeof(accum_type *))
+    cdef weight_type **weight_pointer = <weight_type **>malloc(num_items * sizeof(weight_type *))
+    cdef ewa_parameters *ewap = <ewa_parameters *>malloc(swath_cols * sizeof(ewa_parameters))
+    cdef cr_dtype *cols_pointer = &cols_array[0, 0]
+    cdef cr_dtype *rows_pointer = &rows_array[0, 0]
+    ewaw.wtab = NULL
+    try:
+        if not input_pointer or not images or not accum_pointer or not weight_pointer or not ewap:
+            raise MemoryError()
+        for i, channel_idx in enumerate(channel_order):
+            input_pointer[i] = _image_pointer(input_arrays[channel_idx])
+            accum_pointer[i] = &grid_accums[channel_idx, 0, 0]
+            weight_pointer[i] = &grid_weights[channel_idx, 0, 0]
+        if initialize_weight(num_items, weight_count, weight_min, weight_distance_max, weight_delta_max,
+                             weight_min, &ewaw) < 0:
+            raise RuntimeError("Could not initialize weight structure for EWA resampling")
+
+        with nogil:
+            for scan_idx in range(num_scans):
+                row_idx = scan_idx * rows_per_scan
+                if compute_ewa_parameters(swath_cols, rows_per_scan, &cols_pointer[row_idx * swath_cols],
+                                          &rows_pointer[row_idx * swath_cols], &ewaw, ewap) < 0:
+                    continue
+                for group_idx in range(num_groups):
+                    if compute_group_ewa(&groups[group_idx], row_idx * swath_cols,
+                                         swath_cols, rows_per_scan, grid_cols, grid_rows,
+                                         &cols_pointer[row_idx * swath_cols], &rows_pointer[row_idx * swath_cols],
+                                         input_pointer, images, accum_pointer, weight_pointer, &ewaw, ewap):
+                        got_point = 1
+    finally:
+        deinitialize_weight(&ewaw)
+        free(groups)
+        free(input_pointer)
+        free(images)
+        free(accum_pointer)
+        free(weight_pointer)
+        free(ewap)
+
+    return got_point
 
-    return valid_list
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def write_grid_rows(numpy.ndarray[numpy.float32_t, ndim=2, mode='c'] grid_accum,
+           numpy.ndarray[numpy.float32_t, ndim=2, mode='c'] grid_weights,
+           numpy.ndarray output_array, output_fill, maximum_weight_mode=False, weight_type weight_sum_min=0.01):
+    """Write the final image for accumulation and weight grids created by `accumulate_block`.
+
+    :returns: number of valid pixels written
+    """
+    cdef size_t grid_cols = grid_accum.shape[1]
+    cdef size_t grid_rows = grid_accum.shape[0]
+    if output_array.ndim != 2 or <size_t>output_array.shape[0] != grid_rows or <size_t>output_array.shape[1] != grid_cols:
+        raise ValueError("Output array must be the same shape as the accumulation grid")
+    if grid_rows == 0:
+        return 0
+    group_info, group_sizes, channel_order = _channel_groups([output_array.dtype], 0, output_fill, maximum_weight_mode)
+    cdef channel_group *groups = _create_groups(group_info, group_sizes)
+    try:
+        return write_group_image(&groups[0], 0, _image_pointer(output_array), grid_cols, grid_rows,
+                                 &grid_accum[0, 0], &grid_weights[0, 0], weight_sum_min)
+    finally:
+        free(groups)
@@ -71,6 +71,8 @@ accum_type **initialize_grid_accums(size_t chan_count, size_t grid_cols, size_t
   for (i=0; i < chan_count; i++) {
     grid_accums[i] = (accum_type *)calloc(grid_cols * grid_rows, sizeof(accum_type));
     if (!grid_accums[i]) {
+      // free the channels that were already allocated
+      deinitialize_grids(i, (void **)grid_accums);
       return NULL;
     }
   }
@@ -88,6 +90,8 @@ weight_type **initialize_grid_weights(size_t chan_count, size_t grid_cols, size_
   for (i=0; i<chan_count; i++) {
     grid_weights[i] = (weight_type *)calloc(grid_cols * grid_rows, sizeof(weight_type));
     if (!grid_weights[i]) {
+      // free the channels that were already allocated
+      deinitialize_grids(i, (void **)grid_weights);
       return NULL;
     }
   }
@@ -105,6 +109,37 @@ void deinitialize_grids(size_t chan_count, void **grids) {
   free(grids);
 }
 
+void merge_grids(size_t chan_count, size_t grid_cols, size_t grid_rows, int maximum_weight_mode,
+        accum_type **grid_accums, weight_type **grid_weights,
+        accum_type **other_accums, weight_type **other_weights) {
+  // Combine the accumulation and weight grids from another thread in to the main grids
+  size_t chan;
+  size_t i;
+  size_t grid_size = grid_cols * grid_rows;
+  accum_type *this_accum;
+  weight_type *this_weight;
+  accum_type *other_accum;
+  weight_type *other_weight;
+
+  for (chan = 0; chan < chan_count; chan++) {
+    this_accum = grid_accums[chan];
+    this_weight = grid_weights[chan];
+    other_accum = other_accums[chan];
+    other_weight = other_weights[chan];
+    for (i = 0; i < grid_size; i++) {
+      if (maximum_weight_mode) {
+        if (other_weight[i] > this_weight[i]) {
+          this_weight[i] = other_weight[i];
+          this_accum[i] = other_accum[i];
+        }
+      } else {
+        this_weight[i] += other_weight[i];
+        this_accum[i] += other_accum[i];
+      }
+    }
+  }
+}
+
 template <typename CR_TYPE>
 int compute_ewa_parameters(size_t swath_cols, size_t swath_rows, CR_TYPE *uimg, CR_TYPE *vimg, ewa_weight *ewaw, ewa_parameters *ewap) {
   ewa_param_type ux;
@@ -44,6 +44,10 @@ accum_type **initialize_grid_accums(size_t chan_count, size_t grid_cols, size_t
 weight_type **initialize_grid_weights(size_t chan_count, size_t grid_cols, size_t grid_rows);
 void deinitialize_grids(size_t chan_count, void **grids);
 
+void merge_grids(size_t chan_count, size_t grid_cols, size_t grid_rows, int maximum_weight_mode,
+        accum_type **grid_accums, weight_type **grid_weights,
+        accum_type **other_accums, weight_type **other_weights);
+
 template<typename CR_TYPE>
 int compute_ewa_parameters(size_t swath_cols, size_t swath_rows, CR_TYPE *uimg, CR_TYPE *vimg, ewa_weight *ewaw, ewa_parameters *ewap);
 
@@ -47,18 +47,26 @@ import numpy
 cimport cython
 from cpython cimport bool
 cimport numpy
-from libc.math cimport isnan
+from libc.math cimport isnan, fabs
 
 # DTYPE = numpy.float32
 # DTYPE = numpy.float64
 # ctypedef numpy.float32_t DTYPE_t
 
-# column and rows can only be doubles for now until the PROJ.4 is linked directly so float->double casting can be done
-# inside the loop
+# column and rows can only be doubles in the full array versions of ll2cr because pyproj projects the arrays in place
+# and requires doubles. The block versions project a double copy of each block so they can also write 32-bit floats.
 ctypedef fused cr_dtype:
     # numpy.float32_t
     numpy.float64_t
 
+ctypedef fused block_dtype:
+    numpy.float32_t
+    numpy.float64_t
+
+ctypedef fused xy_dtype:
+    numpy.float32_t
+    numpy.float64_t
+
 # @cython.boundscheck(False)
 # @cython.wraparound(False)
 # def minmax_float32(numpy.ndarray[DTYPE_t, ndim=2] arr):
@@ -329,3 +337,379 @@ def ll2cr_static(numpy.ndarray[cr_dtype, ndim=2] lon_arr, numpy.ndarray[cr_dtype
 
     # return points_in_grid, x_arr, y_arr
     return points_in_grid
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+cdef unsigned int _grid_index_block(xy_dtype [:, ::1] x_arr, xy_dtype [:, ::1] y_arr,
+                                    block_dtype [:, ::1] cols_out, block_dtype [:, ::1] rows_out, double fill_in,
+                                    double proj_circum, double cell_width, double cell_height,
+                                    double width, double height, double origin_x, double origin_y) nogil:
+    """Convert projected X/Y points in a block to column/rows.
+
+    The X/Y arrays may be the same arrays as the column/row outputs to do the conversion in place.
+
+    If `proj_circum` is not 0 then points more than 75% of the way around the projection from the origin are
+    moved across the antimeridian.
+
+    :returns: number of points that fall inside the grid
+    """
+    cdef unsigned int row
+    cdef unsigned int col
+    cdef double x_tmp
+    cdef double y_tmp
+    cdef unsigned int points_in_grid = 0
+    for row in range(x_arr.shape[0]):
+        for col in range(x_arr.shape[1]):
+            x_tmp = x_arr[row, col]
+            y_tmp = y_arr[row, col]
+            if x_tmp >= 1e30 or isnan(x_tmp) or isnan(y_tmp):
+                cols_out[row, col] = <block_dtype>fill_in
+                rows_out[row, col] = <block_dtype>fill_in
+                continue
+            elif proj_circum != 0 and fabs(x_tmp - origin_x) >= (0.75 * proj_circum):
+                x_tmp += proj_circum
+
+            x_tmp = (x_tmp - origin_x) / cell_width
+            y_tmp = (y_tmp - origin_y) / cell_height
+            if x_tmp >= -1 and x_tmp <= width + 1 and y_tmp >= -1 and y_tmp <= height + 1:
+                points_in_grid += 1
+            cols_out[row, col] = <block_dtype>x_tmp
+            rows_out[row, col] = <block_dtype>y_tmp
+    return points_in_grid
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+cdef unsigned int _grid_index_extent_block(xy_dtype [:, ::1] x_arr, xy_dtype [:, ::1] y_arr,
+                                           block_dtype [:, ::1] cols_out, block_dtype [:, ::1] rows_out,
+                                           double fill_in, double proj_circum, bint wrap_x,
+                                           double cell_width, double cell_height, double width, double height,
+                                           double origin_x, double origin_y, double *extent) nogil:
+    """Convert projected X/Y points in a block to column/rows while finding the extent of the points.
+
+    `extent` is updated with the (xmin, xmax, ymin, ymax) of the projected points followed by the (xmin, xmax)
+    they would have if negative X coordinates were moved across the antimeridian. If `wrap_x` is True then
+    the moved X coordinates are used for the conversion.
+
+    :returns: number of points that fall inside the grid
+    """
+    cdef unsigned int row
+    cdef unsigned int col
+    cdef double x_tmp
+    cdef double y_tmp
+    cdef double x_wrap
+    cdef unsigned int points_in_grid = 0
+    for row in range(x_arr.shape[0]):
+        for col in range(x_arr.shape[1]):
+            x_tmp = x_arr[row, col]
+            y_tmp = y_arr[row, col]
+            if x_tmp >= 1e30 or isnan(x_tmp) or isnan(y_tmp):
+                cols_out[row, col] = <block_dtype>fill_in
+                rows_out[row, col] = <block_dtype>fill_in
+                continue
+            if x_tmp < extent[0]:
+                extent[0] = x_tmp
+            if x_tmp > extent[1]:
+                extent[1] = x_tmp
+            if y_tmp < extent[2]:
+                extent[2] = y_tmp
+            if y_tmp > extent[3]:
+                extent[3] = y_tmp
+            x_wrap = x_tmp + proj_circum if x_tmp < 0 else x_tmp
+            if x_wrap < extent[4]:
+                extent[4] = x_wrap
+            if x_wrap > extent[5]:
+                extent[5] = x_wrap
+            if wrap_x:
+                x_tmp = x_wrap
+
+            x_tmp = (x_tmp - origin_x) / cell_width
+            y_tmp = (y_tmp - origin_y) / cell_height
+            if x_tmp >= -1 and x_tmp <= width + 1 and y_tmp >= -1 and y_tmp <= height + 1:
+                points_in_grid += 1
+            cols_out[row, col] = <block_dtype>x_tmp
+            rows_out[row, col] = <block_dtype>y_tmp
+    return points_in_grid
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+cdef unsigned int _shift_block(block_dtype [:, ::1] cols_arr, block_dtype [:, ::1] rows_arr, double fill_in,
+                               bint wrap_x, double proj_circum, double cell_width, double old_origin_x,
+                               double col_offset, double row_offset, double width, double height) nogil:
+    """Move column/rows in place to a grid with a different origin.
+
+    If `wrap_x` is True then points that were west of the antimeridian in the old grid are moved across it.
+
+    :returns: number of points that fall inside the new grid
+    """
+    cdef unsigned int row
+    cdef unsigned int col
+    cdef double x_tmp
+    cdef double y_tmp
+    cdef bint fill_is_nan = isnan(fill_in)
+    cdef unsigned int points_in_grid = 0
+    for row in range(cols_arr.shape[0]):
+        for col in range(cols_arr.shape[1]):
+            x_tmp = cols_arr[row, col]
+            y_tmp = rows_arr[row, col]
+            if fill_is_nan and (isnan(x_tmp) or isnan(y_tmp)):
+                continue
+            elif not fill_is_nan and (x_tmp == <block_dtype>fill_in or y_tmp == <block_dtype>fill_in):
+                continue
+            if wrap_x and x_tmp * cell_width + old_origin_x < 0:
+                x_tmp += proj_circum / cell_width
+            x_tmp += col_offset
+            y_tmp += row_offset
+            if x_tmp >= -1 and x_tmp <= width + 1 and y_tmp >= -1 and y_tmp <= height + 1:
+                points_in_grid += 1
+            cols_arr[row, col] = <block_dtype>x_tmp
+            rows_arr[row, col] = <block_dtype>y_tmp
+    return points_in_grid
+
+
+def _grid_index_block_wrapper(xy_dtype [:, ::1] x_arr, xy_dtype [:, ::1] y_arr,
+                              block_dtype [:, ::1] cols_out, block_dtype [:, ::1] rows_out, double fill_in,
+                              double proj_circum, double cell_width, double cell_height,
+                              double width, double height, double origin_x, double origin_y):
+    cdef unsigned int points_in_grid
+    with nogil:
+        points_in_grid = _grid_index_block(x_arr, y_arr, cols_out, rows_out, fill_in, proj_circum,
+                                           cell_width, cell_height, width, height, origin_x, origin_y)
+    return points_in_grid
+
+
+def _grid_index_extent_block_wrapper(xy_dtype [:, ::1] x_arr, xy_dtype [:, ::1] y_arr,
+                                     block_dtype [:, ::1] cols_out, block_dtype [:, ::1] rows_out,
+                                     double fill_in, double proj_circum, bint wrap_x,
+                                     double cell_width, double cell_height, double width, double height,
+                                     double origin_x, double origin_y):
+    cdef unsigned int points_in_grid
+    cdef double extent[6]
+    extent[:] = [numpy.inf, -numpy.inf, numpy.inf, -numpy.inf, numpy.inf, -numpy.inf]
+    with nogil:
+        points_in_grid = _grid_index_extent_block(x_arr, y_arr, cols_out, rows_out, fill_in, proj_circum, wrap_x,
+                                                  cell_width, cell_height, width, height, origin_x, origin_y,
+                                                  extent)
+    return points_in_grid, (extent[0], extent[1], extent[2], extent[3], extent[4], extent[5])
+
+
+def _shift_block_wrapper(block_dtype [:, ::1] cols_arr, block_dtype [:, ::1] rows_arr, double fill_in,
+                         bint wrap_x, double proj_circum, double cell_width, double old_origin_x,
+                         double col_offset, double row_offset, double width, double height):
+    cdef unsigned int points_in_grid
+    with nogil:
+        points_in_grid = _shift_block(cols_arr, rows_arr, fill_in, wrap_x, proj_circum, cell_width, old_origin_x,
+                                      col_offset, row_offset, width, height)
+    return points_in_grid
+
+
+def estimate_extent(p, lon_arr, lat_arr, double proj_circum, interior_samples=64):
+    """Estimate the projected extent of a swath from its edge rows and columns and a decimated interior.
+
+    The edges of a swath normally include its most extreme points. The interior is sampled for swaths
+    crossing the antimeridian or covering a pole where that is not true.
+
+    :returns: (xmin, xmax, ymin, ymax, wrapped xmin, wrapped xmax) where the wrapped X extent is what it
+              would be if negative X coordinates were moved across the antimeridian
+    """
+    num_rows, num_cols = lon_arr.shape[0], lon_arr.shape[1]
+    row_idx = numpy.unique(numpy.linspace(0, num_rows - 1, min(num_rows, interior_samples)).astype(numpy.intp))
+    col_idx = numpy.unique(numpy.linspace(0, num_cols - 1, min(num_cols, interior_samples)).astype(numpy.intp))
+    samples = []
+    for arr in (lon_arr, lat_arr):
+        samples.append(numpy.concatenate((arr[0], arr[num_rows - 1], arr[:, 0], arr[:, num_cols - 1],
+                                          arr[row_idx][:, col_idx].ravel())).astype(numpy.float64))
+    x_arr, y_arr = p(samples[0], samples[1])
+    x_arr = numpy.asarray(x_arr)
+    y_arr = numpy.asarray(y_arr)
+    valid = (x_arr < 1e30) & ~numpy.isnan(x_arr) & ~numpy.isnan(y_arr)
+    if not valid.any():
+        return (numpy.inf, -numpy.inf, numpy.inf, -numpy.inf, numpy.inf, -numpy.inf)
+    x_arr = x_arr[valid]
+    y_arr = y_arr[valid]
+    x_wrap = numpy.where(x_arr < 0, x_arr + proj_circum, x_arr)
+    return x_arr.min(), x_arr.max(), y_arr.min(), y_arr.max(), x_wrap.min(), x_wrap.max()
+
+
+def _project_block(p, lon_block, lat_block):
+    """Project a block of longitude and latitude points to X/Y.
+
+    Double precision blocks are projected in place. Other blocks are projected as a double precision copy.
+    """
+    if lon_block.dtype == numpy.float64 and lat_block.dtype == numpy.float64:
+        x_block = lon_block
+        y_block = lat_block
+    else:
+        x_block = lon_block.astype(numpy.float64)
+        y_block = lat_block.astype(numpy.float64)
+    p(x_block, y_block)
+    return x_block, y_block
+
+
+def _row_blocks(num_rows, num_threads, rows_per_block=None):
+    """Split the rows of the swath in to (start, end) slices for processing in parallel."""
+    if rows_per_block is None:
+        # a few blocks per thread keeps all of the threads busy if some blocks are faster than others
+        rows_per_block = max(int(numpy.ceil(num_rows / float(num_threads * 4))), 1)
+    return [(start, min(start + rows_per_block, num_rows)) for start in range(0, num_rows, rows_per_block)]
+
+
+def _map_blocks(func, blocks, num_threads):
+    if num_threads <= 1 or len(blocks) <= 1:
+        return [func(*block) for block in blocks]
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=num_threads) as executor:
+        return list(executor.map(lambda block: func(*block), blocks))
+
+
+def ll2cr_static_blocks(numpy.ndarray lon_arr, numpy.ndarray lat_arr,
+                        fill_in, str proj4_definition,
+                        double cell_width, double cell_height,
+                        unsigned int width, unsigned int height,
+                        double origin_x, double origin_y,
+                        int num_threads=1, rows_per_block=None):
+    """Project longitude and latitude points to column rows in the specified grid in place, one block of rows at a time.
+
+    Same as `ll2cr_static`, but each block of rows is projected and converted to grid space before moving on to the
+    next block. Blocks are spread across `num_threads` threads. The column/row conversion releases the GIL as does
+    the projection inside PROJ.4. Longitude and latitude arrays may be 32-bit or 64-bit floats.
+
+    :returns: points_in_grid
+    """
+    p = MyProj(proj4_definition)
+    cdef double proj_circum = projection_circumference(p)
+    if not lon_arr.flags.c_contiguous or not lat_arr.flags.c_contiguous:
+        raise ValueError("Longitude and latitude arrays must be C contiguous")
+
+    def _process_block(start, end):
+        lon_block = lon_arr[start:end]
+        lat_block = lat_arr[start:end]
+        x_block, y_block = _project_block(p, lon_block, lat_block)
+        return _grid_index_block_wrapper(x_block, y_block, lon_block, lat_block, fill_in, proj_circum,
+                                         cell_width, cell_height, width, height, origin_x, origin_y)
+
+    blocks = _row_blocks(lon_arr.shape[0], num_threads, rows_per_block=rows_per_block)
+    return sum(_map_blocks(_process_block, blocks, num_threads))
+
+
+def project_blocks(numpy.ndarray lon_arr, numpy.ndarray lat_arr, str proj4_definition,
+                   int num_threads=1, rows_per_block=None):
+    """Project longitude and latitude points to X/Y in the projection space, one block of rows at a time.
+
+    The X/Y points can be converted to column rows for any static grid in the same projection with `xy2cr_blocks`.
+
+    :returns: tuple(x_arr, y_arr) as new 64-bit float arrays
+    """
+    p = MyProj(proj4_definition)
+    x_arr = numpy.array(lon_arr, dtype=numpy.float64, order="C")
+    y_arr = numpy.array(lat_arr, dtype=numpy.float64, order="C")
+
+    def _process_block(start, end):
+        _project_block(p, x_arr[start:end], y_arr[start:end])
+
+    _map_blocks(_process_block, _row_blocks(x_arr.shape[0], num_threads, rows_per_block=rows_per_block), num_threads)
+    return x_arr, y_arr
+
+
+def xy2cr_blocks(numpy.ndarray x_arr, numpy.ndarray y_arr, numpy.ndarray cols_out, numpy.ndarray rows_out,
+                 fill_in, str proj4_definition,
+                 double cell_width, double cell_height,
+                 unsigned int width, unsigned int height,
+                 double origin_x, double origin_y,
+                 int num_threads=1, rows_per_block=None):
+    """Convert X/Y points from `project_blocks` to column rows in the specified grid, one block of rows at a time.
+
+    The results are the same as `ll2cr_static_blocks` without projecting the longitude and latitude points again.
+
+    :returns: points_in_grid
+    """
+    cdef double proj_circum = projection_circumference(MyProj(proj4_definition))
+    if not cols_out.flags.c_contiguous or not rows_out.flags.c_contiguous:
+        raise ValueError("Column and row arrays must be C contiguous")
+
+    def _process_block(start, end):
+        return _grid_index_block_wrapper(x_arr[start:end], y_arr[start:end], cols_out[start:end], rows_out[start:end],
+                                         fill_in, proj_circum, cell_width, cell_height, width, height,
+                                         origin_x, origin_y)
+
+    blocks = _row_blocks(x_arr.shape[0], num_threads, rows_per_block=rows_per_block)
+    return sum(_map_blocks(_process_block, blocks, num_threads))
+
+
+def ll2cr_dynamic_blocks(numpy.ndarray lon_arr, numpy.ndarray lat_arr,
+                         fill_in, str proj4_definition,
+                         double cell_width, double cell_height,
+                         width=None, height=None,
+                         origin_x=None, origin_y=None,
+                         int num_threads=1, rows_per_block=None):
+    """Project longitude and latitude points to column rows in the specified grid in place, one block of rows at a time.
+
+    Same as `ll2cr_dynamic`, but the grid is first sized from an estimate of the data extents (see `estimate_extent`)
+    so that every block can be projected, converted to grid space, and checked for the real data extents in one pass.
+    If the real extents are different from the estimate then the column/rows are moved to the correct grid
+    afterwards, which does not require projecting the data again. Blocks are spread across `num_threads` threads.
+    Longitude and latitude arrays may be 32-bit or 64-bit floats.
+
+    :returns: tuple(points_in_grid, cols_out, rows_out, origin_x, origin_y, width, height)
+    """
+    p = MyProj(proj4_definition)
+    cdef double proj_circum = projection_circumference(p)
+    if not lon_arr.flags.c_contiguous or not lat_arr.flags.c_contiguous:
+        raise ValueError("Longitude and latitude arrays must be C contiguous")
+    blocks = _row_blocks(lon_arr.shape[0], num_threads, rows_per_block=rows_per_block)
+
+    def _grid_extents(extents):
+        xmin, xmax, ymin, ymax, wrap_xmin, wrap_xmax = extents
+        # Check if we cross the antimeridian
+        wrap_x = proj_circum != 0 and xmax - xmin >= proj_circum * .75
+        if wrap_x:
+            xmin, xmax = wrap_xmin, wrap_xmax
+        grid_ox = xmin if origin_x is None else origin_x
+        grid_oy = ymax if origin_y is None else origin_y
+        if width is None:
+            grid_w = int(abs((xmax - grid_ox) / cell_width))
+            grid_h = int(abs((grid_oy - ymin) / cell_height))
+        else:
+            grid_w = width
+            grid_h = height
+        return wrap_x, grid_ox, grid_oy, grid_w, grid_h
+
+    est_extents = estimate_extent(p, lon_arr, lat_arr, proj_circum)
+    if numpy.isfinite(est_extents).all():
+        est_wrap, est_ox, est_oy, est_w, est_h = _grid_extents(est_extents)
+    else:
+        # no valid points in the sample, the real extents will have to be used
+        est_wrap, est_ox, est_oy, est_w, est_h = False, origin_x or 0.0, origin_y or 0.0, width or 0, height or 0
+
+    def _process_block(start, end):
+        lon_block = lon_arr[start:end]
+        lat_block = lat_arr[start:end]
+        x_block, y_block = _project_block(p, lon_block, lat_block)
+        return _grid_index_extent_block_wrapper(x_block, y_block, lon_block, lat_block, fill_in, proj_circum,
+                                                est_wrap, cell_width, cell_height, est_w, est_h, est_ox, est_oy)
+
+    results = _map_blocks(_process_block, blocks, num_threads)
+    points_in_grid = sum(r[0] for r in results)
+    extents = numpy.array([r[1] for r in results])
+    extents = (extents[:, 0].min(), extents[:, 1].max(), extents[:, 2].min(), extents[:, 3].max(),
+               extents[:, 4].min(), extents[:, 5].max())
+    wrap_x, origin_x, origin_y, width, height = _grid_extents(extents)
+
+    if (wrap_x, origin_x, origin_y, width, height) != (est_wrap, est_ox, est_oy, est_w, est_h):
+        # the estimate missed some of the data, only blocks that crossed the antimeridian without being wrapped
+        # have to be wrapped (a sample can't cross the antimeridian unless the full data does)
+        col_offset = (est_ox - origin_x) / cell_width
+        row_offset = (est_oy - origin_y) / cell_height
+        shift_wrap = wrap_x and not est_wrap
+
+        def _shift(start, end):
+            return _shift_block_wrapper(lon_arr[start:end], lat_arr[start:end], fill_in, shift_wrap, proj_circum,
+                                        cell_width, est_ox, col_offset, row_offset, width, height)
+
+        points_in_grid = sum(_map_blocks(_shift, blocks, num_threads))
+    return points_in_grid, lon_arr, lat_arr, origin_x, origin_y, width, height
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+# Copyright (C) 2018 Space Science and Engineering Center (SSEC),
+# University of Wisconsin-Madison.
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# This file is part of the polar2grid software package. Polar2grid takes
+# satellite observation data, remaps it, and writes it to a file format for
+# input into another program.
+# Documentation: http://www.ssec.wisc.edu/software/polar2grid/
+#
+#     Written by David Hoese    November 2018
+#     University of Wisconsin-Madison
+#     Space Science and Engineering Center
+#     1225 West Dayton Street
+#     Madison, WI  53706
+#     david.hoese@ssec.wisc.edu
+"""Find the nearest swath pixel for every grid cell using the swath's grid column and row locations.
+
+:author:       David Hoese (davidh)
+:contact:      david.hoese@ssec.wisc.edu
+:organization: Space Science and Engineering Center (SSEC)
+:copyright:    Copyright (c) 2018 University of Wisconsin SSEC. All rights reserved.
+:date:         Nov 2018
+:license:      GNU GPLv3
+"""
+__docformat__ = "restructuredtext en"
+
+import numpy
+cimport cython
+cimport numpy
+from libc.math cimport floor
+
+ctypedef fused cr_dtype:
+    float
+    double
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+cdef void _grid_nearest_index(const cr_dtype[::1] cols, const cr_dtype[::1] rows, double distance_upper_bound,
+                              numpy.float64_t[:, ::1] best_dist, numpy.intp_t[:, ::1] index) nogil:
+    cdef Py_ssize_t height = best_dist.shape[0]
+    cdef Py_ssize_t width = best_dist.shape[1]
+    # a cell within the distance bound of a point is at most this many cells from the cell the point falls in
+    cdef Py_ssize_t radius = <Py_ssize_t>floor(distance_upper_bound + 0.5)
+    cdef double max_dist = distance_upper_bound * distance_upper_bound
+    cdef Py_ssize_t point_idx, base_col, base_row, cell_col, cell_row
+    cdef Py_ssize_t row_start, row_end, col_start, col_end
+    cdef double col, row, dist, col_diff, row_diff
+
+    for point_idx in range(cols.shape[0]):
+        col = cols[point_idx]
+        row = rows[point_idx]
+        # skip points that can't be near any cell (also avoids overflow when casting)
+        if not (-radius - 1 < col < width + radius) or not (-radius - 1 < row < height + radius):
+            continue
+        base_col = <Py_ssize_t>floor(col + 0.5)
+        base_row = <Py_ssize_t>floor(row + 0.5)
+        row_start = max(base_row - radius, 0)
+        row_end = min(base_row + radius + 1, height)
+        col_start = max(base_col - radius, 0)
+        col_end = min(base_col + radius + 1, width)
+        for cell_row in range(row_start, row_end):
+            row_diff = row - cell_row
+            for cell_col in range(col_start, col_end):
+                col_diff = col - cell_col
+                # compare squared distances
+                dist = col_diff * col_diff + row_diff * row_diff
+                if dist < max_dist and dist < best_dist[cell_row, cell_col]:
+                    best_dist[cell_row, cell_col] = dist
+                    index[cell_row, cell_col] = point_idx
+
+
+def grid_nearest_index(const cr_dtype[::1] cols, const cr_dtype[::1] rows, unsigned int height, unsigned int width,
+                       double distance_upper_bound):
+    """Find the closest swath point to the center of every grid cell.
+
+    Every point is compared to the grid cells surrounding it instead of searching
+    the entire swath for every grid cell.
+
+    :param cols: 1D array of valid swath point column locations in the grid
+    :param rows: 1D array of valid swath point row locations in the grid
+    :param height: Number of rows in the output grid
+    :param width: Number of columns in the output grid
+    :param distance_upper_bound: Maximum distance in grid cells between a cell and its nearest point
+    :returns: 2D integer array of indexes in to `cols`/`rows`, `cols.size` where no point was found
+    """
+    if cols.shape[0] != rows.shape[0]:
+        raise ValueError("Column and row arrays must be the same size")
+    cdef numpy.ndarray[numpy.float64_t, ndim=2] best_dist = numpy.empty((height, width), dtype=numpy.float64)
+    cdef numpy.ndarray[numpy.intp_t, ndim=2] index = numpy.empty((height, width), dtype=numpy.intp)
+    best_dist.fill(numpy.inf)
+    index.fill(cols.shape[0])
+    cdef numpy.float64_t[:, ::1] best_dist_view = best_dist
+    cdef numpy.intp_t[:, ::1] index_view = index
+    with nogil:
+        _grid_nearest_index(cols, rows, distance_upper_bound, best_dist_view, index_view)
+    return index
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+# Copyright (C) 2018 Space Science and Engineering Center (SSEC),
+# University of Wisconsin-Madison.
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# This file is part of the polar2grid software package. Polar2grid takes
+# satellite observation data, remaps it, and writes it to a file format for
+# input into another program.
+# Documentation: http://www.ssec.wisc.edu/software/polar2grid/
+#
+#     Written by David Hoese    November 2018
+#     University of Wisconsin-Madison
+#     Space Science and Engineering Center
+#     1225 West Dayton Street
+#     Madison, WI  53706
+#     david.hoese@ssec.wisc.edu
+"""Bilinear interpolation of swath data already mapped to grid columns and rows.
+
+Every 4 neighboring swath pixels form a quadrilateral in grid space. Each grid
+cell whose center falls inside a quadrilateral is interpolated from those 4
+pixels using the cell's fractional location inside the quadrilateral. The
+source pixels and weights only depend on the geolocation and the grid so they
+are computed once and stored as a plan that is applied to every product.
+
+:author:       David Hoese (davidh)
+:contact:      david.hoese@ssec.wisc.edu
+:organization: Space Science and Engineering Center (SSEC)
+:copyright:    Copyright (c) 2018 University of Wisconsin SSEC. All rights reserved.
+:date:         Nov 2018
+:license:      GNU GPLv3
+
+"""
+__docformat__ = "restructuredtext en"
+
+import logging
+
+import numpy
+
+from polar2grid.remap import _bilinear
+
+LOG = logging.getLogger(__name__)
+
+# default maximum size of a swath pixel quadrilateral in grid cells
+MAX_QUAD_SIZE = 100.0
+# number of grid cells interpolated at a time for every product
+RESAMPLE_CHUNK_SIZE = 1024 ** 2
+
+
+def grid_bilinear_index(cols, rows, grid_shape, good_mask=None, max_quad_size=MAX_QUAD_SIZE):
+    """Find the swath quadrilateral containing the center of every grid cell.
+
+    :param cols: 2D array of swath pixel column locations in the grid
+    :param rows: 2D array of swath pixel row locations in the grid
+    :param grid_shape: (height, width) of the output grid
+    :param good_mask: optional boolean array of the swath's shape, pixels that are False are not used
+    :param max_quad_size: Quadrilaterals larger than this many grid cells in either direction are skipped
+    :returns: tuple(quad_index, u, v) (see :func:`polar2grid.remap._bilinear.grid_bilinear_index`)
+    """
+    dtype = cols.dtype if cols.dtype in (numpy.float32, numpy.float64) and rows.dtype == cols.dtype else numpy.float64
+    if good_mask is not None:
+        # invalid pixels are marked with NaN for the extension
+        cols = numpy.where(good_mask, cols, numpy.nan).astype(dtype, copy=False)
+        rows = numpy.where(good_mask, rows, numpy.nan).astype(dtype, copy=False)
+    cols = numpy.ascontiguousarray(cols, dtype=dtype)
+    rows = numpy.ascontiguousarray(rows, dtype=dtype)
+    return _bilinear.grid_bilinear_index(cols, rows, grid_shape[0], grid_shape[1], max_quad_size)
+
+
+class BilinearResamplePlan(object):
+    """Precomputed bilinear interpolation from swath pixels to grid cells.
+
+    Only grid cells inside the swath are stored. Each has the flattened indexes of its 4
+    surrounding swath pixels and their weights.
+
+    :param grid_shape: (height, width) of the output grid
+    :param valid_cells: 1D array of flattened grid cell indexes inside the swath
+    :param swath_index: (N, 4) array of flattened swath pixel indexes for every cell in `valid_cells`
+    :param weights: (N, 4) float32 array of the interpolation weight of each swath pixel
+    """
+    method = "bilinear"
+
+    def __init__(self, grid_shape, valid_cells, swath_index, weights):
+        self.grid_shape = tuple(grid_shape)
+        self.valid_cells = valid_cells
+        self.swath_index = swath_index
+        self.weights = weights
+
+    @classmethod
+    def from_quads(cls, quad_index, u, v, swath_shape):
+        """Create a plan from the results of :func:`grid_bilinear_index`."""
+        index_dtype = numpy.int32 if swath_shape[0] * swath_shape[1] < 2 ** 31 else numpy.int64
+        flat_quads = quad_index.ravel()
+        valid_cells = numpy.flatnonzero(flat_quads >= 0).astype(index_dtype)
+        upper_left = flat_quads[valid_cells].astype(index_dtype)
+        swath_cols = swath_shape[1]
+        # upper-left, upper-right, lower-right, lower-left
+        offsets = numpy.array([0, 1, swath_cols + 1, swath_cols], dtype=index_dtype)
+        swath_index = upper_left[:, None] + offsets[None, :]
+        u = u.ravel()[valid_cells]
+        v = v.ravel()[valid_cells]
+        weights = numpy.empty((valid_cells.size, 4), dtype=numpy.float32)
+        weights[:, 0] = (1 - u) * (1 - v)
+        weights[:, 1] = u * (1 - v)
+        weights[:, 2] = u * v
+        weights[:, 3] = (1 - u) * v
+        return cls(quad_index.shape, valid_cells, swath_index, weights)
+
+    @classmethod
+    def load(cls, filename):
+        with numpy.load(filename) as plan_file:
+            return cls(plan_file["grid_shape"], plan_file["valid_cells"], plan_file["swath_index"],
+                       plan_file["weights"])
+
+    def save(self, filename):
+        # use a file object so numpy doesn't add a '.npz' extension
+        with open(filename, "wb") as plan_file:
+            numpy.savez(plan_file, grid_shape=numpy.array(self.grid_shape), valid_cells=self.valid_cells,
+                        swath_index=self.swath_index, weights=self.weights)
+
+    @property
+    def num_valid(self):
+        """Number of grid cells inside the swath."""
+        return self.valid_cells.size
+
+    def resample(self, swath_arrays, fill_values, outs=None, categories=None):
+        """Interpolate a group of swath arrays sharing the same geolocation in to the grid.
+
+        All arrays are interpolated together, a chunk of grid cells at a time. Swath pixels equal
+        to their array's fill value are left out and the remaining weights are renormalized.
+
+        :param swath_arrays: swath data arrays, any shape with the same number of pixels as the plan's swath
+        :param fill_values: fill value of each swath array, also used for grid cells outside the swath
+        :param outs: optional arrays (ex. writable memory maps) of `grid_shape` to write the results to
+        :param categories: optional list of booleans, True for arrays of category values that should use
+                           the swath pixel with the highest weight instead of being interpolated
+        :returns: list of output arrays
+        """
+        num_arrays = len(swath_arrays)
+        if outs is None:
+            outs = [numpy.empty(self.grid_shape, dtype=arr.dtype) for arr in swath_arrays]
+        if categories is None:
+            categories = [False] * num_arrays
+        flat_inputs = [arr.reshape(-1) for arr in swath_arrays]
+        flat_outs = [out.reshape(-1) for out in outs]
+        for flat_out, fill_value in zip(flat_outs, fill_values):
+            flat_out.fill(fill_value)
+        fills = numpy.array(fill_values, dtype=numpy.float64).reshape(num_arrays, 1, 1)
+        categories = numpy.array(categories, dtype=numpy.bool_)
+
+        for start in range(0, self.num_valid, RESAMPLE_CHUNK_SIZE):
+            cells = self.valid_cells[start: start + RESAMPLE_CHUNK_SIZE]
+            index = self.swath_index[start: start + RESAMPLE_CHUNK_SIZE]
+            values = numpy.empty((num_arrays,) + index.shape, dtype=numpy.float64)
+            for arr_idx, flat_input in enumerate(flat_inputs):
+                values[arr_idx] = flat_input[index]
+            valid = ~(numpy.isnan(values) | (values == fills))
+            weights = self.weights[start: start + RESAMPLE_CHUNK_SIZE][None, :, :] * valid
+            weight_sum = weights.sum(axis=2)
+            values[~valid] = 0
+            with numpy.errstate(invalid="ignore", divide="ignore"):
+                results = (values * weights).sum(axis=2) / weight_sum
+            if categories.any():
+                # use the pixel with the largest weight
+                best = numpy.take_along_axis(values, weights.argmax(axis=2)[..., None], axis=2)[..., 0]
+                results[categories] = best[categories]
+            no_data = weight_sum <= 0
+            for arr_idx, flat_out in enumerate(flat_outs):
+                chunk_result = results[arr_idx]
+                if numpy.issubdtype(flat_out.dtype, numpy.integer):
+                    chunk_result = numpy.round(chunk_result)
+                chunk_result[no_data[arr_idx]] = fills[arr_idx, 0, 0]
+                flat_out[cells] = chunk_result
+        return outs
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+# Copyright (C) 2018 Space Science and Engineering Center (SSEC),
+# University of Wisconsin-Madison.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# This file is part of the polar2grid software package. Polar2grid takes
+# satellite observation data, remaps it, and writes it to a file format for
+#     input into another program.
+# Documentation: http://www.ssec.wisc.edu/software/polar2grid/
+#
+# Written by David Hoese    October 2018
+# University of Wisconsin-Madison
+# Space Science and Engineering Center
+# 1225 West Dayton Street
+# Madison, WI  53706
+# david.hoese@ssec.wisc.edu
+"""Persistent on-disk cache for ll2cr results.
+
+Cached column and row arrays are keyed by a hash of the longitude and
+latitude data and the definition of the grid being mapped to, so the same
+swath being remapped to the same grid in a later run can skip ll2cr entirely.
+The least recently used entries are removed when the cache grows larger
+than its size limit.
+
+:author:       David Hoese (davidh)
+:contact:      david.hoese@ssec.wisc.edu
+:organization: Space Science and Engineering Center (SSEC)
+:copyright:    Copyright (c) 2018 University of Wisconsin SSEC. All rights reserved.
+:date:         Oct 2018
+:license:      GNU GPLv3
+
+"""
+__docformat__ = "restructuredtext en"
+
+import hashlib
+import json
+from glob import glob
+import logging
+import os
+import shutil
+
+import numpy
+
+from polar2grid.core.containers import GridDefinition
+
+LOG = logging.getLogger(__name__)
+
+# increment when the ll2cr algorithm changes in a way that makes old results invalid
+CACHE_VERSION = 1
+# default maximum size of the cache directory in bytes
+DEFAULT_MAX_SIZE = 5 * 1024 ** 3
+# number of swath rows to hash at a time so we don't load the entire array in to memory
+HASH_ROWS = 256
+# grid attributes that may be filled in by ll2cr when the grid is dynamic
+DYNAMIC_GRID_KEYS = ("width", "height", "origin_x", "origin_y")
+
+
+def _read_entry_file(src_fn, dst):
+    """Copy a cache file to the filename `dst` or read it in to the array `dst`."""
+    if isinstance(dst, str):
+        shutil.copyfile(src_fn, dst)
+        return
+    with open(src_fn, "rb") as src_file:
+        if src_file.readinto(dst) != dst.nbytes:
+            raise ValueError("Cache file '%s' does not match the size of the swath" % (src_fn,))
+
+
+def _write_entry_file(src, dst_fn):
+    """Copy the filename `src` or write the array `src` to a cache file."""
+    if isinstance(src, str):
+        shutil.copyfile(src, dst_fn)
+    else:
+        src.tofile(dst_fn)
+
+
+class LL2CRCache(object):
+    """Directory of ll2cr column and row arrays shared between runs.
+
+    Each entry is made of a ``<key>_cols.dat`` and ``<key>_rows.dat`` flat binary file and a
+    ``<key>.json`` file describing the result. The JSON file is written last so an entry is
+    only valid once it exists. Its modification time is updated every time the entry is used
+    and is what least recently used eviction is based on. Resample plans (ex. nearest neighbor
+    or bilinear) computed from an entry are stored as ``<key>_<method>_<plan_id>.npz`` and are
+    removed with their entry.
+    """
+    def __init__(self, cache_dir, max_size=DEFAULT_MAX_SIZE):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        if not os.path.isdir(cache_dir):
+            LOG.debug("Creating ll2cr cache directory '%s'", cache_dir)
+            os.makedirs(cache_dir)
+
+    def _entry_paths(self, key):
+        prefix = os.path.join(self.cache_dir, key)
+        return prefix + ".json", prefix + "_cols.dat", prefix + "_rows.dat"
+
+    def _plan_paths(self, key):
+        return glob(os.path.join(self.cache_dir, key + "_*_*.npz"))
+
+    def _plan_path(self, key, method, plan_id):
+        return os.path.join(self.cache_dir, "%s_%s_%s.npz" % (key, method, plan_id))
+
+    def cache_key(self, swath_definition, grid_definition):
+        """Hash the swath's geolocation data and the grid definition in to a cache key.
+
+        The grid definition is hashed as provided, before any dynamic attributes are
+        filled in by ll2cr.
+        """
+        key_hash = hashlib.sha1()
+        key_hash.update(str(CACHE_VERSION).encode())
+        for arr in (swath_definition.get_longitude_array(), swath_definition.get_latitude_array()):
+            key_hash.update(("%s %r" % (arr.dtype.str, arr.shape)).encode())
+            for row_idx in range(0, arr.shape[0], HASH_ROWS):
+                key_hash.update(numpy.ascontiguousarray(arr[row_idx: row_idx + HASH_ROWS]).data)
+        key_hash.update(repr(swath_definition.get("fill_value", numpy.nan)).encode())
+        grid_info = dict((k, grid_definition.get(k)) for k in GridDefinition.required_kwargs if k != "grid_name")
+        key_hash.update(json.dumps(grid_info, sort_keys=True).encode())
+        return key_hash.hexdigest()
+
+    def get(self, key, cols_fn, rows_fn, grid_definition):
+        """Copy a cached result to `cols_fn` and `rows_fn`.
+
+        `cols_fn` and `rows_fn` may also be contiguous arrays to read the result in to.
+
+        Dynamic attributes of `grid_definition` are filled in from the cached result.
+
+        :returns: number of swath points in the grid or None if `key` is not cached
+        """
+        meta_fn, cache_cols_fn, cache_rows_fn = self._entry_paths(key)
+        if not os.path.isfile(meta_fn):
+            return None
+
+        try:
+            with open(meta_fn, "r") as meta_file:
+                meta = json.load(meta_file)
+            _read_entry_file(cache_cols_fn, cols_fn)
+            _read_entry_file(cache_rows_fn, rows_fn)
+            # mark the entry as recently used
+            os.utime(meta_fn, None)
+        except (OSError, ValueError):
+            LOG.warning("Could not load cached ll2cr results, will rerun ll2cr")
+            LOG.debug("ll2cr cache load exception:", exc_info=True)
+            return None
+
+        LOG.debug("Using cached ll2cr results for %s", grid_definition["grid_name"])
+        for k in DYNAMIC_GRID_KEYS:
+            grid_definition[k] = meta["grid_definition"][k]
+        return meta["points_in_grid"]
+
+    def put(self, key, cols_fn, rows_fn, grid_definition, points_in_grid):
+        """Store the ll2cr result in `cols_fn` and `rows_fn` (filenames or arrays) in the cache."""
+        meta_fn, cache_cols_fn, cache_rows_fn = self._entry_paths(key)
+        meta = {
+            "points_in_grid": int(points_in_grid),
+            "grid_definition": dict((k, grid_definition[k]) for k in DYNAMIC_GRID_KEYS),
+        }
+        try:
+            # copy to temporary names first so other processes never see partial files
+            for src_fn, dst_fn in ((cols_fn, cache_cols_fn), (rows_fn, cache_rows_fn)):
+                _write_entry_file(src_fn, dst_fn + ".tmp")
+                os.replace(dst_fn + ".tmp", dst_fn)
+            with open(meta_fn + ".tmp", "w") as meta_file:
+                json.dump(meta, meta_file)
+            os.replace(meta_fn + ".tmp", meta_fn)
+        except OSError:
+            LOG.warning("Could not save ll2cr results to cache directory '%s'", self.cache_dir)
+            LOG.debug("ll2cr cache save exception:", exc_info=True)
+            self.remove(key)
+            return
+
+        self.evict()
+
+    def get_plan(self, key, plan_id, plan_cls):
+        """Load a resample plan of type `plan_cls` for the entry `key` or None if it isn't cached."""
+        meta_fn = self._entry_paths(key)[0]
+        plan_fn = self._plan_path(key, plan_cls.method, plan_id)
+        if not os.path.isfile(meta_fn) or not os.path.isfile(plan_fn):
+            return None
+        try:
+            plan = plan_cls.load(plan_fn)
+            os.utime(meta_fn, None)
+        except (OSError, ValueError, KeyError):
+            LOG.warning("Could not load cached %s resample plan, will recompute it", plan_cls.method)
+            LOG.debug("Resample plan load exception:", exc_info=True)
+            return None
+        LOG.debug("Using cached %s resample plan '%s'", plan_cls.method, plan_fn)
+        return plan
+
+    def put_plan(self, key, plan_id, plan):
+        """Store a resample plan for the existing entry `key`."""
+        if not os.path.isfile(self._entry_paths(key)[0]):
+            # the ll2cr results were evicted, the plan would never be used
+            return
+        plan_fn = self._plan_path(key, plan.method, plan_id)
+        try:
+            plan.save(plan_fn + ".tmp")
+            os.replace(plan_fn + ".tmp", plan_fn)
+        except OSError:
+            LOG.warning("Could not save %s resample plan to cache directory '%s'", plan.method, self.cache_dir)
+            LOG.debug("Resample plan save exception:", exc_info=True)
+            if os.path.isfile(plan_fn + ".tmp"):
+                os.remove(plan_fn + ".tmp")
+            return
+        self.evict()
+
+    def remove(self, key):
+        """Remove all files for the entry `key`."""
+        for fn in list(self._entry_paths(key)) + self._plan_paths(key):
+            for entry_fn in (fn, fn + ".tmp"):
+                if os.path.isfile(entry_fn):
+                    try:
+                        os.remove(entry_fn)
+                    except OSError:
+                        LOG.debug("Could not remove ll2cr cache file '%s'", entry_fn, exc_info=True)
+
+    def entries(self):
+        """List of (last used time, size in bytes, key) for every complete entry in the cache."""
+        entries = []
+        for fn in os.listdir(self.cache_dir):
+            if not fn.endswith(".json"):
+                continue
+            key = fn[:-5]
+            try:
+                paths = self._entry_paths(key)
+                last_used = os.path.getmtime(paths[0])
+                size = sum(os.path.getsize(p) for p in list(paths) + self._plan_paths(key))
+            except OSError:
+                # removed by another process or incomplete
+                continue
+            entries.append((last_used, size, key))
+        return entries
+
+    def evict(self):
+        """Remove the least recently used entries until the cache is smaller than its size limit."""
+        entries = sorted(self.entries())
+        total_size = sum(e[1] for e in entries)
+        for last_used, size, key in entries:
+            if total_size <= self.max_size:
+                break
+            LOG.debug("Removing least recently used ll2cr cache entry '%s'", key)
+            self.remove(key)
+            total_size -= size
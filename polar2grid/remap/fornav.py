@@ -44,59 +44,117 @@ import sys
 import logging
 import numpy
 import os
+from concurrent.futures import ThreadPoolExecutor
 
 from polar2grid.remap import ms2gt, _fornav
 
 try:
     import psutil
-    get_free_memory = lambda: psutil.phymem_usage().free
 except ImportError:
     psutil = None
-    get_free_memory = lambda: None
 
 DEFAULT_GROUP_SIZE = int(os.getenv("P2G_EWA_DEF_GROUP_SIZE", 0)) or None
 GROUP_SIZE = int(os.getenv("P2G_EWA_GROUP_SIZE", 0)) or None
+# bytes per grid pixel for the float32 accumulation and weight grids of one channel
+ACCUM_ITEM_SIZE = 8
+# memory that is kept free for everything other than EWA resampling
+MEMORY_RESERVE = 0.1
 
 
 LOG = logging.getLogger(__name__)
 
 
-def calculate_group_size(swath_cols, swath_rows, grid_cols, grid_rows, default_group_size=DEFAULT_GROUP_SIZE,
-                         grid_multiplier=3, swath_multiplier=1, geo_multiplier=2, additional_used=0):
-    """Split a swath scene in to reasonably sized groups based on shared geolocation.
+def get_available_memory():
+    """Get the number of bytes of memory that can be used without swapping or None if it can't be determined."""
+    if psutil is None:
+        return None
+    return psutil.virtual_memory().available
 
-    If `use_memory` is True and available memory is known then the groups are split based on number of bytes.
 
-    Default items in a group is 5.
+def schedule_groups(num_channels, swath_cols, swath_rows, grid_cols, grid_rows, num_threads=1, max_memory=None,
+                    input_item_size=4, output_item_size=None, geo_item_size=4, default_group_size=DEFAULT_GROUP_SIZE):
+    """Decide how many channels to resample at a time and how many of those groups to run at the same time.
+
+    Every channel being resampled needs a float32 accumulation and weight grid for every thread, plus its
+    input swath and output grid which are usually memory mapped but become resident as they are used. The
+    geolocation arrays are shared by every group. Channels are kept in one group whenever they fit in the
+    memory budget so the EWA parameters only have to be computed once per scan. Otherwise the channels are
+    split in to evenly sized groups and, when there is more than one thread, the threads are split between
+    groups that run at the same time so the serial parts of each group overlap.
+
+    :param max_memory: Maximum number of bytes to use. Available memory is used when it is lower or when
+                       this is not specified.
+    :returns: (group_size, concurrent_groups, threads_per_group)
     """
-    free_memory_bytes = get_free_memory()
-    if free_memory_bytes is None:
-        if default_group_size is None:
-            return None
-        return int(default_group_size)
-
-    # Assumes input and output of 32-bit float type
-    item_size = 4
-    swath_size = swath_cols * swath_rows * item_size
-    grid_size = grid_cols * grid_rows * item_size
-    grid_effect = grid_size * grid_multiplier
-    geo_effect = swath_size * geo_multiplier
-    swath_effect = swath_size * swath_multiplier
-    max_group_size = max(int((free_memory_bytes - geo_effect - additional_used) / (grid_effect + swath_effect)), 1)
-    LOG.debug("Max group size calculated to be %d (free: %d, grid: %d, geo: %d, swath: %d)",
-              max_group_size, free_memory_bytes, grid_effect, geo_effect, swath_effect)
-    return max_group_size
+    num_threads = max(int(num_threads), 1)
+    available_memory = get_available_memory()
+    if available_memory is not None:
+        available_memory = int(available_memory * (1 - MEMORY_RESERVE))
+    budgets = [x for x in (max_memory, available_memory) if x is not None]
+    if not budgets:
+        group_size = min(int(default_group_size or num_channels), num_channels)
+        LOG.debug("Available memory is unknown, using EWA group size of %d", group_size)
+        return group_size, 1, num_threads
+    budget = min(budgets)
+
+    if output_item_size is None:
+        output_item_size = input_item_size
+    swath_size = swath_cols * swath_rows
+    grid_size = grid_cols * grid_rows
+    geo_cost = 2 * swath_size * geo_item_size
+    usable = budget - geo_cost
+
+    def _channel_cost(threads):
+        return grid_size * (ACCUM_ITEM_SIZE * threads + output_item_size) + swath_size * input_item_size
+
+    threads = num_threads
+    while threads > 1 and _channel_cost(threads) > usable:
+        threads -= 1
+    if threads != num_threads:
+        LOG.info("Using %d EWA threads instead of %d to fit in %0.2fGB of memory",
+                 threads, num_threads, budget / 1024. ** 3)
+    if _channel_cost(threads) > usable:
+        LOG.warning("A single channel needs an estimated %0.2fGB of memory for EWA resampling, but only "
+                    "%0.2fGB is available", (_channel_cost(threads) + geo_cost) / 1024. ** 3, budget / 1024. ** 3)
+
+    group_size = int(min(max(usable // _channel_cost(threads), 1), num_channels))
+    # spread the channels evenly over the fewest groups possible
+    num_groups = -(-num_channels // group_size)
+    group_size = -(-num_channels // num_groups)
+
+    concurrent_groups = min(num_groups, threads)
+    while concurrent_groups > 1 and \
+            concurrent_groups * group_size * _channel_cost(threads // concurrent_groups) > usable:
+        concurrent_groups -= 1
+    threads_per_group = max(threads // concurrent_groups, 1)
+
+    LOG.info("EWA resampling %d channels in %d group(s) of up to %d channels, %d at a time with %d thread(s) each "
+             "(estimated %0.2fGB of %0.2fGB)", num_channels, num_groups, group_size, concurrent_groups,
+             threads_per_group,
+             (geo_cost + concurrent_groups * group_size * _channel_cost(threads_per_group)) / 1024. ** 3,
+             budget / 1024. ** 3)
+    return group_size, concurrent_groups, threads_per_group
+
+
+def calculate_group_size(swath_cols, swath_rows, grid_cols, grid_rows, num_channels, **kwargs):
+    """Number of channels to resample at a time with EWA (see `schedule_groups`)."""
+    return schedule_groups(num_channels, swath_cols, swath_rows, grid_cols, grid_rows, **kwargs)[0]
 
 
 def group_iter(input_arrays, swath_cols, swath_rows, input_dtype, output_arrays, grid_cols, grid_rows, group_size):
+    """Load input and output arrays `group_size` at a time.
+
+    :param input_dtype: data type of every input array or a list with the data type of each input array
+    """
     ret_input_arrays = []
     ret_output_arrays = []
+    if not isinstance(input_dtype, (list, tuple)):
+        input_dtype = [input_dtype] * len(input_arrays)
 
-    for idx, (ia, oa) in enumerate(zip(input_arrays, output_arrays)):
+    for idx, (ia, oa, in_dtype) in enumerate(zip(input_arrays, output_arrays, input_dtype)):
         if isinstance(ia, str):
-            ret_input_arrays.append(numpy.memmap(ia, shape=(swath_rows, swath_cols), dtype=input_dtype, mode='r'))
-        else:
-            ret_input_arrays.append(ia)
+            ia = numpy.memmap(ia, shape=(swath_rows, swath_cols), dtype=in_dtype, mode='r')
+        ret_input_arrays.append(ia)
 
         # We iterate over this so that we only create output arrays when they are used
         if oa is None:
@@ -104,7 +162,7 @@ def group_iter(input_arrays, swath_cols, swath_rows, input_dtype, output_arrays,
             # we should return the numpy arrays in the main function since the user didn't provide any
             output_arrays[idx] = ret_output_arrays[-1]
         elif isinstance(oa, str):
-            ret_output_arrays.append(numpy.memmap(oa, shape=(grid_rows, grid_cols), dtype=input_dtype, mode='w+'))
+            ret_output_arrays.append(numpy.memmap(oa, shape=(grid_rows, grid_cols), dtype=ia.dtype, mode='w+'))
         else:
             ret_output_arrays.append(oa)
 
@@ -122,22 +180,28 @@ def group_iter(input_arrays, swath_cols, swath_rows, input_dtype, output_arrays,
 def fornav(cols_array, rows_array, rows_per_scan, input_arrays, input_dtype=None, input_fill=numpy.nan,
            output_arrays=None, output_fill=None, grid_cols=None, grid_rows=None,
            weight_count=10000, weight_min=0.01, weight_distance_max=1.0, weight_delta_max=10.0,
-           weight_sum_min=-1.0, maximum_weight_mode=False, use_group_size=False):
+           weight_sum_min=-1.0, maximum_weight_mode=False, use_group_size=False, num_threads=1,
+           scan_block_size=None, max_memory=None):
+    """Remap swath data to a grid using elliptical weighted averaging.
+
+    Input arrays may have different data types and fill values. `input_dtype`, `input_fill`, `output_fill`,
+    and `maximum_weight_mode` can be a single value for every input array or a list with one value per
+    input array. Outputs are the same data type as their input.
+
+    :param num_threads: Number of threads to split the swath scans across (default 1).
+                        Each thread keeps its own copy of the accumulation grids for every channel.
+    :param scan_block_size: Resample this many scans at a time to limit memory usage (see `fornav_blocks`).
+                            Threads are not used when resampling in blocks.
+    :param use_group_size: Split the input arrays in to groups that fit in memory (see `schedule_groups`).
+                           The number of threads may be reduced and spread over groups running at the same time.
+    :param max_memory: Maximum number of bytes to use when `use_group_size` is True
+    """
     include_output = False
 
     if input_dtype is None:
-        if isinstance(input_arrays[0], str):
+        if any(isinstance(ia, str) for ia in input_arrays):
             raise ValueError("Must provide `input_dtype` when using input filenames")
-        input_dtype = [ia.dtype for ia in input_arrays if hasattr(ia, "dtype")]
-
-    if isinstance(input_dtype, list):
-        if not all(in_dtype == input_dtype[0] for in_dtype in input_dtype):
-            raise ValueError("EWA remapping does not support multiple data types yet")
-        input_dtype = input_dtype[0]
-    if isinstance(input_fill, list):
-        if not all(in_fill == input_fill[0] or (numpy.isnan(in_fill) and numpy.isnan(input_fill[0])) for in_fill in input_fill):
-            raise ValueError("EWA remapping does not support multiple fill values yet")
-        input_fill = input_fill[0]
+        input_dtype = [ia.dtype for ia in input_arrays]
 
     if output_arrays is None:
         include_output = True
@@ -154,30 +218,59 @@ def fornav(cols_array, rows_array, rows_per_scan, input_arrays, input_dtype=None
     if output_fill is None:
         output_fill = input_fill
 
-    group_size = None
-    if use_group_size:
+    group_size = len(input_arrays)
+    concurrent_groups = 1
+    if use_group_size and not scan_block_size:
         if GROUP_SIZE is not None:
             group_size = GROUP_SIZE
         else:
-            group_size = None
-            # It seems like this could be a smart way of handling this is we were using multiprocessing, but
-            # a lot of testing is required to verify that assumption. The proper way to handle this or make it faster
-            # in general is to have parallel operations inside fornav (OpenMP or OpenCL/GPU).
-            # group_size = calculate_group_size(cols_array.shape[1], cols_array.shape[0], grid_cols, grid_rows)
-    if group_size is None:
-        group_size = len(input_arrays)
-
-    valid_list = []
-    for in_arrays, out_arrays in group_iter(input_arrays, cols_array.shape[1], cols_array.shape[0], input_dtype,
-                                            output_arrays, grid_cols, grid_rows, group_size):
+            dtypes = input_dtype if isinstance(input_dtype, (list, tuple)) else [input_dtype]
+            item_size = max(numpy.dtype(dt).itemsize for dt in dtypes)
+            group_size, concurrent_groups, num_threads = schedule_groups(
+                len(input_arrays), cols_array.shape[1], cols_array.shape[0], grid_cols, grid_rows,
+                num_threads=num_threads, max_memory=max_memory, input_item_size=item_size,
+                geo_item_size=cols_array.dtype.itemsize)
+
+    def _group_values(value, start, count):
+        # per-channel lists have to be split the same way as the input arrays
+        if isinstance(value, (list, tuple)):
+            return list(value[start: start + count])
+        return value
+
+    def _run_group(start, in_arrays, out_arrays):
         LOG.debug("Processing %d of %d input arrays", len(in_arrays), len(input_arrays))
-        tmp_valid_list = _fornav.fornav_wrapper(cols_array, rows_array, in_arrays, out_arrays,
-                                                input_fill, output_fill, rows_per_scan,
-                                                weight_count=weight_count, weight_min=weight_min, weight_distance_max=weight_distance_max,
-                                                weight_delta_max=weight_delta_max, weight_sum_min=weight_sum_min,
-                                                maximum_weight_mode=maximum_weight_mode)
-
-        valid_list.extend(tmp_valid_list)
+        count = len(in_arrays)
+        if scan_block_size:
+            return fornav_blocks(cols_array, rows_array, rows_per_scan, in_arrays, out_arrays,
+                                 input_fill, output_fill, scan_block_size,
+                                 weight_count=weight_count, weight_min=weight_min,
+                                 weight_distance_max=weight_distance_max, weight_delta_max=weight_delta_max,
+                                 weight_sum_min=weight_sum_min, maximum_weight_mode=maximum_weight_mode)
+        return _fornav.fornav_wrapper(cols_array, rows_array, in_arrays, out_arrays,
+                                      _group_values(input_fill, start, count),
+                                      _group_values(output_fill, start, count), rows_per_scan,
+                                      weight_count=weight_count, weight_min=weight_min,
+                                      weight_distance_max=weight_distance_max,
+                                      weight_delta_max=weight_delta_max, weight_sum_min=weight_sum_min,
+                                      maximum_weight_mode=_group_values(maximum_weight_mode, start, count),
+                                      num_threads=num_threads)
+
+    groups = group_iter(input_arrays, cols_array.shape[1], cols_array.shape[0], input_dtype,
+                        output_arrays, grid_cols, grid_rows, group_size)
+    valid_list = []
+    if concurrent_groups > 1:
+        # the resampling itself releases the GIL so groups can run at the same time in threads
+        with ThreadPoolExecutor(max_workers=concurrent_groups) as executor:
+            futures = []
+            start = 0
+            for in_arrays, out_arrays in groups:
+                futures.append(executor.submit(_run_group, start, in_arrays, out_arrays))
+                start += len(in_arrays)
+            for future in futures:
+                valid_list.extend(future.result())
+    else:
+        for in_arrays, out_arrays in groups:
+            valid_list.extend(_run_group(len(valid_list), in_arrays, out_arrays))
 
     if include_output:
         return valid_list, output_arrays
@@ -185,6 +278,144 @@ def fornav(cols_array, rows_array, rows_per_scan, input_arrays, input_dtype=None
         return valid_list
 
 
+def _block_grid_rows(cols_block, rows_block, grid_rows, margin):
+    """Get the first and last grid row that a block of swath pixels could contribute to."""
+    # same pixels that the EWA algorithm skips (NaNs compare False)
+    valid_rows = rows_block[(cols_block >= 0) & (rows_block >= 0)]
+    if not valid_rows.size:
+        return None
+    first_row = max(int(numpy.floor(valid_rows.min())) - margin, 0)
+    last_row = min(int(numpy.ceil(valid_rows.max())) + margin, grid_rows - 1)
+    if first_row > last_row:
+        return None
+    return first_row, last_row
+
+
+def _fill_rows(output_arrays, output_fill, first_row, end_row):
+    if end_row <= first_row:
+        return
+    for out_arr, out_fill in zip(output_arrays, output_fill):
+        out_arr[first_row: end_row] = out_fill
+
+
+def fornav_blocks(cols_array, rows_array, rows_per_scan, input_arrays, output_arrays, input_fill, output_fill,
+                  scan_block_size, weight_count=10000, weight_min=0.01, weight_distance_max=1.0,
+                  weight_delta_max=10.0, weight_sum_min=-1.0, maximum_weight_mode=False):
+    """Remap swath data to a grid with EWA resampling `scan_block_size` scans at a time.
+
+    Instead of accumulating every channel in to full size grids, only a window of grid rows is kept in
+    memory. Before resampling, the row array is read one block at a time to find the range of grid rows
+    every block can affect. After each block, rows at either end of the window that no remaining block
+    will touch are written to the output arrays and removed from the window, so grid rows can increase or
+    decrease along the track. For grids oriented along the swath's track this keeps memory usage
+    proportional to the block size instead of the length of the swath. Inputs and outputs
+    can be memory mapped files; only one block of each input array is read in to memory at a time.
+
+    Arguments are the same as :func:`fornav` except that input and output arrays must already be arrays
+    with outputs being the same data type as their inputs.
+
+    :returns: list of valid grid pixels for each output array
+    """
+    num_chans = len(input_arrays)
+    swath_rows = cols_array.shape[0]
+    grid_rows, grid_cols = output_arrays[0].shape
+    if rows_per_scan < 2 or swath_rows % rows_per_scan != 0:
+        raise ValueError("EWA requires 2 or more rows_per_scan and must be a factor of the total number of input rows")
+    if weight_sum_min == -1.0:
+        weight_sum_min = weight_min
+    output_fill = output_fill if isinstance(output_fill, (list, tuple)) else [output_fill] * num_chans
+    mwm_list = maximum_weight_mode if isinstance(maximum_weight_mode, (list, tuple)) else [maximum_weight_mode] * num_chans
+    block_rows = int(scan_block_size) * rows_per_scan
+    # ellipses are limited to `weight_delta_max` except when geolocation is bad
+    margin = int(numpy.ceil(max(weight_delta_max, weight_distance_max))) + 1
+
+    block_starts = list(range(0, swath_rows, block_rows))
+    block_extents = [_block_grid_rows(cols_array[start: start + block_rows], rows_array[start: start + block_rows],
+                                      grid_rows, margin) for start in block_starts]
+    # the first grid row and the row after the last one that any of the remaining blocks could still change
+    remaining_first = [grid_rows] * (len(block_starts) + 1)
+    remaining_end = [0] * (len(block_starts) + 1)
+    for block_idx in range(len(block_starts) - 1, -1, -1):
+        extent = block_extents[block_idx]
+        remaining_first[block_idx] = remaining_first[block_idx + 1]
+        remaining_end[block_idx] = remaining_end[block_idx + 1]
+        if extent is not None:
+            remaining_first[block_idx] = min(remaining_first[block_idx], extent[0])
+            remaining_end[block_idx] = max(remaining_end[block_idx], extent[1] + 1)
+
+    valid_list = [0] * num_chans
+    got_point = False
+    # rows before `written_top` and from `written_bottom` on have been written to the outputs
+    written_top = 0
+    written_bottom = grid_rows
+    window_start = 0
+    grid_accums = numpy.zeros((num_chans, 0, grid_cols), dtype=numpy.float32)
+    grid_weights = numpy.zeros((num_chans, 0, grid_cols), dtype=numpy.float32)
+    max_window_rows = 0
+    for block_idx, (start, extent) in enumerate(zip(block_starts, block_extents)):
+        if extent is not None:
+            first_row, last_row = extent
+            window_end = window_start + grid_accums.shape[1]
+            if not grid_accums.shape[1]:
+                window_start = window_end = first_row
+            new_start = min(window_start, first_row)
+            new_end = max(window_end, last_row + 1)
+            if new_start != window_start or new_end != window_end:
+                # grow the window to include every row this block can touch
+                new_accums = numpy.zeros((num_chans, new_end - new_start, grid_cols), dtype=numpy.float32)
+                new_weights = numpy.zeros((num_chans, new_end - new_start, grid_cols), dtype=numpy.float32)
+                new_accums[:, window_start - new_start: window_end - new_start] = grid_accums
+                new_weights[:, window_start - new_start: window_end - new_start] = grid_weights
+                grid_accums, grid_weights, window_start = new_accums, new_weights, new_start
+                max_window_rows = max(max_window_rows, grid_accums.shape[1])
+
+            cols_block = numpy.ascontiguousarray(cols_array[start: start + block_rows])
+            # make rows relative to the window
+            rows_block = numpy.ascontiguousarray(rows_array[start: start + block_rows]) - \
+                rows_array.dtype.type(window_start)
+            input_blocks = tuple(numpy.ascontiguousarray(ia[start: start + block_rows]) for ia in input_arrays)
+            got_point |= _fornav.accumulate_block(cols_block, rows_block, input_blocks, input_fill, rows_per_scan,
+                                                  grid_accums, grid_weights, weight_count=weight_count,
+                                                  weight_min=weight_min, weight_distance_max=weight_distance_max,
+                                                  weight_delta_max=weight_delta_max,
+                                                  maximum_weight_mode=maximum_weight_mode)
+
+        # write out rows at either end that won't be changed by later blocks
+        final_top = min(remaining_first[block_idx + 1], written_bottom)
+        final_bottom = max(remaining_end[block_idx + 1], final_top)
+        for first_row, end_row in ((written_top, final_top), (final_bottom, written_bottom)):
+            if end_row <= first_row:
+                continue
+            window_end = window_start + grid_accums.shape[1]
+            # rows outside the window were never touched by a swath pixel
+            _fill_rows(output_arrays, output_fill, first_row, min(end_row, window_start))
+            _fill_rows(output_arrays, output_fill, max(first_row, window_end), end_row)
+            done_start = max(first_row, window_start)
+            done_end = min(end_row, window_end)
+            if done_end <= done_start:
+                continue
+            for chan_idx, out_arr in enumerate(output_arrays):
+                valid_list[chan_idx] += _fornav.write_grid_rows(
+                    grid_accums[chan_idx, done_start - window_start: done_end - window_start],
+                    grid_weights[chan_idx, done_start - window_start: done_end - window_start],
+                    out_arr[done_start: done_end], output_fill[chan_idx],
+                    maximum_weight_mode=mwm_list[chan_idx], weight_sum_min=weight_sum_min)
+            # finished rows are always at the start or the end of the window
+            if done_start == window_start:
+                keep = slice(done_end - window_start, None)
+                window_start = done_end
+            else:
+                keep = slice(None, done_start - window_start)
+            grid_accums = grid_accums[:, keep].copy()
+            grid_weights = grid_weights[:, keep].copy()
+        written_top, written_bottom = final_top, final_bottom
+
+    LOG.debug("EWA resampling used a maximum of %d grid rows at a time", max_window_rows)
+    if not got_point:
+        raise RuntimeError("EWA Resampling: No swath pixels found inside grid to be resampled")
+    return valid_list
+
+
 def ms2gt_fornav(*args, **kwargs):
     """Run the ms2gt wrapper for fornav.
 
@@ -71,13 +71,14 @@ def mask_helper(arr, fill):
         return arr == fill
 
 
-def ll2cr(lon_arr, lat_arr, grid_info, fill_in=numpy.nan, inplace=True):
+def ll2cr(lon_arr, lat_arr, grid_info, fill_in=numpy.nan, inplace=True, num_threads=1):
     """Project longitude and latitude points to columns and rows in the specified grid in place
 
     :param lon_arr: Numpy array of longitude floats
     :param lat_arr: Numpy array of latitude floats
     :param grid_info: dictionary of grid information (see below)
     :param fill_in: Fill value for input longitude and latitude arrays and used for output
+    :param num_threads: Process blocks of rows in this many threads (default 1)
     :returns: tuple(points_in_grid, cols_out, rows_out)
 
     The provided grid info must have the following parameters (optional grids mean dynamic):
@@ -105,26 +106,36 @@ def ll2cr(lon_arr, lat_arr, grid_info, fill_in=numpy.nan, inplace=True):
     oy = grid_info.get("origin_y", None)
     is_static = None not in [w, h, ox, oy]
 
-    # C code requires 64-bit floats and to do in place it must be writeable, otherwise we need to make a copy
-    is_double = lon_arr.dtype == numpy.float64 and lon_arr.dtype == numpy.float64
+    # Full array C code requires 64-bit floats, the block version also handles 32-bit floats
+    # To do in place the arrays must be writeable and contiguous, otherwise we need to make a copy
+    is_double = lon_arr.dtype == numpy.float64 and lat_arr.dtype == numpy.float64
+    is_float = lon_arr.dtype == numpy.float32 and lat_arr.dtype == numpy.float32
     is_writeable = lon_arr.flags.writeable and lat_arr.flags.writeable
+    is_contiguous = lon_arr.flags.c_contiguous and lat_arr.flags.c_contiguous
+    use_blocks = num_threads > 1 or is_float
     lon_orig = lon_arr
     lat_orig = lat_arr
     copy_result = False
-    # XXX: Check that automatic casting can't be done on the C side
-    if not is_double or not is_writeable:
+    if not (is_double or is_float) or not is_writeable or not is_contiguous:
         LOG.debug("Copying longitude and latitude arrays because inplace processing could not be done")
         copy_result = True
-        lon_arr = lon_arr.astype(numpy.float64)
-        lat_arr = lat_arr.astype(numpy.float64)
-
-    if is_static:
+        copy_dtype = numpy.float32 if is_float else numpy.float64
+        lon_arr = numpy.array(lon_arr, dtype=copy_dtype, order="C")
+        lat_arr = numpy.array(lat_arr, dtype=copy_dtype, order="C")
+
+    if is_static and use_blocks:
+        LOG.debug("Running static version of ll2cr with %d threads...", num_threads)
+        points_in_grid = _ll2cr.ll2cr_static_blocks(lon_arr, lat_arr, fill_in, p, cw, ch, w, h, ox, oy,
+                                                    num_threads=num_threads)
+    elif is_static:
         LOG.debug("Running static version of ll2cr...")
         points_in_grid = _ll2cr.ll2cr_static(lon_arr, lat_arr, fill_in, p, cw, ch, w, h, ox, oy)
     else:
-        LOG.debug("Running dynamic version of ll2cr...")
-        results = _ll2cr.ll2cr_dynamic(lon_arr, lat_arr, fill_in, p, cw, ch,
-                                       width=w, height=h, origin_x=ox, origin_y=oy)
+        # the grid is sized from the swath edges first so the full swath is only projected once
+        LOG.debug("Running dynamic version of ll2cr with %d threads...", num_threads)
+        results = _ll2cr.ll2cr_dynamic_blocks(lon_arr, lat_arr, fill_in, p, cw, ch,
+                                              width=w, height=h, origin_x=ox, origin_y=oy,
+                                              num_threads=num_threads)
         points_in_grid, lon_arr, lat_arr, origin_x, origin_y, width, height = results
         # edit the grid info dictionary in place
         grid_info["origin_x"] = origin_x
@@ -140,6 +151,102 @@ def ll2cr(lon_arr, lat_arr, grid_info, fill_in=numpy.nan, inplace=True):
     return points_in_grid, lon_orig, lat_orig
 
 
+def project_swath(lon_arr, lat_arr, proj4_definition, num_threads=1):
+    """Project longitude and latitude points to X/Y points in the projection space
+
+    The X/Y points can be converted to columns and rows for every static grid that uses the same
+    projection with `xy2cr`, which is much faster than running `ll2cr` for each grid.
+
+    :param num_threads: Process blocks of rows in this many threads (default 1)
+    :returns: tuple(x_arr, y_arr) as 64-bit floats
+    """
+    return _ll2cr.project_blocks(lon_arr, lat_arr, proj4_definition, num_threads=num_threads)
+
+
+def xy2cr(x_arr, y_arr, grid_info, cols_out, rows_out, fill_in=numpy.nan, num_threads=1):
+    """Convert X/Y points from `project_swath` to columns and rows in the specified static grid
+
+    The results are the same as running `ll2cr` on the longitude and latitude points.
+
+    :param grid_info: dictionary of static grid information (see `ll2cr`)
+    :param cols_out: C contiguous array to write the columns to
+    :param rows_out: C contiguous array to write the rows to
+    :returns: tuple(points_in_grid, cols_out, rows_out)
+    """
+    grid_args = [grid_info.get(k, None) for k in ("width", "height", "origin_x", "origin_y")]
+    if None in grid_args:
+        raise ValueError("Grid must be static to convert X/Y points to columns and rows")
+    w, h, ox, oy = grid_args
+    points_in_grid = _ll2cr.xy2cr_blocks(x_arr, y_arr, cols_out, rows_out, fill_in, grid_info["proj4_definition"],
+                                         grid_info["cell_width"], grid_info["cell_height"], w, h, ox, oy,
+                                         num_threads=num_threads)
+    return points_in_grid, cols_out, rows_out
+
+
+def _sample_indexes(size, max_samples):
+    """Evenly spaced indexes in to an axis of `size` items that always include the first and last item."""
+    num_samples = max(min(size, max_samples), 2)
+    return numpy.unique(numpy.linspace(0, size - 1, num_samples).round().astype(numpy.intp))
+
+
+def footprint_coverage(lon_arr, lat_arr, grid_info, fill_in=numpy.nan, max_samples=64, margin=10.0):
+    """Estimate how much of a swath lands in a static grid and how much of the grid it covers.
+
+    Only a lattice of up to `max_samples` by `max_samples` swath points, including the swath's
+    perimeter, is projected. Every cell of the lattice is assumed to cover its bounding box in
+    grid space plus `margin` grid cells, so the estimates are upper bounds of what a full ll2cr
+    and resampling would find. Lattice cells with some invalid corners could be anywhere and
+    are counted as fully covering the grid.
+
+    :param grid_info: dictionary of static grid information (see `ll2cr`)
+    :param margin: Number of grid cells a swath pixel can affect beyond its own location
+    :returns: tuple(fraction of swath points in the grid, fraction of grid cells covered)
+    """
+    swath_rows, swath_cols = lon_arr.shape
+    if swath_rows < 2 or swath_cols < 2:
+        return 1.0, 1.0
+    row_idx = _sample_indexes(swath_rows, max_samples)
+    col_idx = _sample_indexes(swath_cols, max_samples)
+    lon_sample = numpy.array(lon_arr[row_idx][:, col_idx], dtype=numpy.float64, order="C")
+    lat_sample = numpy.array(lat_arr[row_idx][:, col_idx], dtype=numpy.float64, order="C")
+    w = grid_info["width"]
+    h = grid_info["height"]
+    _ll2cr.ll2cr_static(lon_sample, lat_sample, fill_in, grid_info["proj4_definition"],
+                        grid_info["cell_width"], grid_info["cell_height"], w, h,
+                        grid_info["origin_x"], grid_info["origin_y"])
+    cols = lon_sample
+    rows = lat_sample
+    valid = ~(mask_helper(cols, fill_in) | mask_helper(rows, fill_in) | ~numpy.isfinite(cols) | ~numpy.isfinite(rows))
+
+    # the four corners of every lattice cell
+    corners = (slice(None, -1), slice(1, None))
+    corner_slices = [(r, c) for r in corners for c in corners]
+    quad_valid = numpy.array([valid[s] for s in corner_slices])
+    quad_cols = numpy.array([numpy.where(valid, cols, numpy.inf)[s] for s in corner_slices])
+    quad_rows = numpy.array([numpy.where(valid, rows, numpy.inf)[s] for s in corner_slices])
+    any_valid = quad_valid.any(axis=0)
+    partial = any_valid & ~quad_valid.all(axis=0)
+
+    # clip every cell's bounding box to the grid
+    min_col = numpy.clip(quad_cols.min(axis=0) - margin, 0, w)
+    min_row = numpy.clip(quad_rows.min(axis=0) - margin, 0, h)
+    quad_cols[~quad_valid] = -numpy.inf
+    quad_rows[~quad_valid] = -numpy.inf
+    max_col = numpy.clip(quad_cols.max(axis=0) + margin, 0, w)
+    max_row = numpy.clip(quad_rows.max(axis=0) + margin, 0, h)
+    box_area = numpy.where(any_valid, (max_col - min_col) * (max_row - min_row), 0)
+    in_grid = partial | (box_area > 0)
+
+    # number of swath pixels each lattice cell stands for
+    swath_pixels = numpy.diff(row_idx)[:, None] * numpy.diff(col_idx)[None, :]
+    swath_fraction = swath_pixels[in_grid].sum() / float(swath_pixels.sum())
+    if partial.any():
+        grid_fraction = 1.0
+    else:
+        grid_fraction = min(box_area[in_grid].sum() / float(w * h), 1.0)
+    return swath_fraction, grid_fraction
+
+
 def python_ll2cr(lon_arr, lat_arr, grid_info, fill_in=numpy.nan, fill_out=None, cols_out=None, rows_out=None):
     """Project longitude and latitude points to column rows in the specified grid.
 
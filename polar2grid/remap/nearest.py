@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+# Copyright (C) 2018 Space Science and Engineering Center (SSEC),
+# University of Wisconsin-Madison.
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# This file is part of the polar2grid software package. Polar2grid takes
+# satellite observation data, remaps it, and writes it to a file format for
+# input into another program.
+# Documentation: http://www.ssec.wisc.edu/software/polar2grid/
+#
+#     Written by David Hoese    November 2018
+#     University of Wisconsin-Madison
+#     Space Science and Engineering Center
+#     1225 West Dayton Street
+#     Madison, WI  53706
+#     david.hoese@ssec.wisc.edu
+"""Nearest neighbor resampling of swath data already mapped to grid columns and rows.
+
+Instead of building a KD-tree of the swath points and querying it with every
+grid cell, swath points are scattered in to the grid cells around them and the
+closest point is kept for each cell. Since ll2cr has already put the swath
+points in grid index space this only requires searching a small neighborhood of
+cells limited by the distance upper bound.
+
+:author:       David Hoese (davidh)
+:contact:      david.hoese@ssec.wisc.edu
+:organization: Space Science and Engineering Center (SSEC)
+:copyright:    Copyright (c) 2018 University of Wisconsin SSEC. All rights reserved.
+:date:         Nov 2018
+:license:      GNU GPLv3
+
+"""
+__docformat__ = "restructuredtext en"
+
+import logging
+
+import numpy
+
+from polar2grid.remap import _nearest
+
+LOG = logging.getLogger(__name__)
+
+
+def grid_nearest_index(cols, rows, grid_shape, distance_upper_bound):
+    """Find the closest swath point to the center of every grid cell.
+
+    :param cols: 1D array of valid swath point column locations in the grid
+    :param rows: 1D array of valid swath point row locations in the grid
+    :param grid_shape: (height, width) of the output grid
+    :param distance_upper_bound: Maximum distance in grid cells between a cell and its nearest point
+    :returns: 2D integer array of indexes in to `cols`/`rows`, `cols.size` where no point was found
+              (the same convention as :meth:`scipy.spatial.cKDTree.query`)
+    """
+    # the extension only handles 32-bit or 64-bit floats and both arrays must be the same type
+    dtype = cols.dtype if cols.dtype in (numpy.float32, numpy.float64) and rows.dtype == cols.dtype else numpy.float64
+    cols = numpy.ascontiguousarray(cols, dtype=dtype)
+    rows = numpy.ascontiguousarray(rows, dtype=dtype)
+    return _nearest.grid_nearest_index(cols, rows, grid_shape[0], grid_shape[1], distance_upper_bound)
+
+
+class NearestResamplePlan(object):
+    """Precomputed nearest neighbor mapping from swath pixels to grid cells.
+
+    A plan is computed once per geolocation and grid and can then be applied to
+    every product sharing that geolocation. Only grid cells that have a swath
+    pixel mapped to them are stored.
+
+    :param grid_shape: (height, width) of the output grid
+    :param valid_cells: 1D array of flattened grid cell indexes that have a nearest swath pixel
+    :param swath_index: 1D array of flattened swath pixel indexes for every cell in `valid_cells`
+    """
+    method = "nearest"
+
+    def __init__(self, grid_shape, valid_cells, swath_index):
+        self.grid_shape = tuple(grid_shape)
+        self.valid_cells = valid_cells
+        self.swath_index = swath_index
+
+    @classmethod
+    def from_index(cls, index, good_mask):
+        """Create a plan from the results of a nearest neighbor search.
+
+        :param index: 2D array of indexes in to the good swath pixels, ``good_mask.sum()`` where
+                      there is no nearest pixel (see :func:`grid_nearest_index`)
+        :param good_mask: flattened boolean mask of the swath pixels that were searched
+        """
+        good_index = numpy.flatnonzero(good_mask)
+        index_dtype = numpy.int32 if good_mask.size < 2 ** 31 else numpy.int64
+        flat_index = index.ravel()
+        valid_cells = numpy.flatnonzero(flat_index < good_index.size).astype(index_dtype)
+        swath_index = good_index[flat_index[valid_cells]].astype(index_dtype)
+        return cls(index.shape, valid_cells, swath_index)
+
+    @classmethod
+    def load(cls, filename):
+        with numpy.load(filename) as plan_file:
+            return cls(plan_file["grid_shape"], plan_file["valid_cells"], plan_file["swath_index"])
+
+    def save(self, filename):
+        # use a file object so numpy doesn't add a '.npz' extension
+        with open(filename, "wb") as plan_file:
+            numpy.savez(plan_file, grid_shape=numpy.array(self.grid_shape),
+                        valid_cells=self.valid_cells, swath_index=self.swath_index)
+
+    @property
+    def num_valid(self):
+        """Number of grid cells with a nearest swath pixel."""
+        return self.valid_cells.size
+
+    def resample(self, swath_arr, fill_value, out=None):
+        """Gather swath pixels in to a grid.
+
+        :param swath_arr: swath data array, any shape with the same number of pixels as the plan's swath
+        :param fill_value: value to put in grid cells without a nearest swath pixel
+        :param out: optional array (ex. a writable memory map) of `grid_shape` to write the result to
+        """
+        if out is None:
+            out = numpy.empty(self.grid_shape, dtype=swath_arr.dtype)
+        out_flat = out.reshape(-1)
+        out_flat.fill(fill_value)
+        out_flat[self.valid_cells] = swath_arr.reshape(-1)[self.swath_index]
+        return out
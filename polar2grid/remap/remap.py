@@ -71,7 +71,23 @@ from python.
 .. note::
 
     The nearest neighbor resampling method (nearest) is experimental and will be
-    replaced by a more stable implementation in future releases.
+    replaced by a more stable implementation in future releases. The 'nearest_grid'
+    method produces the same results without building a KD-tree by searching
+    only the grid cells surrounding each swath pixel, which is faster and uses
+    less memory for large grids.
+
+The 'bilinear' method interpolates every grid cell from the 4 swath pixels
+surrounding it. The pixels and weights are computed once for each geolocation
+and grid and reused for every product (and between runs with ``--ll2cr-cache-dir``).
+
+Intermediate Files
+------------------
+
+By default the ll2cr results and the gridded data for every product are written to
+flat binary files in the current directory. With ``--in-memory`` they are kept as
+arrays in memory instead and gridded products hold the array in their ``grid_data``.
+Results are only written to files once the memory limit (``--in-memory-size``) or the
+memory available on the system would be exceeded.
 
 """
 __docformat__ = "restructuredtext en"
@@ -79,6 +95,7 @@ __docformat__ = "restructuredtext en"
 import signal
 import sys
 
+import hashlib
 import logging
 import numpy
 import os
@@ -90,6 +107,9 @@ from scipy.spatial import cKDTree
 from polar2grid.core.containers import GriddedProduct, GriddedScene, SwathScene
 from polar2grid.grids import GridManager
 from polar2grid.remap import fornav
+from polar2grid.remap.cache import LL2CRCache, DEFAULT_MAX_SIZE
+from polar2grid.remap.nearest import grid_nearest_index, NearestResamplePlan
+from polar2grid.remap.bilinear import grid_bilinear_index, BilinearResamplePlan, MAX_QUAD_SIZE
 from polar2grid.remap import ll2cr as ll2cr  # gridinator
 
 LOG = logging.getLogger(__name__)
@@ -118,17 +138,36 @@ def init_worker():
 
 class Remapper(object):
     def __init__(self, grid_configs=None,
-                 overwrite_existing=False, keep_intermediate=False, exit_on_error=True, **kwargs):
+                 overwrite_existing=False, keep_intermediate=False, exit_on_error=True,
+                 ll2cr_threads=1, ll2cr_cache_dir=None, ll2cr_cache_size=None,
+                 in_memory=False, in_memory_size=None, workspace=None, **kwargs):
         self.grid_manager = GridManager(*(grid_configs or []))
+        # `polar2grid.core.workspace.Workspace` that places and removes intermediate files, if any
+        self.workspace = workspace
         self.overwrite_existing = overwrite_existing
         self.keep_intermediate = keep_intermediate
         self.exit_on_error = exit_on_error
+        self.ll2cr_threads = ll2cr_threads
+        self.in_memory = in_memory
+        # maximum number of bytes of intermediate arrays to keep in memory for one scene
+        self.in_memory_size = None if in_memory_size is None else int(in_memory_size * 1024 ** 3)
+        self._memory_used = 0
         self.methods = {
             "ewa": self._remap_scene_ewa,
             "nearest": self._remap_scene_nearest,
+            "nearest_grid": self._remap_scene_nearest_grid,
+            "bilinear": self._remap_scene_bilinear,
             "sensor": self._remap_scene_sensor,
         }
         self.ll2cr_cache = {}
+        # on-disk cache keys for the results in `ll2cr_cache`
+        self.ll2cr_cache_keys = {}
+        self.ll2cr_disk_cache = None
+        # (swath name, projection) -> projected swath shared by static grids in the same projection
+        self.projection_cache = {}
+        if ll2cr_cache_dir:
+            max_size = DEFAULT_MAX_SIZE if ll2cr_cache_size is None else int(ll2cr_cache_size * 1024 ** 3)
+            self.ll2cr_disk_cache = LL2CRCache(ll2cr_cache_dir, max_size=max_size)
 
     def highest_resolution_swath_definition(self, swath_scene_or_product):
         if isinstance(swath_scene_or_product, SwathScene):
@@ -156,6 +195,8 @@ class Remapper(object):
         else:
             grid_def = self.grid_manager.get_grid_definition(grid_name)
         func = self.methods[method]
+        # gridded arrays from previous scenes are owned (and freed) by the caller
+        self._memory_used = 0
 
         # FUTURE: Make this a keyword and add the logic to support it
         if kwargs.get("share_dynamic_grids", True) and method != "sensor":
@@ -163,6 +204,12 @@ class Remapper(object):
             best_swath_def = self.highest_resolution_swath_definition(swath_scene)
             LOG.debug("Running ll2cr on the highest resolution swath to determine if it fits")
             try:
+                margin = 10.0
+                if grid_def.is_static:
+                    margin = max(margin, self._fornav_D(best_swath_def, grid_def, kwargs.get("fornav_D", None)),
+                                 kwargs.get("distance_upper_bound") or 0.0)
+                self.check_footprint(best_swath_def, grid_def, swath_usage=kwargs.get("swath_usage", SWATH_USAGE),
+                                     grid_coverage=kwargs.get("grid_coverage", GRID_COVERAGE), margin=margin)
                 self.run_ll2cr(best_swath_def, grid_def, swath_usage=kwargs.get("swath_usage", SWATH_USAGE))
                 grid_str = str(grid_def).replace("\n", "\n\t")
                 LOG.info("Grid information:\n\t%s", grid_str)
@@ -172,6 +219,33 @@ class Remapper(object):
 
         return func(swath_scene, grid_def, **kwargs)
 
+    def check_footprint(self, swath_definition, grid_definition, swath_usage=SWATH_USAGE,
+                        grid_coverage=GRID_COVERAGE, margin=10.0):
+        """Quickly check that a swath could fit in a static grid before running ll2cr on all of it.
+
+        A subsample of the swath is projected to estimate upper bounds of the swath usage and grid
+        coverage (see :func:`polar2grid.remap.ll2cr.footprint_coverage`). Dynamic grids always fit.
+
+        :raises RuntimeError: if the swath can not use `swath_usage` of its pixels or cover `grid_coverage` of the grid
+        """
+        geo_id = swath_definition["swath_name"]
+        grid_name = grid_definition["grid_name"]
+        if not grid_definition.is_static or (geo_id, grid_name) in self.ll2cr_cache:
+            return
+        swath_fraction, grid_fraction = ll2cr.footprint_coverage(swath_definition.get_longitude_array(),
+                                                                 swath_definition.get_latitude_array(),
+                                                                 grid_definition,
+                                                                 fill_in=swath_definition["fill_value"],
+                                                                 margin=margin)
+        LOG.debug("Swath footprint estimate for grid %s: at most %f%% of the swath used and %f%% of the grid covered",
+                  grid_name, swath_fraction * 100, grid_fraction * 100)
+        if swath_fraction <= float(swath_usage):
+            LOG.error("Data does not fit in grid %s because at most %f%% of the swath is used" % (grid_name, swath_fraction * 100))
+            raise RuntimeError("Data does not fit in grid %s" % (grid_name,))
+        if grid_fraction <= float(grid_coverage):
+            LOG.error("Data does not fit in grid %s because at most %f%% of the grid is covered" % (grid_name, grid_fraction * 100))
+            raise RuntimeError("Data does not fit in grid %s" % (grid_name,))
+
     def run_ll2cr(self, swath_definition, grid_definition, swath_usage=SWATH_USAGE):
         geo_id = swath_definition["swath_name"]
         grid_name = grid_definition["grid_name"]
@@ -184,33 +258,71 @@ class Remapper(object):
         # lon_arr = swath_definition.get_longitude_array()
         # lat_arr = swath_definition.get_latitude_array()
 
-        if os.path.isfile(rows_fn):
-            if not self.overwrite_existing:
-                LOG.error("Intermediate remapping file already exists: %s" % (rows_fn,))
-                raise RuntimeError("Intermediate remapping file already exists: %s" % (rows_fn,))
-            else:
-                LOG.warning("Intermediate remapping file already exists, will overwrite: %s", rows_fn)
-        if os.path.isfile(cols_fn):
-            if not self.overwrite_existing:
-                LOG.error("Intermediate remapping file already exists: %s" % (cols_fn,))
-                raise RuntimeError("Intermediate remapping file already exists: %s" % (cols_fn,))
-            else:
-                LOG.warning("Intermediate remapping file already exists, will overwrite: %s", cols_fn)
-        try:
-            rows_arr = swath_definition.copy_latitude_array(filename=rows_fn, read_only=False)
-            cols_arr = swath_definition.copy_longitude_array(filename=cols_fn, read_only=False)
-            points_in_grid, _, _ = ll2cr.ll2cr(cols_arr, rows_arr, grid_definition,
-                                               fill_in=swath_definition["fill_value"])
-            grid_str = str(grid_definition).replace("\n", "\n\t")
-            LOG.debug("Grid information:\n\t%s", grid_str)
-        except (RuntimeError, ValueError, OSError):
-            LOG.error("Unexpected error encountered during ll2cr gridding for %s -> %s", geo_id, grid_name)
-            LOG.debug("ll2cr error exception: ", exc_info=True)
-            self._safe_remove(rows_fn, cols_fn)
-            raise
+        shape = (swath_definition["swath_rows"], swath_definition["swath_columns"])
+        dtype = numpy.dtype(swath_definition["data_type"])
+        ll2cr_size = 2 * shape[0] * shape[1] * dtype.itemsize
+        if self._fits_in_memory(ll2cr_size):
+            self._memory_used += ll2cr_size
+            # the results are the arrays themselves instead of filenames
+            rows_fn = numpy.empty(shape, dtype=dtype)
+            cols_fn = numpy.empty(shape, dtype=dtype)
+        else:
+            if self.in_memory:
+                LOG.debug("Not enough memory to keep ll2cr results in memory, writing them to files")
+            if self.workspace is not None:
+                rows_fn = self.workspace.path(rows_fn, nbytes=ll2cr_size // 2, fast=True)
+                cols_fn = self.workspace.path(cols_fn, nbytes=ll2cr_size // 2, fast=True)
+            self._check_intermediate_file(rows_fn)
+            self._check_intermediate_file(cols_fn)
+        points_in_grid = None
+        cache_key = None
+        if self.ll2cr_disk_cache is not None:
+            cache_key = self.ll2cr_disk_cache.cache_key(swath_definition, grid_definition)
+            points_in_grid = self.ll2cr_disk_cache.get(cache_key, cols_fn, rows_fn, grid_definition)
+            if points_in_grid is not None:
+                self.ll2cr_cache_keys[(geo_id, grid_name)] = cache_key
+
+        if points_in_grid is None:
+            try:
+                projected_swath = self._projected_swath(swath_definition, grid_definition)
+                if projected_swath is not None:
+                    if isinstance(rows_fn, str):
+                        rows_arr = numpy.memmap(rows_fn, dtype=dtype, mode="w+", shape=shape)
+                        cols_arr = numpy.memmap(cols_fn, dtype=dtype, mode="w+", shape=shape)
+                    else:
+                        rows_arr, cols_arr = rows_fn, cols_fn
+                    points_in_grid, _, _ = ll2cr.xy2cr(projected_swath[0], projected_swath[1], grid_definition,
+                                                       cols_arr, rows_arr, fill_in=swath_definition["fill_value"],
+                                                       num_threads=self.ll2cr_threads)
+                else:
+                    if isinstance(rows_fn, str):
+                        rows_arr = swath_definition.copy_latitude_array(filename=rows_fn, read_only=False)
+                        cols_arr = swath_definition.copy_longitude_array(filename=cols_fn, read_only=False)
+                    else:
+                        rows_arr, cols_arr = rows_fn, cols_fn
+                        rows_arr[:] = swath_definition.get_latitude_array()
+                        cols_arr[:] = swath_definition.get_longitude_array()
+                    points_in_grid, _, _ = ll2cr.ll2cr(cols_arr, rows_arr, grid_definition,
+                                                       fill_in=swath_definition["fill_value"],
+                                                       num_threads=self.ll2cr_threads)
+                grid_str = str(grid_definition).replace("\n", "\n\t")
+                LOG.debug("Grid information:\n\t%s", grid_str)
+            except (RuntimeError, ValueError, OSError):
+                LOG.error("Unexpected error encountered during ll2cr gridding for %s -> %s", geo_id, grid_name)
+                LOG.debug("ll2cr error exception: ", exc_info=True)
+                self._safe_remove(rows_fn, cols_fn)
+                raise
+            if cache_key is not None:
+                self.ll2cr_cache_keys[(geo_id, grid_name)] = cache_key
+                if isinstance(cols_arr, numpy.memmap):
+                    # make sure the memory maps are written to disk before copying them
+                    cols_arr.flush()
+                    rows_arr.flush()
+                del cols_arr, rows_arr
+                self.ll2cr_disk_cache.put(cache_key, cols_fn, rows_fn, grid_definition, points_in_grid)
 
         # if 5% of the grid will have data in it then it fits
-        fraction_in = points_in_grid / float(rows_arr.size)
+        fraction_in = points_in_grid / float(swath_definition["swath_rows"] * swath_definition["swath_columns"])
         swath_used = fraction_in > swath_usage
         if not swath_used:
             self._safe_remove(rows_fn, cols_fn)
@@ -222,13 +334,119 @@ class Remapper(object):
         self.ll2cr_cache[(geo_id, grid_name)] = (cols_fn, rows_fn)
         return cols_fn, rows_fn
 
+    def _projected_swath(self, swath_definition, grid_definition):
+        """Get the swath's X/Y points in the projection of a static grid if other grids have used the projection.
+
+        Static grids in the same projection (ex. several regional sectors) only differ by an affine transform
+        of the projected swath, and so do the EWA ellipse parameters computed from their columns and rows.
+        The first time a swath is mapped to a projection it is projected as usual by ll2cr since it may be
+        the only grid. The second time its X/Y points are kept and reused by every later grid in that
+        projection. Only one projection is kept per swath.
+
+        :returns: tuple(x_arr, y_arr) or None if the swath should be projected by ll2cr
+        """
+        if not grid_definition.is_static:
+            return None
+        geo_id = swath_definition["swath_name"]
+        key = (geo_id, grid_definition["proj4_definition"])
+        geolocation = (swath_definition["longitude"], swath_definition["latitude"])
+        cached = self.projection_cache.get(key)
+        if cached is not None and all(a is b or (isinstance(a, str) and a == b)
+                                      for a, b in zip(cached[0], geolocation)):
+            if cached[1] is None:
+                LOG.debug("Keeping projected swath '%s' for other grids in the same projection", geo_id)
+                for other_key in list(self.projection_cache.keys()):
+                    if other_key[0] == geo_id:
+                        del self.projection_cache[other_key]
+                x_arr, y_arr = ll2cr.project_swath(swath_definition.get_longitude_array(),
+                                                   swath_definition.get_latitude_array(),
+                                                   grid_definition["proj4_definition"],
+                                                   num_threads=self.ll2cr_threads)
+                cached = self.projection_cache[key] = (geolocation, (x_arr, y_arr))
+            else:
+                LOG.debug("Using projected swath '%s' shared with other grids in the same projection", geo_id)
+            return cached[1]
+
+        # first grid in this projection, remember it in case there are more
+        self.projection_cache[key] = (geolocation, None)
+        return None
+
+    def _fornav_D(self, swath_definition, grid_definition, fornav_D=None):
+        """Get the EWA 'D' (maximum ellipse size) option, computed from the swath's limb resolution if not provided."""
+        if fornav_D is not None:
+            return fornav_D
+        edge_res = swath_definition.get("limb_resolution", None)
+        if edge_res is None:
+            return 10.0
+        if grid_definition.is_latlong:
+            fornav_D = (edge_res / 2) / grid_definition.cell_width_meters
+        else:
+            fornav_D = (edge_res / 2) / grid_definition["cell_width"]
+        LOG.debug("Fornav 'D' option dynamically set to %f", fornav_D)
+        return fornav_D
+
     def _add_prefix(self, prefix, *filepaths):
         return [os.path.join(os.path.dirname(x), prefix + os.path.basename(x)) for x in filepaths]
 
+    def _grid_filepaths(self, grid_name, swath_scene, product_names, grid_shape):
+        """Get the filenames for the gridded data of products, placed by the workspace if there is one."""
+        product_filepaths = swath_scene.get_data_filepaths(product_names)
+        filepaths = self._add_prefix("grid_%s_" % (grid_name,), *product_filepaths)
+        if self.workspace is None:
+            return filepaths
+        return [self.workspace.path(fp, nbytes=int(numpy.prod(grid_shape)) *
+                                    numpy.dtype(swath_scene[product_name]["data_type"]).itemsize, fast=True)
+                for fp, product_name in zip(filepaths, product_names)]
+
+    def _check_intermediate_file(self, fp):
+        if os.path.isfile(fp):
+            if not self.overwrite_existing:
+                LOG.error("Intermediate remapping file already exists: %s" % (fp,))
+                raise RuntimeError("Intermediate remapping file already exists: %s" % (fp,))
+            else:
+                LOG.warning("Intermediate remapping file already exists, will overwrite: %s", fp)
+
+    def _fits_in_memory(self, nbytes):
+        """Check if `nbytes` more of intermediate arrays can be kept in memory when running in in-memory mode."""
+        if not self.in_memory:
+            return False
+        if self.in_memory_size is not None and self._memory_used + nbytes > self.in_memory_size:
+            return False
+        available_memory = fornav.get_available_memory()
+        return available_memory is None or nbytes <= available_memory * (1 - fornav.MEMORY_RESERVE)
+
+    def _create_output_array(self, filename, shape, dtype):
+        """Create an array for gridded data in memory if it fits or as a memory map of `filename` if not."""
+        nbytes = int(numpy.prod(shape)) * numpy.dtype(dtype).itemsize
+        if self._fits_in_memory(nbytes):
+            self._memory_used += nbytes
+            return numpy.empty(shape, dtype=dtype)
+        if self.in_memory:
+            LOG.debug("Not enough memory to keep gridded data in memory, writing it to '%s'", filename)
+        self._check_intermediate_file(filename)
+        return numpy.memmap(filename, dtype=dtype, mode="w+", shape=shape)
+
+    def _grid_data(self, output_array, filename):
+        """Get the value of a gridded product's 'grid_data' for an array made by `_create_output_array`."""
+        if isinstance(output_array, numpy.memmap):
+            output_array.flush()
+            return filename
+        return output_array
+
+    def _ll2cr_arrays(self, swath_definition, cols_fn, rows_fn):
+        """Get the arrays for the ll2cr results returned by `run_ll2cr`, which may be filenames or arrays."""
+        shape = (swath_definition["swath_rows"], swath_definition["swath_columns"])
+        return tuple(numpy.memmap(fn, shape=shape, dtype=swath_definition["data_type"], mode="r")
+                     if isinstance(fn, str) else fn for fn in (cols_fn, rows_fn))
+
     def _safe_remove(self, *filepaths):
+        if self.workspace is not None:
+            self.workspace.remove(*filepaths)
+            return
         if not self.keep_intermediate:
             for fp in filepaths:
-                if os.path.isfile(fp):
+                # in-memory results have nothing to remove
+                if isinstance(fp, str) and os.path.isfile(fp):
                     try:
                         LOG.debug("Removing intermediate file '%s'...", fp)
                         os.remove(fp)
@@ -241,6 +459,7 @@ class Remapper(object):
         for cols_fn, rows_fn in self.ll2cr_cache.values():
             self._safe_remove(rows_fn, cols_fn)
         self.ll2cr_cache = {}
+        self.ll2cr_cache_keys = {}
 
     def _remap_scene_ewa(self, swath_scene, grid_def, share_dynamic_grids=True, **kwargs):
         # TODO: Make methods more flexible than just a function call
@@ -251,16 +470,15 @@ class Remapper(object):
         product_groups = defaultdict(list)
         for product_name, swath_product in swath_scene.items():
             swath_def = swath_product["swath_definition"]
-            is_cat = swath_product.get('flag_meanings') is not None
             geo_id = swath_def["swath_name"]
-            product_groups[(is_cat, geo_id)].append(product_name)
+            product_groups[geo_id].append(product_name)
 
         # keep a copy of the original grid definition
         # if a shared grid definition isn't used then
         # we start from the original
         orig_grid_def = grid_def
         fornav_filepaths = None  # just in case the loop isn't entered
-        for (is_cat, geo_id), product_names in product_groups.items():
+        for geo_id, product_names in product_groups.items():
             try:
                 LOG.debug("Running ll2cr on the geolocation data for the following products:\n\t%s", "\n\t".join(sorted(product_names)))
                 swath_def = swath_scene[product_names[0]]["swath_definition"]
@@ -276,37 +494,29 @@ class Remapper(object):
 
             # Run fornav for all of the products at once
             LOG.debug("Running fornav for the following products:\n\t%s", "\n\t".join(sorted(product_names)))
-            # XXX: May have to do something smarter if there are float products and integer products together (is_category property on SwathProduct?)
             product_filepaths = list(swath_scene.get_data_filepaths(product_names))
-            fornav_filepaths = self._add_prefix("grid_%s_" % (grid_name,), *product_filepaths)
-            for fp in fornav_filepaths:
-                if os.path.isfile(fp):
-                    if not self.overwrite_existing:
-                        LOG.error("Intermediate remapping file already exists: %s" % (fp,))
-                        raise RuntimeError("Intermediate remapping file already exists: %s" % (fp,))
-                    else:
-                        LOG.warning("Intermediate remapping file already exists, will overwrite: %s", fp)
+            grid_shape = (grid_def["height"], grid_def["width"])
+            fornav_filepaths = self._grid_filepaths(grid_name, swath_scene, product_names, grid_shape)
+            fornav_arrays = [self._create_output_array(fp, grid_shape, swath_scene[pn]["data_type"])
+                             for fp, pn in zip(fornav_filepaths, product_names)]
 
             rows_per_scan = swath_def.get("rows_per_scan", 0)
             if rows_per_scan < 2:
                 LOG.warning("Data has less than 2 rows per scan, this is not optimal for the EWA resampling algorithm. All rows will be used as one scan")
                 rows_per_scan = swath_def['swath_rows']
-            edge_res = swath_def.get("limb_resolution", None)
-            fornav_D = kwargs.get("fornav_D", None)
-            if fornav_D is None:
-                if edge_res is not None:
-                    if grid_def.is_latlong:
-                        fornav_D = (edge_res / 2) / grid_def.cell_width_meters
-                    else:
-                        fornav_D = (edge_res / 2) / grid_def["cell_width"]
-                    LOG.debug("Fornav 'D' option dynamically set to %f", fornav_D)
-                else:
-                    fornav_D = 10.0
+            fornav_D = self._fornav_D(swath_def, grid_def, kwargs.get("fornav_D", None))
+
+            # category products are always resampled with maximum weight mode
+            mwm = []
+            for product_name in product_names:
+                is_cat = swath_scene[product_name].get('flag_meanings') is not None
+                if is_cat and not kwargs.get('maximum_weight_mode', False):
+                    LOG.debug("Turning on maximum weight mode in EWA resampling for category product %s", product_name)
+                mwm.append(is_cat or kwargs.get('maximum_weight_mode', False))
 
-            mwm = kwargs.get('maximum_weight_mode', False)
-            if is_cat and not mwm:
-                LOG.debug("Turning on maximum weight mode in EWA resampling for category products")
-                mwm = True
+            max_memory = kwargs.get("max_memory", None)
+            if max_memory is not None:
+                max_memory = int(max_memory * 1024 ** 3)
 
             try:
                 # fornav.ms2gt_fornav(
@@ -328,13 +538,11 @@ class Remapper(object):
                 #     maximum_weight_mode=kwargs.get("maximum_weight_mode", None),
                 #     start_scan=(0, 0),
                 # )
-                cols_array = numpy.memmap(cols_fn, dtype=swath_def['data_type'],
-                                          mode='r', shape=(swath_def["swath_rows"], swath_def["swath_columns"]))
-                rows_array = numpy.memmap(rows_fn, dtype=swath_def['data_type'],
-                                          mode='r', shape=(swath_def["swath_rows"], swath_def["swath_columns"]))
-                # Assumed that all share the same fill value and data type
+                cols_array, rows_array = self._ll2cr_arrays(swath_def, cols_fn, rows_fn)
                 input_dtype = [swath_scene[pn]["data_type"] for pn in product_names]
                 input_fill = [swath_scene[pn]["fill_value"] for pn in product_names]
+                # every output keeps the data type and fill value of its input
+                output_fill = input_fill
                 LOG.debug("Running fornav with D={} and d={}".format(fornav_D, kwargs.get('fornav_d', 1.0)))
                 valid_list = fornav.fornav(cols_array,
                                            rows_array,
@@ -342,13 +550,17 @@ class Remapper(object):
                                            product_filepaths,
                                            input_dtype=input_dtype,
                                            input_fill=input_fill,
-                                           output_arrays=fornav_filepaths,
+                                           output_arrays=fornav_arrays,
+                                           output_fill=output_fill,
                                            grid_cols=grid_def["width"],
                                            grid_rows=grid_def["height"],
                                            weight_delta_max=fornav_D,
                                            weight_distance_max=kwargs.get("fornav_d", 1.0),
                                            maximum_weight_mode=mwm,
-                                           use_group_size=True
+                                           use_group_size=True,
+                                           num_threads=kwargs.get("fornav_threads", 1),
+                                           scan_block_size=kwargs.get("fornav_block_scans", None),
+                                           max_memory=max_memory,
                                            )
             except (RuntimeError, ValueError, OSError, KeyError):
                 LOG.debug("Remapping exception: ", exc_info=True)
@@ -360,13 +572,14 @@ class Remapper(object):
                 continue
 
             # Give the gridded product ownership of the remapped data
-            for product_name, fornav_fp, valid_points in zip(product_names, fornav_filepaths, valid_list):
+            for product_name, fornav_fp, fornav_array, fill_value, valid_points in zip(
+                    product_names, fornav_filepaths, fornav_arrays, output_fill, valid_list):
                 swath_product = swath_scene[product_name]
                 gridded_product = GriddedProduct()
                 gridded_product.from_swath_product(swath_product)
                 gridded_product["grid_definition"] = grid_def
-                gridded_product["fill_value"] = numpy.nan
-                gridded_product["grid_data"] = fornav_fp
+                gridded_product["fill_value"] = fill_value
+                gridded_product["grid_data"] = self._grid_data(fornav_array, fornav_fp)
 
                 grid_coverage = kwargs.get("grid_coverage", GRID_COVERAGE)
                 grid_covered_ratio = valid_points / float(grid_def["width"] * grid_def["height"])
@@ -377,6 +590,7 @@ class Remapper(object):
                     continue
                 LOG.debug("EWA resampling found %f%% of the grid covered for %s" % (grid_covered_ratio * 100, product_name))
                 gridded_scene[product_name] = gridded_product
+            del fornav_arrays
 
         self._clear_ll2cr_cache()
 
@@ -386,7 +600,37 @@ class Remapper(object):
 
         return gridded_scene
 
-    def _remap_scene_nearest(self, swath_scene, grid_def, share_dynamic_grids=True, share_remap_mask=True, **kwargs):
+    def _nearest_resample_plan(self, geo_id, grid_def, cols_array, rows_array, good_mask, distance_upper_bound,
+                               use_kdtree=True):
+        """Compute or load from the ll2cr cache the nearest neighbor mapping of a swath to a grid."""
+        cache_key = self.ll2cr_cache_keys.get((geo_id, grid_def["grid_name"]))
+        if cache_key is not None:
+            plan_hash = hashlib.sha1(numpy.packbits(good_mask).data)
+            plan_hash.update(("%r %r" % (distance_upper_bound, use_kdtree)).encode())
+            plan_id = plan_hash.hexdigest()
+            plan = self.ll2cr_disk_cache.get_plan(cache_key, plan_id, NearestResamplePlan)
+            if plan is not None:
+                return plan
+
+        grid_shape = (grid_def["height"], grid_def["width"])
+        if use_kdtree:
+            grid_x, grid_y = numpy.mgrid[:grid_shape[0], :grid_shape[1]]
+            x = _ndim_coords_from_arrays((cols_array[good_mask], rows_array[good_mask]))
+            xi = _ndim_coords_from_arrays((grid_y, grid_x))
+            dist, i = cKDTree(x).query(xi, distance_upper_bound=distance_upper_bound)
+        else:
+            i = grid_nearest_index(cols_array[good_mask], rows_array[good_mask], grid_shape, distance_upper_bound)
+        plan = NearestResamplePlan.from_index(i, good_mask)
+
+        if cache_key is not None:
+            self.ll2cr_disk_cache.put_plan(cache_key, plan_id, plan)
+        return plan
+
+    def _remap_scene_nearest_grid(self, swath_scene, grid_def, **kwargs):
+        return self._remap_scene_nearest(swath_scene, grid_def, use_kdtree=False, **kwargs)
+
+    def _remap_scene_nearest(self, swath_scene, grid_def, share_dynamic_grids=True, share_remap_mask=True,
+                             use_kdtree=True, **kwargs):
         # TODO: Make methods more flexible than just a function call
         gridded_scene = GriddedScene()
         grid_name = grid_def["grid_name"]
@@ -432,19 +676,15 @@ class Remapper(object):
                 kwargs["distance_upper_bound"] = distance_upper_bound
 
             try:
-                grid_x, grid_y = numpy.mgrid[:grid_def["height"], :grid_def["width"]]
                 # we need flattened versions of these
-                shape = (swath_def["swath_rows"] * swath_def["swath_columns"],)
-                cols_array = numpy.memmap(cols_fn, shape=shape, dtype=swath_def["data_type"])
-                rows_array = numpy.memmap(rows_fn, shape=shape, dtype=swath_def["data_type"])
+                cols_array, rows_array = [arr.ravel() for arr in self._ll2cr_arrays(swath_def, cols_fn, rows_fn)]
                 good_mask = ~mask_helper(cols_array, swath_def["fill_value"])
                 if share_remap_mask:
                     for product_name in product_names:
-                        LOG.debug("Combining data masks before building KDTree for nearest neighbor: %s", product_name)
+                        LOG.debug("Combining data masks before searching for nearest neighbors: %s", product_name)
                         good_mask &= ~swath_scene[product_name].get_data_mask().ravel()
-                x = _ndim_coords_from_arrays((cols_array[good_mask], rows_array[good_mask]))
-                xi = _ndim_coords_from_arrays((grid_y, grid_x))
-                dist, i = cKDTree(x).query(xi, distance_upper_bound=kwargs["distance_upper_bound"])
+                plan = self._nearest_resample_plan(geo_id, grid_def, cols_array, rows_array, good_mask,
+                                                   kwargs["distance_upper_bound"], use_kdtree)
             except (RuntimeError, ValueError, OSError, KeyError):
                 LOG.debug("Remapping exception: ", exc_info=True)
                 LOG.error("Remapping error")
@@ -453,25 +693,17 @@ class Remapper(object):
                     raise
                 continue
 
-            product_filepaths = swath_scene.get_data_filepaths(product_names)
-            output_filepaths = self._add_prefix("grid_%s_" % (grid_name,), *product_filepaths)
+            output_filepaths = self._grid_filepaths(grid_name, swath_scene, product_names, plan.grid_shape)
 
             # Prepare the products
             for product_name, output_fn in zip(product_names, output_filepaths):
                 LOG.debug("Running nearest neighbor on '%s' with search distance %f", product_name, kwargs["distance_upper_bound"])
-                if os.path.isfile(output_fn):
-                    if not self.overwrite_existing:
-                        LOG.error("Intermediate remapping file already exists: %s" % (output_fn,))
-                        raise RuntimeError("Intermediate remapping file already exists: %s" % (output_fn,))
-                    else:
-                        LOG.warning("Intermediate remapping file already exists, will overwrite: %s", output_fn)
-
+                output_array = self._create_output_array(output_fn, plan.grid_shape,
+                                                         swath_scene[product_name]["data_type"])
                 try:
-                    image_array = swath_scene[product_name].get_data_array().ravel()
+                    image_array = swath_scene[product_name].get_data_array()
                     fill_value = swath_scene[product_name]['fill_value']
-                    values = numpy.append(image_array[good_mask], image_array.dtype.type(fill_value))
-                    output_array = values[i]
-                    output_array.tofile(output_fn)
+                    plan.resample(image_array, fill_value, out=output_array)
 
                     # Give the gridded product ownership of the remapped data
                     swath_product = swath_scene[product_name]
@@ -479,10 +711,14 @@ class Remapper(object):
                     gridded_product.from_swath_product(swath_product)
                     gridded_product["grid_definition"] = grid_def
                     gridded_product["fill_value"] = fill_value
-                    gridded_product["grid_data"] = output_fn
+                    gridded_product["grid_data"] = self._grid_data(output_array, output_fn)
 
                     # Check grid coverage
-                    valid_points = numpy.count_nonzero(~gridded_product.get_data_mask())
+                    if share_remap_mask:
+                        # every swath pixel used by the plan is valid for this product
+                        valid_points = plan.num_valid
+                    else:
+                        valid_points = numpy.count_nonzero(~gridded_product.get_data_mask())
                     grid_covered_ratio = valid_points / float(grid_def["width"] * grid_def["height"])
                     grid_covered = grid_covered_ratio > grid_coverage
                     if not grid_covered:
@@ -514,6 +750,129 @@ class Remapper(object):
 
         return gridded_scene
 
+    def _bilinear_resample_plan(self, geo_id, grid_def, cols_array, rows_array, good_mask,
+                                max_quad_size=MAX_QUAD_SIZE):
+        """Compute or load from the ll2cr cache the bilinear interpolation of a swath to a grid."""
+        cache_key = self.ll2cr_cache_keys.get((geo_id, grid_def["grid_name"]))
+        if cache_key is not None:
+            plan_hash = hashlib.sha1(numpy.packbits(good_mask).data)
+            plan_hash.update(("%r" % (max_quad_size,)).encode())
+            plan_id = plan_hash.hexdigest()
+            plan = self.ll2cr_disk_cache.get_plan(cache_key, plan_id, BilinearResamplePlan)
+            if plan is not None:
+                return plan
+
+        grid_shape = (grid_def["height"], grid_def["width"])
+        quad_index, u, v = grid_bilinear_index(cols_array, rows_array, grid_shape, good_mask=good_mask,
+                                               max_quad_size=max_quad_size)
+        plan = BilinearResamplePlan.from_quads(quad_index, u, v, cols_array.shape)
+
+        if cache_key is not None:
+            self.ll2cr_disk_cache.put_plan(cache_key, plan_id, plan)
+        return plan
+
+    def _remap_scene_bilinear(self, swath_scene, grid_def, share_dynamic_grids=True, share_remap_mask=True,
+                              **kwargs):
+        gridded_scene = GriddedScene()
+        grid_name = grid_def["grid_name"]
+
+        # Group products together that shared the same geolocation
+        product_groups = defaultdict(list)
+        for product_name, swath_product in swath_scene.items():
+            swath_def = swath_product["swath_definition"]
+            geo_id = swath_def["swath_name"]
+            product_groups[geo_id].append(product_name)
+
+        grid_coverage = kwargs.get("grid_coverage", GRID_COVERAGE)
+        orig_grid_def = grid_def
+        for geo_id, product_names in product_groups.items():
+            pp_names = "\n\t".join(product_names)
+            LOG.debug("Running ll2cr on the geolocation data for the following products:\n\t%s", pp_names)
+            LOG.debug("Swath name: %s", geo_id)
+
+            try:
+                swath_def = swath_scene[product_names[0]]["swath_definition"]
+                if not share_dynamic_grids:
+                    grid_def = orig_grid_def.copy()
+                cols_fn, rows_fn = self.run_ll2cr(swath_def, grid_def)
+            except (RuntimeError, ValueError, OSError, KeyError):
+                LOG.error("Remapping error")
+                if self.exit_on_error:
+                    raise
+                continue
+
+            LOG.debug("Running bilinear interpolation for the following products:\n\t%s", pp_names)
+            try:
+                cols_array, rows_array = self._ll2cr_arrays(swath_def, cols_fn, rows_fn)
+                good_mask = ~mask_helper(cols_array, swath_def["fill_value"])
+                if share_remap_mask:
+                    for product_name in product_names:
+                        LOG.debug("Combining data masks before computing bilinear weights: %s", product_name)
+                        good_mask &= ~swath_scene[product_name].get_data_mask()
+                plan = self._bilinear_resample_plan(geo_id, grid_def, cols_array, rows_array, good_mask)
+            except (RuntimeError, ValueError, OSError, KeyError):
+                LOG.debug("Remapping exception: ", exc_info=True)
+                LOG.error("Remapping error")
+                if self.exit_on_error:
+                    self._clear_ll2cr_cache()
+                    raise
+                continue
+
+            output_filepaths = self._grid_filepaths(grid_name, swath_scene, product_names, plan.grid_shape)
+            output_arrays = [self._create_output_array(output_fn, plan.grid_shape, swath_scene[product_name]["data_type"])
+                             for output_fn, product_name in zip(output_filepaths, product_names)]
+
+            # Interpolate every product in the group at once
+            try:
+                image_arrays = [swath_scene[product_name].get_data_array() for product_name in product_names]
+                fill_values = [swath_scene[product_name]["fill_value"] for product_name in product_names]
+                categories = [swath_scene[product_name].get("flag_meanings") is not None
+                              for product_name in product_names]
+                plan.resample(image_arrays, fill_values, outs=output_arrays, categories=categories)
+                grid_datas = [self._grid_data(output_array, output_fn)
+                              for output_array, output_fn in zip(output_arrays, output_filepaths)]
+                del output_arrays
+            except (RuntimeError, ValueError, OSError, KeyError):
+                LOG.debug("Remapping exception: ", exc_info=True)
+                LOG.error("Remapping error")
+                self._safe_remove(*output_filepaths)
+                if self.exit_on_error:
+                    self._clear_ll2cr_cache()
+                    raise
+                continue
+
+            for product_name, grid_data, fill_value in zip(product_names, grid_datas, fill_values):
+                # Give the gridded product ownership of the remapped data
+                swath_product = swath_scene[product_name]
+                gridded_product = GriddedProduct()
+                gridded_product.from_swath_product(swath_product)
+                gridded_product["grid_definition"] = grid_def
+                gridded_product["fill_value"] = fill_value
+                gridded_product["grid_data"] = grid_data
+
+                # Check grid coverage
+                if share_remap_mask:
+                    # every swath pixel used by the plan is valid for this product
+                    valid_points = plan.num_valid
+                else:
+                    valid_points = numpy.count_nonzero(~gridded_product.get_data_mask())
+                grid_covered_ratio = valid_points / float(grid_def["width"] * grid_def["height"])
+                grid_covered = grid_covered_ratio > grid_coverage
+                if not grid_covered:
+                    msg = "Bilinear resampling only found %f%% of the grid covered (need %f%%) for %s" % (grid_covered_ratio * 100, grid_coverage * 100, product_name)
+                    LOG.warning(msg)
+                    continue
+                LOG.debug("Bilinear resampling found %f%% of the grid covered for %s" % (grid_covered_ratio * 100, product_name))
+                gridded_scene[product_name] = gridded_product
+
+        # Remove ll2cr files now that we are done with them
+        self._clear_ll2cr_cache()
+
+        if not gridded_scene:
+            raise RuntimeError("Bilinear resampling could not remap any of the data to grid '%s'" % (grid_name,))
+
+        return gridded_scene
+
     def _remap_scene_sensor(self, swath_scene, grid_def, **kwargs):
         if not isinstance(swath_scene, Scene):
             raise ValueError("'sensor' resampling only supports SatPy scenes")
@@ -539,10 +898,22 @@ def add_remap_argument_groups(parser):
     group = parser.add_argument_group(title="Remapping Initialization")
     group.add_argument('--grid-configs', dest='grid_configs', nargs="+", default=tuple(),
                        help="Specify additional grid configuration files ('grids.conf' for built-ins)")
+    group.add_argument('--ll2cr-threads', dest='ll2cr_threads', default=1, type=int,
+                       help="Number of threads to use when mapping geolocation to grid columns and rows (default 1)")
+    group.add_argument('--ll2cr-cache-dir', dest='ll2cr_cache_dir', default=None,
+                       help="Directory to store ll2cr results in so they can be reused by later runs (default: disabled)")
+    group.add_argument('--ll2cr-cache-size', dest='ll2cr_cache_size', default=None, type=float,
+                       help="Maximum size of the ll2cr cache directory in GB, least recently used results are "
+                            "removed first (default 5)")
+    group.add_argument('--in-memory', dest='in_memory', action='store_true',
+                       help="Keep ll2cr results and gridded data in memory instead of writing intermediate files")
+    group.add_argument('--in-memory-size', dest='in_memory_size', default=None, type=float,
+                       help="Maximum amount of memory in GB to use for in-memory results of one grid before "
+                            "writing files (default: available memory)")
     group = parser.add_argument_group(title="Remapping")
     group.add_argument('-g', '--grids', dest='forced_grids', nargs="+", default=SUPPRESS,
                        help="Force remapping to only some grids, defaults to 'wgs84_fit', use 'all' for determination")
-    group.add_argument("--method", dest="remap_method", default=SUPPRESS, choices=["ewa", "nearest", "sensor"],
+    group.add_argument("--method", dest="remap_method", default=SUPPRESS, choices=["ewa", "nearest", "nearest_grid", "bilinear", "sensor"],
                        help="Remapping algorithm to use")
     group.add_argument('--swath-usage', dest="swath_usage", default=0, type=float,
                        help="Fraction of swath that must be used to continue remapping/processing (default 0)")
@@ -554,6 +925,13 @@ def add_remap_argument_groups(parser):
                        help="Specify the -d option for fornav")
     group.add_argument('--maximum-weight-mode', dest="maximum_weight_mode", default=SUPPRESS, action="store_true",
                        help="Use maximum weight mode in fornav (-m)")
+    group.add_argument('--fornav-threads', dest="fornav_threads", default=SUPPRESS, type=int,
+                       help="Number of threads to use for EWA resampling (default 1)")
+    group.add_argument('--fornav-block-scans', dest="fornav_block_scans", default=SUPPRESS, type=int,
+                       help="Resample this many scans at a time with EWA to limit memory usage for long swaths")
+    group.add_argument('--max-memory', dest="max_memory", default=SUPPRESS, type=float,
+                       help="Maximum amount of memory in GB to use for EWA resampling. Channels are resampled in "
+                            "groups that fit in this or the available memory, whichever is smaller")
     group.add_argument("--distance-upper-bound", dest="distance_upper_bound", type=float, default=SUPPRESS,
                        help="Nearest neighbor search distance upper bound in units of grid cell")
     group.add_argument("--no-share-mask", dest="share_remap_mask", action="store_false",
@@ -565,13 +943,14 @@ def add_remap_argument_groups(parser):
 
 def main():
     from polar2grid.core.script_utils import create_basic_parser, create_exc_handler, setup_logging
-    from polar2grid.core.containers import SwathScene
+    from polar2grid.core.containers import SwathScene, INTERMEDIATE_EXTENSIONS, intermediate_format_from_filename
     parser = create_basic_parser(description="Remap a SwathScene to the provided grids")
     subgroup_titles = add_remap_argument_groups(parser)
     parser.add_argument("--scene", required=True,
                         help="JSON SwathScene filename to be remapped")
-    parser.add_argument('-o', dest="output_filename", default="gridded_scene_{grid_name}.json",
-                        help="Output filename for JSON scene (default is to 'gridded_scene_{grid_name}.json')")
+    parser.add_argument('-o', dest="output_filename", default=None,
+                        help="Output filename for JSON scene (default is to 'gridded_scene_{grid_name}.json' or "
+                             "'gridded_scene_{grid_name}.h5'/'.msgpack' with '--intermediate-format')")
     global_keywords = ("keep_intermediate", "overwrite_existing", "exit_on_error")
     args = parser.parse_args(subgroup_titles=subgroup_titles, global_keywords=global_keywords)
 
@@ -580,22 +959,31 @@ def main():
     sys.excepthook = create_exc_handler(LOG.name)
     LOG.debug("Starting script with arguments: %s", " ".join(sys.argv))
 
-    if args.output_filename and args.output_filename != "-" and os.path.isfile(args.output_filename):
+    if args.output_filename is None:
+        args.output_filename = "gridded_scene_{grid_name}" + INTERMEDIATE_EXTENSIONS[args.intermediate_format or "json"]
+    if args.output_filename != "-" and os.path.isfile(args.output_filename):
             LOG.error("JSON file '%s' already exists, will not overwrite." % (args.output_filename,))
             raise RuntimeError("JSON file '%s' already exists, will not overwrite." % (args.output_filename,))
 
     scene = SwathScene.load(args.scene)
 
     remapper = Remapper(**args.subgroup_args["Remapping Initialization"])
+    # arrays kept in memory can only be saved in to an HDF5 scene
+    saves_store = args.output_filename != "-" and (
+        (args.intermediate_format or intermediate_format_from_filename(args.output_filename)) == "hdf5")
+    if remapper.in_memory and not saves_store:
+        LOG.warning("Gridded scenes are saved as JSON or msgpack files, ignoring '--in-memory'")
+        remapper.in_memory = False
     remap_kwargs = args.subgroup_args["Remapping"]
     for grid_name in remap_kwargs.pop("forced_grids", ["wgs84_fit"]):
         gridded_scene = remapper.remap_scene(scene, grid_name, **remap_kwargs)
-        if args.output_filename is None or args.output_filename == "-":
+        if args.output_filename == "-":
             print(gridded_scene.dumps(persist=True))
         else:
             fn = args.output_filename.format(grid_name=grid_name)
             LOG.info("Saving gridded scene to file: %s", fn)
-            gridded_scene.save(fn)
+            gridded_scene.save(fn, intermediate_format=args.intermediate_format,
+                               compression=args.intermediate_compression)
 
 if __name__ == "__main__":
     sys.exit(main())
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+# Copyright (C) 2018 Space Science and Engineering Center (SSEC),
+# University of Wisconsin-Madison.
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# This file is part of the polar2grid software package. Polar2grid takes
+# satellite observation data, remaps it, and writes it to a file format for
+# input into another program.
+# Documentation: http://www.ssec.wisc.edu/software/polar2grid/
+#
+#     Written by David Hoese    November 2018
+#     University of Wisconsin-Madison
+#     Space Science and Engineering Center
+#     1225 West Dayton Street
+#     Madison, WI  53706
+#     david.hoese@ssec.wisc.edu
+"""Core subpackage tests
+
+:author:       David Hoese (davidh)
+:contact:      david.hoese@ssec.wisc.edu
+:organization: Space Science and Engineering Center (SSEC)
+:copyright:    Copyright (c) 2018 University of Wisconsin SSEC. All rights reserved.
+:date:         Nov 2018
+:license:      GNU GPLv3
+
+"""
+__docformat__ = "restructuredtext en"
+
+from datetime import datetime
+
+import numpy
+
+from polar2grid.core.containers import GriddedProduct, GridDefinition
+
+
+def create_gridded_product(data, product_name="test_product", fill_value=numpy.nan, data_kind="reflectance",
+                           **kwargs):
+    """Create a gridded product holding `data` on a simple lat/lon grid the size of the array."""
+    grid_def = GridDefinition(grid_name="test_grid", proj4_definition="+proj=latlong +datum=WGS84",
+                              height=data.shape[-2], width=data.shape[-1], cell_width=1., cell_height=-1.,
+                              origin_x=0., origin_y=0.)
+    return GriddedProduct(product_name=product_name, satellite="npp", instrument="viirs",
+                          begin_time=datetime(2018, 11, 1), end_time=datetime(2018, 11, 1, 0, 5),
+                          data_type=data.dtype, grid_data=data, grid_definition=grid_def,
+                          fill_value=fill_value, data_kind=data_kind, **kwargs)
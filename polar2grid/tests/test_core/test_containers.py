@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+# Copyright (C) 2018 Space Science and Engineering Center (SSEC),
+# University of Wisconsin-Madison.
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# This file is part of the polar2grid software package. Polar2grid takes
+# satellite observation data, remaps it, and writes it to a file format for
+# input into another program.
+# Documentation: http://www.ssec.wisc.edu/software/polar2grid/
+#
+#     Written by David Hoese    November 2018
+#     University of Wisconsin-Madison
+#     Space Science and Engineering Center
+#     1225 West Dayton Street
+#     Madison, WI  53706
+#     david.hoese@ssec.wisc.edu
+"""Test the Polar2Grid product containers.
+
+:author:       David Hoese (davidh)
+:contact:      david.hoese@ssec.wisc.edu
+:organization: Space Science and Engineering Center (SSEC)
+:copyright:    Copyright (c) 2018 University of Wisconsin SSEC. All rights reserved.
+:date:         Nov 2018
+:license:      GNU GPLv3
+
+"""
+__docformat__ = "restructuredtext en"
+
+import numpy
+import pytest
+
+from polar2grid.core import containers
+from polar2grid.core.containers import GriddedScene, unpack_mask
+from polar2grid.tests.test_core import create_gridded_product
+
+
+def create_data(shape=(13, 7), nan_idx=0):
+    data = numpy.arange(shape[0] * shape[1], dtype=numpy.float32).reshape(shape)
+    data[nan_idx::5, ::3] = numpy.nan
+    return data
+
+
+class TestDataMask(object):
+    def test_mask_is_cached(self):
+        data = create_data()
+        product = create_gridded_product(data)
+        mask = product.get_data_mask()
+        numpy.testing.assert_array_equal(mask, numpy.isnan(data))
+        # changes to the returned mask don't change the cache
+        mask[:] = True
+        # modifications without opening the data with "r+" aren't seen
+        data[1, 1] = numpy.nan
+        numpy.testing.assert_array_equal(product.get_data_mask(), numpy.isnan(create_data()))
+
+        product.get_data_array(mode="r+")
+        numpy.testing.assert_array_equal(product.get_data_mask(), numpy.isnan(data))
+
+    def test_packed_mask(self):
+        data = create_data()
+        product = create_gridded_product(data, fill_value=3.0)
+        packed = product.get_packed_data_mask()
+        assert packed.dtype == numpy.uint8
+        assert packed.size == (data.size + 7) // 8
+        numpy.testing.assert_array_equal(unpack_mask(packed, data.shape), data == 3.0)
+
+    def test_saved_mask(self, tmpdir, monkeypatch):
+        monkeypatch.setattr(containers, "PERSIST_MASKS", True)
+        data = create_data()
+        data_fn = str(tmpdir.join("test_product.dat"))
+        data.tofile(data_fn)
+        product = create_gridded_product(data)
+        product["grid_data"] = data_fn
+        mask = product.get_data_mask()
+        mask_fn = data_fn + containers.MASK_SUFFIX
+        assert tmpdir.join("test_product.dat" + containers.MASK_SUFFIX).check()
+
+        # another object using the same file loads the saved mask
+        other = create_gridded_product(data)
+        other["grid_data"] = data_fn
+        saved_mask = numpy.memmap(mask_fn, dtype=numpy.uint8, mode="r+")
+        saved_mask[:] = 0
+        saved_mask.flush()
+        del saved_mask
+        assert mask.any()
+        assert not other.get_data_mask().any()
+
+        # writing to the data removes the saved mask
+        other.get_data_array(mode="r+")
+        assert not tmpdir.join("test_product.dat" + containers.MASK_SUFFIX).check()
+
+    def test_combine_masks(self):
+        from polar2grid.compositors.rgb import combine_masks
+        scene = GriddedScene()
+        for idx in range(3):
+            scene["band%d" % (idx,)] = create_gridded_product(create_data(nan_idx=idx), "band%d" % (idx,))
+        expected = numpy.any([numpy.isnan(create_data(nan_idx=idx)) for idx in range(3)], axis=0)
+        numpy.testing.assert_array_equal(combine_masks(scene, scene.keys()), expected)
+
+
+class TestCopyArray(object):
+    def _create_file_product(self, tmpdir):
+        data = create_data()
+        data_fn = str(tmpdir.join("test_product.dat"))
+        data.tofile(data_fn)
+        product = create_gridded_product(data)
+        product["grid_data"] = data_fn
+        return product, data
+
+    def test_copy_on_write(self, tmpdir):
+        product, data = self._create_file_product(tmpdir)
+        copied = product.copy_array(read_only=False)
+        copied[:] = 5.0
+        numpy.testing.assert_array_equal(product.get_data_array(), data)
+
+    def test_last_consumer_modifies_in_place(self, tmpdir):
+        product, data = self._create_file_product(tmpdir)
+        mask = product.get_data_mask()
+        product.set_consumers(1)
+        copied = product.copy_array(read_only=False)
+        copied[:] = 5.0
+        copied.flush()
+        assert numpy.all(product.get_data_array() == 5.0)
+        # the mask still describes the original data
+        numpy.testing.assert_array_equal(product.get_data_mask(), mask)
+
+        # arrays in memory are handed out directly too
+        in_memory = create_gridded_product(data)
+        in_memory.set_consumers(1)
+        assert in_memory.copy_array(read_only=False) is data
+
+    @pytest.mark.parametrize("consumers", [None, 2])
+    def test_shared_data_is_copied(self, tmpdir, consumers):
+        product, data = self._create_file_product(tmpdir)
+        product.set_consumers(consumers)
+        copied = product.copy_array(read_only=False)
+        copied[:] = 5.0
+        numpy.testing.assert_array_equal(product.get_data_array(), data)
+
+    def test_persisted_data_is_copied(self, tmpdir):
+        product, data = self._create_file_product(tmpdir)
+        product.set_consumers(1)
+        product.set_persist()
+        copied = product.copy_array(read_only=False)
+        copied[:] = 5.0
+        numpy.testing.assert_array_equal(product.get_data_array(), data)
+
+    def test_copy_to_file(self, tmpdir):
+        product, data = self._create_file_product(tmpdir)
+        copy_fn = str(tmpdir.join("copy.dat"))
+        copied = product.copy_array(filename=copy_fn, read_only=False)
+        copied[:] = 5.0
+        copied.flush()
+        numpy.testing.assert_array_equal(product.get_data_array(), data)
+        assert numpy.all(numpy.fromfile(copy_fn, dtype=numpy.float32) == 5.0)
+
+
+class TestLazyArray(object):
+    def test_file_is_read_when_computed(self, tmpdir):
+        da = pytest.importorskip("dask.array")
+        data = create_data()
+        data_fn = str(tmpdir.join("test_product.dat"))
+        data.tofile(data_fn)
+        product = create_gridded_product(data)
+        product["grid_data"] = data_fn
+        lazy = product.get_data_array(lazy=True, chunk_rows=4)
+        assert isinstance(lazy, da.Array)
+        assert lazy.chunks == ((4, 4, 4, 1), (7,))
+        # the file wasn't copied when the dask array was created
+        file_data = numpy.memmap(data_fn, dtype=numpy.float32, mode="r+", shape=data.shape)
+        file_data[5, 5] = -1.0
+        file_data.flush()
+        data[5, 5] = -1.0
+        numpy.testing.assert_array_equal(lazy.compute(), data)
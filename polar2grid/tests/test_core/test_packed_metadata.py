@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+# Copyright (C) 2018 Space Science and Engineering Center (SSEC),
+# University of Wisconsin-Madison.
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# This file is part of the polar2grid software package. Polar2grid takes
+# satellite observation data, remaps it, and writes it to a file format for
+# input into another program.
+# Documentation: http://www.ssec.wisc.edu/software/polar2grid/
+#
+#     Written by David Hoese    November 2018
+#     University of Wisconsin-Madison
+#     Space Science and Engineering Center
+#     1225 West Dayton Street
+#     Madison, WI  53706
+#     david.hoese@ssec.wisc.edu
+"""Test the compact binary (msgpack) metadata files.
+
+:author:       David Hoese (davidh)
+:contact:      david.hoese@ssec.wisc.edu
+:organization: Space Science and Engineering Center (SSEC)
+:copyright:    Copyright (c) 2018 University of Wisconsin SSEC. All rights reserved.
+:date:         Nov 2018
+:license:      GNU GPLv3
+
+"""
+__docformat__ = "restructuredtext en"
+
+import json
+from datetime import datetime
+
+import numpy
+import pytest
+
+from polar2grid.core.containers import BaseP2GObject, SwathScene, convert_json
+from polar2grid.core.packed_metadata import is_packed_metadata, pack_object, unpack_object
+from polar2grid.tests.test_core.test_scene_store import BAND_NAMES
+from polar2grid.tests.test_remap import create_test_swath_scene
+
+msgpack = pytest.importorskip("msgpack")
+
+
+class TestPackedMetadata(object):
+    def test_round_trip(self, tmpdir):
+        scene = create_test_swath_scene(str(tmpdir), product_names=BAND_NAMES, nan_pixels=True)
+        scene["band0"]["begin_time"] = datetime(2018, 11, 1, 12, 30, 15, 123456)
+        meta_fn = str(tmpdir.join("swath_scene.msgpack"))
+        scene.save(meta_fn)
+        assert is_packed_metadata(meta_fn)
+
+        loaded = BaseP2GObject.load(meta_fn)
+        assert isinstance(loaded, SwathScene)
+        assert loaded.persist
+        assert sorted(loaded.keys()) == sorted(scene.keys())
+        for name, product in loaded.items():
+            assert product.__class__ is scene[name].__class__
+            assert product["begin_time"] == scene[name]["begin_time"]
+            assert product["data_type"] is numpy.float32
+            assert numpy.isnan(product["fill_value"])
+            numpy.testing.assert_array_equal(product.get_data_array(), scene[name].get_data_array())
+        # shared swath definitions are stored once and shared again after loading
+        assert loaded["band0"]["swath_definition"] is loaded["band1"]["swath_definition"]
+        numpy.testing.assert_array_equal(loaded["band0"]["swath_definition"].get_longitude_array(),
+                                         scene["band0"]["swath_definition"].get_longitude_array())
+
+    def test_matches_json(self, tmpdir):
+        scene = create_test_swath_scene(str(tmpdir), product_names=BAND_NAMES, nan_pixels=True)
+        unpacked = unpack_object(pack_object(scene))
+        json_fn = str(tmpdir.join("swath_scene.json"))
+        scene.save(json_fn)
+        from_json = BaseP2GObject.load(json_fn)
+        assert json.loads(unpacked.dumps()) == json.loads(from_json.dumps())
+
+    def test_convert(self, tmpdir):
+        scene = create_test_swath_scene(str(tmpdir), product_names=BAND_NAMES, nan_pixels=True)
+        meta_fn = str(tmpdir.join("swath_scene.msgpack"))
+        json_fn = str(tmpdir.join("swath_scene.json"))
+        scene.save(meta_fn)
+        convert_json(meta_fn, json_fn)
+        assert not is_packed_metadata(json_fn)
+        with open(json_fn, "r") as json_file:
+            assert sorted(json.load(json_file).keys()) == sorted(list(scene.keys()) + ["__class__"])
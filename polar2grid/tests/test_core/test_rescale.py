@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+# Copyright (C) 2018 Space Science and Engineering Center (SSEC),
+# University of Wisconsin-Madison.
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# This file is part of the polar2grid software package. Polar2grid takes
+# satellite observation data, remaps it, and writes it to a file format for
+# input into another program.
+# Documentation: http://www.ssec.wisc.edu/software/polar2grid/
+#
+#     Written by David Hoese    November 2018
+#     University of Wisconsin-Madison
+#     Space Science and Engineering Center
+#     1225 West Dayton Street
+#     Madison, WI  53706
+#     david.hoese@ssec.wisc.edu
+"""Test rescaling products in memory and lazily by blocks of rows.
+
+:author:       David Hoese (davidh)
+:contact:      david.hoese@ssec.wisc.edu
+:organization: Space Science and Engineering Center (SSEC)
+:copyright:    Copyright (c) 2018 University of Wisconsin SSEC. All rights reserved.
+:date:         Nov 2018
+:license:      GNU GPLv3
+
+"""
+__docformat__ = "restructuredtext en"
+
+import numpy
+import pytest
+
+from polar2grid.core.rescale import Rescaler, DEFAULT_RCONFIG
+from polar2grid.tests.test_core import create_gridded_product
+
+da = pytest.importorskip("dask.array")
+
+
+class TestLazyRescale(object):
+    @pytest.mark.parametrize("data_kind", ["btemp", "reflectance", "unknown"])
+    def test_lazy_matches_eager(self, data_kind):
+        data = numpy.linspace(200.0, 300.0, 400 * 30, dtype=numpy.float32).reshape((400, 30))
+        data[::7, ::3] = numpy.nan
+        product = create_gridded_product(data, data_kind=data_kind, units="kelvin")
+        rescaler = Rescaler(DEFAULT_RCONFIG)
+        rescale_options = rescaler.get_rescale_options(product, numpy.uint8, inc_by_one=True, fill_value=0)
+
+        eager = rescaler.rescale_product(product, numpy.uint8, rescale_options=rescale_options.copy())
+        lazy = rescaler.rescale_product(product, numpy.uint8, rescale_options=rescale_options.copy(),
+                                        lazy=True, chunk_rows=64)
+        assert isinstance(lazy, da.Array)
+        numpy.testing.assert_array_equal(lazy.compute(), eager)
+
+    def test_lazy_rgb_uses_band_limits(self):
+        data = numpy.stack([numpy.linspace(0.0, scale, 200 * 30, dtype=numpy.float32).reshape((200, 30))
+                            for scale in (1.0, 10.0, 100.0)])
+        data[:, 5, 5] = numpy.nan
+        product = create_gridded_product(data, data_kind="unknown", units="kelvin")
+        rescale_options = {"method": "linear", "min_out": 0, "max_out": 255, "inc_by_one": False}
+        rescaler = Rescaler(DEFAULT_RCONFIG)
+
+        eager = rescaler.rescale_product(product, numpy.uint8, rescale_options=rescale_options.copy())
+        lazy = rescaler.rescale_product(product, numpy.uint8, rescale_options=rescale_options.copy(),
+                                        lazy=True, chunk_rows=64).compute()
+        numpy.testing.assert_array_equal(lazy, eager)
+        # every band is scaled to the full output range
+        assert numpy.all(numpy.nanmax(lazy, axis=(1, 2)) == 255)
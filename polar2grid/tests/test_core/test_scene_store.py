@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+# Copyright (C) 2018 Space Science and Engineering Center (SSEC),
+# University of Wisconsin-Madison.
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# This file is part of the polar2grid software package. Polar2grid takes
+# satellite observation data, remaps it, and writes it to a file format for
+# input into another program.
+# Documentation: http://www.ssec.wisc.edu/software/polar2grid/
+#
+#     Written by David Hoese    November 2018
+#     University of Wisconsin-Madison
+#     Space Science and Engineering Center
+#     1225 West Dayton Street
+#     Madison, WI  53706
+#     david.hoese@ssec.wisc.edu
+"""Test the single file HDF5 scene store.
+
+:author:       David Hoese (davidh)
+:contact:      david.hoese@ssec.wisc.edu
+:organization: Space Science and Engineering Center (SSEC)
+:copyright:    Copyright (c) 2018 University of Wisconsin SSEC. All rights reserved.
+:date:         Nov 2018
+:license:      GNU GPLv3
+
+"""
+__docformat__ = "restructuredtext en"
+
+import numpy
+import pytest
+
+from polar2grid.core.containers import BaseP2GObject, SwathScene
+from polar2grid.core.scene_store import StoreArray, is_scene_store
+from polar2grid.tests.test_remap import create_test_swath_scene
+
+h5py = pytest.importorskip("h5py")
+
+BAND_NAMES = ("band0", "band1", "band2")
+
+
+class TestSceneStore(object):
+    @pytest.mark.parametrize("compression", [None, "gzip"])
+    def test_round_trip(self, tmpdir, compression):
+        scene = create_test_swath_scene(str(tmpdir), product_names=BAND_NAMES, nan_pixels=True)
+        store_fn = str(tmpdir.join("swath_scene.h5"))
+        scene.save(store_fn, compression=compression)
+        assert is_scene_store(store_fn)
+
+        loaded = SwathScene.load(store_fn)
+        assert isinstance(loaded, SwathScene)
+        assert sorted(loaded.keys()) == sorted(scene.keys())
+        for name, product in loaded.items():
+            assert product["begin_time"] == scene[name]["begin_time"]
+            data = product.get_data_array()
+            numpy.testing.assert_array_equal(data, scene[name].get_data_array())
+            numpy.testing.assert_array_equal(product.get_data_mask(), scene[name].get_data_mask())
+            numpy.testing.assert_array_equal(product["swath_definition"].get_longitude_array(),
+                                             scene[name]["swath_definition"].get_longitude_array())
+            if compression:
+                assert isinstance(data, StoreArray)
+                assert data[:5, 2:4].shape == (5, 2)
+            else:
+                assert isinstance(data, numpy.memmap)
+
+        with h5py.File(store_fn, "r") as h5_file:
+            # the swath definition is only stored once
+            assert len(h5_file.keys()) == 3
+            assert "swath_definition" in h5_file["band0"]
+            assert "swath_definition" not in h5_file["band1"]
+
+    def test_copy_array(self, tmpdir):
+        scene = create_test_swath_scene(str(tmpdir), product_names=BAND_NAMES, nan_pixels=True)
+        store_fn = str(tmpdir.join("swath_scene.h5"))
+        scene.save(store_fn, compression="lzf")
+        loaded = BaseP2GObject.load(store_fn)
+        copy_fn = str(tmpdir.join("copy.dat"))
+        data = loaded["band1"].copy_array(filename=copy_fn, read_only=False)
+        assert isinstance(data, numpy.memmap)
+        numpy.testing.assert_array_equal(data, scene["band1"].get_data_array())
+        data = loaded["band1"].copy_array(read_only=False)
+        data[:] = 0
+        assert loaded["band1"].get_data_array()[1, 1] != 0
+
+    def test_save_over_loaded_store(self, tmpdir):
+        scene = create_test_swath_scene(str(tmpdir), product_names=BAND_NAMES, nan_pixels=True)
+        store_fn = str(tmpdir.join("swath_scene.h5"))
+        scene.save(store_fn)
+        loaded = SwathScene.load(store_fn)
+        del loaded["band2"]
+        loaded.save(store_fn, compression="gzip")
+        reloaded = SwathScene.load(store_fn)
+        assert sorted(reloaded.keys()) == ["band0", "band1"]
+        numpy.testing.assert_array_equal(reloaded["band1"].get_data_array(), scene["band1"].get_data_array())
+
+    def test_json_still_default(self, tmpdir):
+        scene = create_test_swath_scene(str(tmpdir), product_names=BAND_NAMES, nan_pixels=True)
+        json_fn = str(tmpdir.join("swath_scene.json"))
+        scene.save(json_fn)
+        assert not is_scene_store(json_fn)
+        assert isinstance(SwathScene.load(json_fn), SwathScene)
+        with pytest.raises(ValueError):
+            scene.save(json_fn, intermediate_format="bad")
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+# Copyright (C) 2018 Space Science and Engineering Center (SSEC),
+# University of Wisconsin-Madison.
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# This file is part of the polar2grid software package. Polar2grid takes
+# satellite observation data, remaps it, and writes it to a file format for
+# input into another program.
+# Documentation: http://www.ssec.wisc.edu/software/polar2grid/
+#
+#     Written by David Hoese    November 2018
+#     University of Wisconsin-Madison
+#     Space Science and Engineering Center
+#     1225 West Dayton Street
+#     Madison, WI  53706
+#     david.hoese@ssec.wisc.edu
+"""Test the workspace that owns intermediate files.
+
+:author:       David Hoese (davidh)
+:contact:      david.hoese@ssec.wisc.edu
+:organization: Space Science and Engineering Center (SSEC)
+:copyright:    Copyright (c) 2018 University of Wisconsin SSEC. All rights reserved.
+:date:         Nov 2018
+:license:      GNU GPLv3
+
+"""
+__docformat__ = "restructuredtext en"
+
+import os
+import time
+import signal
+import multiprocessing
+
+import pytest
+
+from polar2grid.core.workspace import Workspace, WORKSPACE_PREFIX, remove_stale_workspaces
+from polar2grid.tests.test_core.test_scene_store import BAND_NAMES
+from polar2grid.tests.test_remap import create_test_swath_scene
+
+
+def _touch(path, nbytes=10):
+    with open(path, "wb") as f:
+        f.write(b"\0" * nbytes)
+
+
+# workspace of the test's process inherited by forked pool workers
+_WORKSPACE = None
+
+
+def _create_worker_files(wait):
+    fns = [_WORKSPACE.path("grid_band_%d.dat" % (os.getpid(),)),
+           _WORKSPACE.path("ll2cr_cols_%d.dat" % (os.getpid(),), nbytes=10, fast=True)]
+    for fn in fns:
+        _touch(fn)
+    while wait:
+        time.sleep(0.05)
+    return fns
+
+
+class TestWorkspace(object):
+    def test_fast_dir_spills_to_disk(self, tmpdir):
+        work_dir = str(tmpdir.mkdir("work"))
+        fast_dir = str(tmpdir.mkdir("fast"))
+        with Workspace(work_dir, fast_dir=fast_dir, fast_size=15) as workspace:
+            fast_fn = workspace.path("ll2cr_cols.dat", nbytes=10, fast=True)
+            assert os.path.dirname(fast_fn) == workspace.fast_dir
+            assert os.path.dirname(workspace.fast_dir) == fast_dir
+            _touch(fast_fn)
+            # the cap is reached so this one goes to the regular directory
+            disk_fn = workspace.path("ll2cr_rows.dat", nbytes=10, fast=True)
+            assert os.path.dirname(disk_fn) == work_dir
+            _touch(disk_fn)
+            # releasing a fast file makes room again
+            workspace.remove(fast_fn)
+            assert not os.path.exists(fast_fn)
+            assert os.path.dirname(workspace.path("grid_band.dat", nbytes=10, fast=True)) == workspace.fast_dir
+            private_dir = workspace.fast_dir
+        assert not os.path.exists(disk_fn)
+        assert not os.path.exists(private_dir)
+
+    def test_fast_dir_counts_reservations(self, tmpdir):
+        work_dir = str(tmpdir.mkdir("work"))
+        with Workspace(work_dir, fast_dir=str(tmpdir.mkdir("fast")), fast_size=1000) as workspace:
+            # nothing is written until all paths are handed out (like ll2cr's columns and rows)
+            paths = [workspace.path("ll2cr_%d.dat" % (idx,), nbytes=800, fast=True) for idx in range(4)]
+            assert [os.path.dirname(fp) for fp in paths] == [workspace.fast_dir] + [work_dir] * 3
+            workspace.remove(paths[0])
+            assert os.path.dirname(workspace.path("grid_band.dat", nbytes=800, fast=True)) == workspace.fast_dir
+
+    @pytest.mark.parametrize("terminate", [False, True])
+    def test_worker_cleanup(self, tmpdir, terminate):
+        global _WORKSPACE
+        work_dir = str(tmpdir.mkdir("work"))
+        with Workspace(work_dir, fast_dir=str(tmpdir.mkdir("fast")), fast_size=100) as workspace:
+            parent_fn = workspace.path("swath_band.dat")
+            _touch(parent_fn)
+            _WORKSPACE = workspace
+            try:
+                pool = multiprocessing.get_context("fork").Pool(1, workspace.start_worker, (2,))
+                if terminate:
+                    pool.apply_async(_create_worker_files, (True,))
+                    while len(os.listdir(work_dir)) < 2:
+                        time.sleep(0.05)
+                    worker_fns = [os.path.join(work_dir, fn) for fn in os.listdir(work_dir)
+                                  if fn != "swath_band.dat"]
+                    pool.terminate()
+                else:
+                    worker_fns = pool.apply(_create_worker_files, (False,))
+                    assert os.path.dirname(os.path.dirname(worker_fns[1])) == workspace.fast_dir
+                    pool.close()
+                pool.join()
+            finally:
+                _WORKSPACE = None
+            assert worker_fns and not any(os.path.exists(fn) for fn in worker_fns)
+            # the parent's files and fast directory are left alone
+            assert os.path.isfile(parent_fn)
+            assert os.listdir(workspace.fast_dir) == []
+        assert not os.path.exists(parent_fn)
+
+    def test_keep(self, tmpdir):
+        work_dir = str(tmpdir)
+        with Workspace(work_dir, fast_dir=work_dir, keep=True) as workspace:
+            assert workspace.fast_dir is None
+            fn = workspace.path("ll2cr_cols.dat", nbytes=10, fast=True)
+            _touch(fn)
+        assert os.path.isfile(fn)
+
+    def test_adopt(self, tmpdir):
+        scene = create_test_swath_scene(str(tmpdir), product_names=BAND_NAMES, nan_pixels=True)
+        with Workspace() as workspace:
+            workspace.adopt(scene)
+        for product in scene.values():
+            assert not os.path.exists(product["swath_data"])
+
+    def test_cleanup_on_signal(self, tmpdir):
+        workspace = Workspace(str(tmpdir))
+        fn = workspace.path("grid_band.dat")
+        _touch(fn)
+        with pytest.raises(SystemExit):
+            with workspace:
+                os.kill(os.getpid(), signal.SIGTERM)
+        assert not os.path.exists(fn)
+        assert signal.getsignal(signal.SIGTERM) is not workspace._handle_signal
+
+    def test_remove_stale_workspaces(self, tmpdir):
+        # pids this large are never used
+        stale_dir = tmpdir.mkdir(WORKSPACE_PREFIX + "999999999_abc")
+        _touch(str(stale_dir.join("ll2cr_cols.dat")))
+        running_dir = tmpdir.mkdir("%s%d_abc" % (WORKSPACE_PREFIX, os.getpid()))
+        other_dir = tmpdir.mkdir("other")
+        assert remove_stale_workspaces(str(tmpdir)) == [str(stale_dir)]
+        assert running_dir.check() and other_dir.check()
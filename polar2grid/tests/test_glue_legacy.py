@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+# Copyright (C) 2018 Space Science and Engineering Center (SSEC),
+# University of Wisconsin-Madison.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# This file is part of the polar2grid software package. Polar2grid takes
+# satellite observation data, remaps it, and writes it to a file format for
+#     input into another program.
+# Documentation: http://www.ssec.wisc.edu/software/polar2grid/
+#
+# Written by David Hoese    November 2018
+# University of Wisconsin-Madison
+# Space Science and Engineering Center
+# 1225 West Dayton Street
+# Madison, WI  53706
+# david.hoese@ssec.wisc.edu
+"""Test running the legacy glue script's grids in worker processes.
+
+:author:       David Hoese (davidh)
+:contact:      david.hoese@ssec.wisc.edu
+:organization: Space Science and Engineering Center (SSEC)
+:copyright:    Copyright (c) 2018 University of Wisconsin SSEC. All rights reserved.
+:date:         Nov 2018
+:license:      GNU GPLv3
+
+"""
+__docformat__ = "restructuredtext en"
+
+import os
+import time
+from argparse import Namespace
+
+import pytest
+
+from polar2grid import glue_legacy
+
+
+def _fake_process_grid(grid_name, glue_name, args, *_):
+    """Write an output file for the grid slowly, fail for grids named 'bad'."""
+    if grid_name.startswith("bad"):
+        if grid_name == "bad_exc":
+            raise ValueError("bad grid")
+        return glue_legacy.STATUS_BACKEND_FAIL
+    output_fn = os.path.join(args.output_dir, grid_name + ".out")
+    with open(output_fn, "w") as output_file:
+        for _ in range(5):
+            time.sleep(0.05)
+            output_file.write("x")
+    return glue_legacy.STATUS_SUCCESS
+
+
+def _outputs(output_dir):
+    return {fn: open(os.path.join(output_dir, fn)).read() for fn in os.listdir(output_dir)}
+
+
+@pytest.fixture
+def fake_grids(monkeypatch, tmpdir):
+    monkeypatch.setattr(glue_legacy, "process_grid", _fake_process_grid)
+    return str(tmpdir)
+
+
+class TestProcessGrids(object):
+    def test_all_grids(self, fake_grids):
+        args = Namespace(exit_on_error=True, output_dir=fake_grids)
+        grids = ["g1", "g2", "g3"]
+        status = glue_legacy.process_grids(grids, 2, "test_glue", args)
+        assert status == glue_legacy.STATUS_SUCCESS
+        assert _outputs(fake_grids) == {g + ".out": "xxxxx" for g in grids}
+
+    def test_exit_on_error(self, fake_grids):
+        args = Namespace(exit_on_error=True, output_dir=fake_grids)
+        status = glue_legacy.process_grids(["g1", "bad", "g3", "g4"], 2, "test_glue", args)
+        assert status == glue_legacy.STATUS_BACKEND_FAIL
+        # the grid that was running finished its output, no grids were started after the failure
+        assert _outputs(fake_grids) == {"g1.out": "xxxxx"}
+
+    def test_continue_on_error(self, fake_grids):
+        args = Namespace(exit_on_error=False, output_dir=fake_grids)
+        status = glue_legacy.process_grids(["bad", "g1", "g2"], 2, "test_glue", args)
+        assert status == glue_legacy.STATUS_BACKEND_FAIL
+        assert _outputs(fake_grids) == {"g1.out": "xxxxx", "g2.out": "xxxxx"}
+
+    def test_worker_exception(self, fake_grids):
+        args = Namespace(exit_on_error=False, output_dir=fake_grids)
+        with pytest.raises(ValueError):
+            glue_legacy.process_grids(["g1", "bad_exc", "g3"], 2, "test_glue", args)
+        assert _outputs(fake_grids) == {"g1.out": "xxxxx"}
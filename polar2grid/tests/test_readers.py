@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+# Copyright (C) 2018 Space Science and Engineering Center (SSEC),
+# University of Wisconsin-Madison.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# This file is part of the polar2grid software package. Polar2grid takes
+# satellite observation data, remaps it, and writes it to a file format for
+#     input into another program.
+# Documentation: http://www.ssec.wisc.edu/software/polar2grid/
+#
+# Written by David Hoese    November 2018
+# University of Wisconsin-Madison
+# Space Science and Engineering Center
+# 1225 West Dayton Street
+# Madison, WI  53706
+# david.hoese@ssec.wisc.edu
+"""Test converting between satpy and Polar2Grid scenes.
+
+:author:       David Hoese (davidh)
+:contact:      david.hoese@ssec.wisc.edu
+:organization: Space Science and Engineering Center (SSEC)
+:copyright:    Copyright (c) 2018 University of Wisconsin SSEC. All rights reserved.
+:date:         Nov 2018
+:license:      GNU GPLv3
+
+"""
+__docformat__ = "restructuredtext en"
+
+from argparse import Namespace
+from datetime import datetime
+
+import numpy
+import pytest
+
+da = pytest.importorskip("dask.array")
+xr = pytest.importorskip("xarray")
+
+from polar2grid import readers
+from polar2grid.tests.test_core import create_gridded_product
+
+
+class FakeSwathArea(object):
+    def __init__(self, name, lons, lats):
+        self.name = name
+        self.lons = lons
+        self.lats = lats
+
+
+def _count_blocks(block, calls):
+    calls.append(block.shape)
+    return block
+
+
+def create_dataarray(name, data, area):
+    return xr.DataArray(data, dims=("y", "x"), attrs={
+        "name": name, "calibration": "reflectance", "resolution": 742, "platform_name": "Suomi-NPP",
+        "sensor": "viirs", "start_time": datetime(2018, 11, 1), "end_time": datetime(2018, 11, 1, 0, 5),
+        "area": area})
+
+
+class TestConvertSatpyToP2GSwath(object):
+    def test_shared_geolocation(self, tmpdir, monkeypatch):
+        monkeypatch.chdir(tmpdir)
+        shape = (40, 30)
+        lon_calls = []
+        lons = da.from_array(numpy.linspace(-100.0, -90.0, shape[0] * shape[1], dtype=numpy.float32).reshape(shape),
+                             chunks=(20, 30)).map_blocks(_count_blocks, lon_calls)
+        lats = da.from_array(numpy.linspace(20.0, 30.0, shape[0] * shape[1], dtype=numpy.float32).reshape(shape),
+                             chunks=(20, 30))
+        # products from the same file type have their own area objects built on the same geolocation
+        scene = [create_dataarray("band%d" % (idx,), lons + idx, FakeSwathArea("swath%d" % (idx,), lons, lats))
+                 for idx in range(3)]
+
+        store_calls = []
+        orig_store = da.store
+
+        def _store(sources, targets, *args, **kwargs):
+            store_calls.append(len(sources))
+            return orig_store(sources, targets, *args, **kwargs)
+        monkeypatch.setattr(da, "store", _store)
+
+        p2g_scene = readers.convert_satpy_to_p2g_swath(Namespace(overwrite_existing=False, reader="fake"), scene)
+        # longitude, latitude, and the products are written together
+        assert store_calls == [5]
+        # every longitude block is computed once for the longitude file and all products using it
+        # (dask may also call the function on tiny arrays to check its output type)
+        assert lon_calls.count((20, 30)) == 2
+        swath_def = p2g_scene["band0"]["swath_definition"]
+        assert all(product["swath_definition"] is swath_def for product in p2g_scene.values())
+        assert sorted(fn for fn in tmpdir.listdir(lambda p: p.basename.endswith("_lon.dat"))) == \
+            [tmpdir.join("swath0_lon.dat")]
+        numpy.testing.assert_array_equal(swath_def.get_longitude_array(), lons.compute())
+        for idx in range(3):
+            product = p2g_scene["band%d" % (idx,)]
+            assert product["reader"] == "fake"
+            numpy.testing.assert_array_equal(product.get_data_array(), lons.compute() + idx)
+
+
+class TestGriddedProductToDataArray(object):
+    def test_shares_memory(self):
+        data = numpy.arange(20 * 10, dtype=numpy.float32).reshape((20, 10))
+        data_arr = readers.gridded_product_to_dataarray(create_gridded_product(data), None, chunks=8)
+        assert isinstance(data_arr.data, da.Array)
+        # the DataArray reads the product's array when it is computed, it doesn't hold a copy
+        data[5, 5] = -1.0
+        assert data_arr.values[5, 5] == -1.0
+
+    def test_shares_file(self, tmpdir):
+        data_fn = str(tmpdir.join("test_product.dat"))
+        data = numpy.arange(20 * 10, dtype=numpy.float32).reshape((20, 10))
+        data.tofile(data_fn)
+        product = create_gridded_product(data)
+        product["grid_data"] = data_fn
+        data_arr = readers.gridded_product_to_dataarray(product, None, chunks=8)
+        file_data = numpy.memmap(data_fn, dtype=numpy.float32, mode="r+", shape=data.shape)
+        file_data[5, 5] = -1.0
+        file_data.flush()
+        assert data_arr.values[5, 5] == -1.0
+
+
+class TestMergeRGBChannels(object):
+    def _channel_products(self, shape=(20, 10)):
+        products = []
+        for idx in range(3):
+            data = numpy.full(shape, idx + 1, dtype=numpy.float32)
+            data[idx, :] = numpy.nan
+            products.append(create_gridded_product(data, product_name="true_color_rgb_%d" % (idx,)))
+        return products
+
+    @pytest.mark.parametrize("use_stores", [False, True])
+    def test_band_order_and_fill(self, use_stores):
+        channels = self._channel_products()
+        stores = [] if use_stores else None
+        rgb = readers.merge_rgb_channels("true_color", channels, stores=stores)
+        if use_stores:
+            assert len(stores) == 3
+            sources, targets = zip(*stores)
+            da.store(list(sources), list(targets))
+        assert rgb["product_name"] == "true_color"
+        data = rgb.get_data_array()
+        assert data.shape == (3, 20, 10)
+        for idx, channel in enumerate(channels):
+            numpy.testing.assert_array_equal(data[idx], channel.get_data_array())
+        assert numpy.isnan(rgb["fill_value"])
+        # each band keeps its own fill pixels
+        mask = rgb.get_data_mask()
+        for idx in range(3):
+            assert mask[idx, idx].all()
+            assert mask[idx].sum() == 10
+
+    def test_file_backed(self, tmpdir, monkeypatch):
+        monkeypatch.chdir(tmpdir)
+        channels = self._channel_products()
+        for channel in channels:
+            data_fn = channel["product_name"] + ".dat"
+            channel.get_data_array().tofile(data_fn)
+            channel["grid_data"] = data_fn
+        rgb = readers.merge_rgb_channels("true_color", channels)
+        assert rgb["grid_data"] == "true_color.dat"
+        rgb_data = numpy.fromfile("true_color.dat", dtype=numpy.float32).reshape((3, 20, 10))
+        for idx, channel in enumerate(channels):
+            numpy.testing.assert_array_equal(rgb_data[idx], channel.get_data_array())
+
+    def test_dataarray_band_order(self):
+        channels = self._channel_products()
+        data_arr = readers.rgb_channels_to_dataarray(channels, None, {"name": "true_color"}, chunks=8)
+        assert list(data_arr.coords["bands"].values) == ["R", "G", "B"]
+        assert data_arr.attrs["name"] == "true_color"
+        for idx, channel in enumerate(channels):
+            numpy.testing.assert_array_equal(data_arr.sel(bands=readers.RGB_BANDS[idx]).values,
+                                             channel.get_data_array())
+        # the channels are read when the DataArray is computed
+        channels[0].get_data_array()[5, 5] = -1.0
+        assert data_arr.values[0, 5, 5] == -1.0
@@ -39,8 +39,13 @@
 """
 __docformat__ = "restructuredtext en"
 
+import os
+from datetime import datetime
+
 import numpy
 
+from polar2grid.core.containers import SwathDefinition, SwathProduct, SwathScene
+
 
 def create_test_longitude(start, stop, shape, twist_factor=0.0, dtype=numpy.float32):
     if start > stop:
@@ -62,3 +67,29 @@ def create_test_latitude(start, stop, shape, twist_factor=0.0, dtype=numpy.float
     lat_array = numpy.repeat(lat_col, shape[1], axis=1)
     lat_array += twist_array
     return lat_array
+
+
+def create_test_swath_scene(data_dir, shape=(50, 100), product_names=("p1", "p2"), nan_pixels=False):
+    """Create a swath scene with float32 products saved as binary files in `data_dir`.
+
+    Products share one swath definition and product `idx` holds a ramp scaled by `idx + 1`. With `nan_pixels`
+    the pixel at row 0, column `idx` of product `idx` is NaN.
+    """
+    lon_arr = create_test_longitude(-95.0, -75.0, shape)
+    lat_arr = create_test_latitude(18.0, 40.0, shape)
+    swath_def = SwathDefinition(swath_name="test_swath", longitude=lon_arr, latitude=lat_arr,
+                                data_type=lon_arr.dtype, swath_rows=shape[0], swath_columns=shape[1],
+                                fill_value=numpy.nan)
+    swath_scene = SwathScene()
+    for idx, product_name in enumerate(product_names):
+        data = numpy.arange(shape[0] * shape[1], dtype=numpy.float32).reshape(shape) * (idx + 1)
+        if nan_pixels:
+            data[0, idx] = numpy.nan
+        data_fn = os.path.join(data_dir, "swath_%s.dat" % (product_name,))
+        data.tofile(data_fn)
+        swath_scene[product_name] = SwathProduct(
+            product_name=product_name, satellite="s", instrument="i", begin_time=datetime(2018, 1, 1),
+            end_time=datetime(2018, 1, 1, 0, 5), data_type=numpy.float32, swath_data=data_fn,
+            swath_definition=swath_def, fill_value=numpy.nan, swath_rows=shape[0], swath_columns=shape[1])
+    swath_scene.set_persist()
+    return swath_scene
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+# Copyright (C) 2018 Space Science and Engineering Center (SSEC),
+# University of Wisconsin-Madison.
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# This file is part of the polar2grid software package. Polar2grid takes
+# satellite observation data, remaps it, and writes it to a file format for
+# input into another program.
+# Documentation: http://www.ssec.wisc.edu/software/polar2grid/
+#
+#     Written by David Hoese    November 2018
+#     University of Wisconsin-Madison
+#     Space Science and Engineering Center
+#     1225 West Dayton Street
+#     Madison, WI  53706
+#     david.hoese@ssec.wisc.edu
+"""Test bilinear interpolation of swath data to a grid.
+
+:author:       David Hoese (davidh)
+:contact:      david.hoese@ssec.wisc.edu
+:organization: Space Science and Engineering Center (SSEC)
+:copyright:    Copyright (c) 2018 University of Wisconsin SSEC. All rights reserved.
+:date:         Nov 2018
+:license:      GNU GPLv3
+
+"""
+__docformat__ = "restructuredtext en"
+
+import sys
+
+import logging
+import numpy
+import pytest
+
+from polar2grid.remap.bilinear import grid_bilinear_index, BilinearResamplePlan
+
+LOG = logging.getLogger(__name__)
+
+
+def create_rotated_swath(shape=(40, 60), angle=0.3, spacing=1.7, offset=(5.0, 3.0)):
+    """Create swath pixel locations on a rotated regular lattice in grid space."""
+    rows, cols = numpy.mgrid[:shape[0], :shape[1]].astype(numpy.float64)
+    cos_a, sin_a = numpy.cos(angle), numpy.sin(angle)
+    grid_cols = offset[0] + spacing * (cols * cos_a - rows * sin_a) + 30.0
+    grid_rows = offset[1] + spacing * (cols * sin_a + rows * cos_a)
+    return grid_cols, grid_rows
+
+
+class TestBilinearResamplePlan(object):
+    def _create_plan(self, good_mask=None):
+        cols, rows = create_rotated_swath()
+        quad_index, u, v = grid_bilinear_index(cols, rows, (100, 120), good_mask=good_mask)
+        return cols, rows, BilinearResamplePlan.from_quads(quad_index, u, v, cols.shape)
+
+    def test_linear_field(self):
+        """Interpolating a linear function of grid location gives the function at every cell center."""
+        cols, rows, plan = self._create_plan()
+        assert plan.num_valid > 0
+        assert plan.swath_index.dtype == numpy.int32
+        assert plan.weights.dtype == numpy.float32
+        swath_data = (2.0 * cols + 0.5 * rows).astype(numpy.float32)
+        out = plan.resample([swath_data], [numpy.nan])[0]
+        grid_rows, grid_cols = numpy.mgrid[:100, :120]
+        expected = 2.0 * grid_cols + 0.5 * grid_rows
+        valid = ~numpy.isnan(out)
+        assert valid.sum() == plan.num_valid
+        numpy.testing.assert_allclose(out[valid], expected[valid], rtol=1e-4)
+
+    def test_read_only_input(self):
+        cols, rows = create_rotated_swath()
+        expected = grid_bilinear_index(cols, rows, (100, 120))
+        cols.flags.writeable = False
+        rows.flags.writeable = False
+        for result_arr, expected_arr in zip(grid_bilinear_index(cols, rows, (100, 120)), expected):
+            numpy.testing.assert_array_equal(result_arr, expected_arr)
+
+    def test_group_matches_single(self):
+        cols, rows, plan = self._create_plan()
+        data1 = numpy.arange(cols.size, dtype=numpy.float32).reshape(cols.shape)
+        data2 = (data1 % 7).astype(numpy.int8)
+        data1[5:10] = -999.0
+        outs = plan.resample([data1, data2], [-999.0, -1], categories=[False, True])
+        assert outs[1].dtype == numpy.int8
+        single = plan.resample([data1], [-999.0])[0]
+        numpy.testing.assert_array_equal(outs[0], single)
+        # category values are never interpolated
+        assert set(numpy.unique(outs[1])) <= set(range(7)) | {-1}
+        # cells only surrounded by fill are fill
+        assert (outs[0] == -999.0).sum() > plan.grid_shape[0] * plan.grid_shape[1] - plan.num_valid
+
+    def test_good_mask(self):
+        cols, rows, full_plan = self._create_plan()
+        good_mask = numpy.ones(cols.shape, dtype=numpy.bool_)
+        good_mask[20] = False
+        cols, rows, plan = self._create_plan(good_mask=good_mask)
+        assert plan.num_valid < full_plan.num_valid
+        assert not numpy.isin(numpy.flatnonzero(~good_mask), plan.swath_index).any()
+
+    def test_save_load(self, tmpdir):
+        cols, rows, plan = self._create_plan()
+        fn = str(tmpdir.join("plan.npz.tmp"))
+        plan.save(fn)
+        loaded = BilinearResamplePlan.load(fn)
+        assert loaded.grid_shape == plan.grid_shape
+        numpy.testing.assert_array_equal(loaded.valid_cells, plan.valid_cells)
+        numpy.testing.assert_array_equal(loaded.swath_index, plan.swath_index)
+        numpy.testing.assert_array_equal(loaded.weights, plan.weights)
+
+
+def main():
+    import os
+    return pytest.main([os.path.dirname(os.path.realpath(__file__))])
+
+
+if __name__ == "__main__":
+    sys.exit(main())
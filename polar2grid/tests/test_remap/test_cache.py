@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+# Copyright (C) 2018 Space Science and Engineering Center (SSEC),
+# University of Wisconsin-Madison.
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# This file is part of the polar2grid software package. Polar2grid takes
+# satellite observation data, remaps it, and writes it to a file format for
+# input into another program.
+# Documentation: http://www.ssec.wisc.edu/software/polar2grid/
+#
+#     Written by David Hoese    November 2018
+#     University of Wisconsin-Madison
+#     Space Science and Engineering Center
+#     1225 West Dayton Street
+#     Madison, WI  53706
+#     david.hoese@ssec.wisc.edu
+"""Test the persistent ll2cr cache.
+
+:author:       David Hoese (davidh)
+:contact:      david.hoese@ssec.wisc.edu
+:organization: Space Science and Engineering Center (SSEC)
+:copyright:    Copyright (c) 2018 University of Wisconsin SSEC. All rights reserved.
+:date:         Nov 2018
+:license:      GNU GPLv3
+
+"""
+__docformat__ = "restructuredtext en"
+
+import sys
+
+import logging
+import numpy
+import pytest
+
+from polar2grid.core.containers import SwathDefinition, GridDefinition
+from polar2grid.remap.cache import LL2CRCache
+from polar2grid.remap.remap import Remapper
+from polar2grid.tests.test_remap import create_test_longitude, create_test_latitude
+
+LOG = logging.getLogger(__name__)
+
+
+def create_swath_definition(lon_min=-95.0, lon_max=-75.0, shape=(50, 100)):
+    lon_arr = create_test_longitude(lon_min, lon_max, shape)
+    lat_arr = create_test_latitude(18.0, 40.0, shape)
+    return SwathDefinition(swath_name="test_swath", longitude=lon_arr, latitude=lat_arr,
+                           data_type=lon_arr.dtype, swath_rows=shape[0], swath_columns=shape[1],
+                           fill_value=numpy.nan)
+
+
+def create_grid_definition():
+    return GridDefinition(grid_name="test_wgs84_fit", proj4_definition="+proj=latlong +datum=WGS84 +ellps=WGS84 +no_defs",
+                          width=None, height=None, origin_x=None, origin_y=None,
+                          cell_width=0.0057, cell_height=-0.0057)
+
+
+class TestLL2CRCache(object):
+    def test_reuse_between_remappers(self, tmpdir, monkeypatch):
+        monkeypatch.chdir(tmpdir)
+        cache_dir = str(tmpdir.join("cache"))
+        swath_def = create_swath_definition()
+        grid_def = create_grid_definition()
+        cols_fn, rows_fn = Remapper(ll2cr_cache_dir=cache_dir).run_ll2cr(swath_def, grid_def)
+        expected_cols = numpy.fromfile(cols_fn, dtype=swath_def["data_type"])
+        expected_rows = numpy.fromfile(rows_fn, dtype=swath_def["data_type"])
+
+        cached_grid_def = create_grid_definition()
+        remapper = Remapper(ll2cr_cache_dir=cache_dir, overwrite_existing=True)
+        monkeypatch.setattr("polar2grid.remap.ll2cr.ll2cr", lambda *args, **kwargs: pytest.fail("ll2cr was rerun"))
+        cols_fn, rows_fn = remapper.run_ll2cr(swath_def, cached_grid_def)
+        numpy.testing.assert_array_equal(numpy.fromfile(cols_fn, dtype=swath_def["data_type"]), expected_cols)
+        numpy.testing.assert_array_equal(numpy.fromfile(rows_fn, dtype=swath_def["data_type"]), expected_rows)
+        for k in ("width", "height", "origin_x", "origin_y"):
+            assert cached_grid_def[k] == grid_def[k]
+
+    def test_reuse_in_memory(self, tmpdir, monkeypatch):
+        monkeypatch.chdir(tmpdir)
+        cache_dir = str(tmpdir.join("cache"))
+        swath_def = create_swath_definition()
+        cols_fn, rows_fn = Remapper(ll2cr_cache_dir=cache_dir).run_ll2cr(swath_def, create_grid_definition())
+
+        remapper = Remapper(ll2cr_cache_dir=cache_dir, in_memory=True)
+        monkeypatch.setattr("polar2grid.remap.ll2cr.ll2cr", lambda *args, **kwargs: pytest.fail("ll2cr was rerun"))
+        cols_arr, rows_arr = remapper.run_ll2cr(swath_def, create_grid_definition())
+        assert isinstance(cols_arr, numpy.ndarray) and isinstance(rows_arr, numpy.ndarray)
+        numpy.testing.assert_array_equal(cols_arr.ravel(), numpy.fromfile(cols_fn, dtype=swath_def["data_type"]))
+        numpy.testing.assert_array_equal(rows_arr.ravel(), numpy.fromfile(rows_fn, dtype=swath_def["data_type"]))
+
+    def test_key_depends_on_content(self, tmpdir):
+        cache = LL2CRCache(str(tmpdir))
+        grid_def = create_grid_definition()
+        key1 = cache.cache_key(create_swath_definition(), grid_def)
+        assert key1 == cache.cache_key(create_swath_definition(), grid_def)
+        assert key1 != cache.cache_key(create_swath_definition(lon_max=-76.0), grid_def)
+        grid_def["cell_width"] = 0.01
+        assert key1 != cache.cache_key(create_swath_definition(), grid_def)
+
+    def test_lru_eviction(self, tmpdir):
+        cache = LL2CRCache(str(tmpdir.join("cache")), max_size=3000)
+        grid_def = create_grid_definition()
+        grid_def.update(width=10, height=10, origin_x=0.0, origin_y=0.0)
+        cols_fn = str(tmpdir.join("cols.dat"))
+        rows_fn = str(tmpdir.join("rows.dat"))
+        numpy.zeros(100, dtype=numpy.float64).tofile(cols_fn)
+        numpy.zeros(100, dtype=numpy.float64).tofile(rows_fn)
+        # each entry is a little more than 1600 bytes so only one fits
+        cache.put("first", cols_fn, rows_fn, grid_def, 100)
+        assert cache.get("first", cols_fn, rows_fn, grid_def) == 100
+        cache.put("second", cols_fn, rows_fn, grid_def, 50)
+        assert cache.get("first", cols_fn, rows_fn, grid_def) is None
+        assert cache.get("second", cols_fn, rows_fn, grid_def) == 50
+
+
+def main():
+    import os
+    return pytest.main([os.path.dirname(os.path.realpath(__file__))])
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+# Copyright (C) 2018 Space Science and Engineering Center (SSEC),
+# University of Wisconsin-Madison.
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# This file is part of the polar2grid software package. Polar2grid takes
+# satellite observation data, remaps it, and writes it to a file format for
+# input into another program.
+# Documentation: http://www.ssec.wisc.edu/software/polar2grid/
+#
+#     Written by David Hoese    November 2018
+#     University of Wisconsin-Madison
+#     Space Science and Engineering Center
+#     1225 West Dayton Street
+#     Madison, WI  53706
+#     david.hoese@ssec.wisc.edu
+"""Test the EWA resampling (fornav) extension module.
+
+:author:       David Hoese (davidh)
+:contact:      david.hoese@ssec.wisc.edu
+:organization: Space Science and Engineering Center (SSEC)
+:copyright:    Copyright (c) 2018 University of Wisconsin SSEC. All rights reserved.
+:date:         Nov 2018
+:license:      GNU GPLv3
+
+"""
+__docformat__ = "restructuredtext en"
+
+import re
+import sys
+
+import logging
+import numpy
+import pytest
+
+from polar2grid.remap import fornav
+
+LOG = logging.getLogger(__name__)
+
+
+def create_test_swath(shape=(100, 50), grid_shape=(120, 70), dtype=numpy.float64):
+    """Create column and row arrays in grid space with some scan-like overlap."""
+    rows, cols = numpy.mgrid[:shape[0], :shape[1]].astype(dtype)
+    cols_array = cols * (grid_shape[1] - 10) / shape[1] + 5.0
+    rows_array = rows * (grid_shape[0] - 10) / shape[0] + 5.0
+    return numpy.ascontiguousarray(cols_array), numpy.ascontiguousarray(rows_array)
+
+
+def create_test_data(shape=(100, 50), num_channels=3, dtype=numpy.float32):
+    return [(numpy.arange(shape[0] * shape[1], dtype=dtype).reshape(shape) * (idx + 1)) % 255
+            for idx in range(num_channels)]
+
+
+class TestFornavThreads(object):
+    @pytest.mark.parametrize("maximum_weight_mode", [False, True])
+    def test_threads_match_serial(self, maximum_weight_mode):
+        cols_array, rows_array = create_test_swath()
+        input_arrays = create_test_data()
+        valid_serial, out_serial = fornav.fornav(cols_array, rows_array, 10, input_arrays,
+                                                 grid_cols=70, grid_rows=120, weight_delta_max=10.0,
+                                                 maximum_weight_mode=maximum_weight_mode)
+        valid_threads, out_threads = fornav.fornav(cols_array, rows_array, 10, input_arrays,
+                                                   grid_cols=70, grid_rows=120, weight_delta_max=10.0,
+                                                   maximum_weight_mode=maximum_weight_mode, num_threads=4)
+        assert valid_serial == valid_threads
+        for s, t in zip(out_serial, out_threads):
+            numpy.testing.assert_allclose(s, t, rtol=1e-5)
+
+    def test_more_threads_than_scans(self):
+        cols_array, rows_array = create_test_swath(shape=(20, 50))
+        input_arrays = create_test_data(shape=(20, 50), num_channels=1)
+        valid_list, out_arrays = fornav.fornav(cols_array, rows_array, 10, input_arrays,
+                                               grid_cols=70, grid_rows=120, num_threads=16)
+        assert valid_list[0] > 0
+
+
+class TestFornavFloat32(object):
+    def test_float32_cols_rows(self):
+        cols_array, rows_array = create_test_swath(dtype=numpy.float32)
+        input_arrays = create_test_data()
+        valid64, out64 = fornav.fornav(cols_array.astype(numpy.float64), rows_array.astype(numpy.float64), 10,
+                                       input_arrays, grid_cols=70, grid_rows=120, weight_delta_max=10.0)
+        valid32, out32 = fornav.fornav(cols_array, rows_array, 10,
+                                       input_arrays, grid_cols=70, grid_rows=120, weight_delta_max=10.0)
+        assert valid64 == valid32
+        for o64, o32 in zip(out64, out32):
+            numpy.testing.assert_allclose(o64, o32, atol=0.05)
+
+
+class TestFornavMixedInputs(object):
+    def test_mixed_types_fills_and_modes(self):
+        """Test that one call with different input types matches separate calls."""
+        cols_array, rows_array = create_test_swath()
+        float_data = create_test_data(num_channels=2)
+        float_data[1][:5] = -999.0
+        int_data = [(float_data[0] % 100).astype(numpy.int8)]
+        int_data[0][:, :3] = -1
+        input_arrays = float_data + int_data
+        input_fill = [numpy.nan, -999.0, -1]
+        mwm = [False, False, True]
+        valid_list, out_arrays = fornav.fornav(cols_array, rows_array, 10, input_arrays, input_fill=input_fill,
+                                               grid_cols=70, grid_rows=120, maximum_weight_mode=mwm, num_threads=2)
+        assert [o.dtype for o in out_arrays] == [numpy.float32, numpy.float32, numpy.int8]
+
+        for idx, input_array in enumerate(input_arrays):
+            exp_valid, exp_out = fornav.fornav(cols_array, rows_array, 10, [input_array], input_fill=input_fill[idx],
+                                               grid_cols=70, grid_rows=120, maximum_weight_mode=mwm[idx])
+            assert valid_list[idx] == exp_valid[0]
+            numpy.testing.assert_array_equal(out_arrays[idx], exp_out[0])
+
+
+class TestFornavBlocks(object):
+    @pytest.mark.parametrize("scan_block_size", [1, 3, 100])
+    def test_blocks_match_full(self, scan_block_size):
+        cols_array, rows_array = create_test_swath(shape=(200, 50), grid_shape=(300, 70))
+        input_arrays = create_test_data(shape=(200, 50))
+        input_arrays.append((input_arrays[0] % 100).astype(numpy.int8))
+        kwargs = dict(input_fill=[numpy.nan, numpy.nan, numpy.nan, -1], grid_cols=70, grid_rows=300,
+                      maximum_weight_mode=[False, False, True, True])
+        valid_full, out_full = fornav.fornav(cols_array, rows_array, 10, input_arrays, **kwargs)
+        valid_blocks, out_blocks = fornav.fornav(cols_array, rows_array, 10, input_arrays,
+                                                 scan_block_size=scan_block_size, **kwargs)
+        assert valid_full == valid_blocks
+        for full, blocks in zip(out_full, out_blocks):
+            numpy.testing.assert_array_equal(full, blocks)
+
+    @pytest.mark.parametrize("ascending", [False, True])
+    def test_window_limited(self, caplog, ascending):
+        cols_array, rows_array = create_test_swath(shape=(200, 50), grid_shape=(300, 70))
+        if ascending:
+            # grid rows decrease along the track
+            rows_array = numpy.ascontiguousarray(299 - rows_array)
+        input_arrays = create_test_data(shape=(200, 50), num_channels=1)
+        input_arrays.append(input_arrays[0].copy())
+        kwargs = dict(grid_cols=70, grid_rows=300, maximum_weight_mode=[False, True])
+        valid_full, out_full = fornav.fornav(cols_array, rows_array, 10, input_arrays, **kwargs)
+        with caplog.at_level(logging.DEBUG):
+            valid_blocks, out_blocks = fornav.fornav(cols_array, rows_array, 10, input_arrays,
+                                                     scan_block_size=1, **kwargs)
+        # one scan covers ~15 grid rows plus the ellipse margin on each side, much less than the 300 row grid
+        max_rows = int(re.search(r"maximum of (\d+) grid rows", caplog.text).group(1))
+        assert max_rows < 50
+        assert valid_full == valid_blocks
+        for full, blocks in zip(out_full, out_blocks):
+            numpy.testing.assert_array_equal(full, blocks)
+
+
+class TestScheduleGroups(object):
+    def test_everything_fits(self, monkeypatch):
+        monkeypatch.setattr(fornav, "get_available_memory", lambda: 1024 ** 4)
+        assert fornav.schedule_groups(10, 3200, 768, 5000, 5000, num_threads=4) == (10, 1, 4)
+
+    def test_unknown_memory(self, monkeypatch):
+        monkeypatch.setattr(fornav, "get_available_memory", lambda: None)
+        assert fornav.schedule_groups(10, 3200, 768, 5000, 5000, num_threads=2, default_group_size=4) == (4, 1, 2)
+
+    def test_max_memory_limits_groups(self, monkeypatch):
+        monkeypatch.setattr(fornav, "get_available_memory", lambda: 1024 ** 4)
+        # geolocation is 80000 bytes and each channel needs 322400 bytes with 4 threads
+        group_size, concurrent_groups, threads = fornav.schedule_groups(3, 50, 100, 70, 120, num_threads=4,
+                                                                        max_memory=480000, geo_item_size=8)
+        assert group_size == 1
+        assert concurrent_groups * threads <= 4
+        assert concurrent_groups > 1
+
+    def test_groups_match_full(self, monkeypatch):
+        monkeypatch.setattr(fornav, "get_available_memory", lambda: 1024 ** 4)
+        cols_array, rows_array = create_test_swath()
+        input_arrays = create_test_data(num_channels=4)
+        valid_full, out_full = fornav.fornav(cols_array, rows_array, 10, input_arrays,
+                                             grid_cols=70, grid_rows=120, num_threads=4)
+        valid_groups, out_groups = fornav.fornav(cols_array, rows_array, 10, input_arrays,
+                                                 grid_cols=70, grid_rows=120, num_threads=4,
+                                                 use_group_size=True, max_memory=500000)
+        assert valid_full == valid_groups
+        for full, groups in zip(out_full, out_groups):
+            numpy.testing.assert_allclose(full, groups, rtol=1e-5)
+
+
+def main():
+    import os
+    return pytest.main([os.path.dirname(os.path.realpath(__file__))])
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -130,6 +130,124 @@ class TestLL2CRDynamic(object):
         assert numpy.all(numpy.diff(lon_arr[0]) >= 0), "ll2cr didn't return monotonic columns over the dateline"
 
 
+class TestLL2CREstimatedExtent(object):
+    @pytest.mark.parametrize("num_threads", [1, 2])
+    def test_interior_extremes(self, num_threads):
+        """Test points that the extent estimate can't see are still used to size the grid."""
+        lon_arr = numpy.full((200, 300), 170.0) + numpy.linspace(0, 5, 300)[None, :]
+        lat_arr = numpy.full((200, 300), 10.0) + numpy.linspace(0, 5, 200)[:, None]
+        # one point crosses the antimeridian and one extends the grid north
+        lon_arr[101, 151] = -179.0
+        lat_arr[103, 157] = 20.0
+        proj4_str = dynamic_wgs84["proj4_definition"]
+        exp = ll2cr._ll2cr.ll2cr_dynamic(lon_arr.copy(), lat_arr.copy(), numpy.nan, proj4_str, 0.01, -0.01)
+        res = ll2cr._ll2cr.ll2cr_dynamic_blocks(lon_arr, lat_arr, numpy.nan, proj4_str, 0.01, -0.01,
+                                                num_threads=num_threads)
+        assert exp[0] == res[0]
+        assert exp[3:] == res[3:]
+        numpy.testing.assert_allclose(exp[1], res[1], atol=1e-6)
+        numpy.testing.assert_allclose(exp[2], res[2], atol=1e-6)
+
+
+class TestLL2CRThreaded(object):
+    def test_lcc_threads_match_serial(self):
+        lon_arr = create_test_longitude(-95.0, -75.0, (50, 100), dtype=numpy.float64)
+        lat_arr = create_test_latitude(18.0, 40.0, (50, 100), dtype=numpy.float64)
+        lon_arr2 = lon_arr.copy()
+        lat_arr2 = lat_arr.copy()
+        points_in_grid, _, _ = ll2cr.ll2cr(lon_arr, lat_arr, static_lcc.copy())
+        points_in_grid2, _, _ = ll2cr.ll2cr(lon_arr2, lat_arr2, static_lcc.copy(), num_threads=4)
+        assert points_in_grid == points_in_grid2
+        numpy.testing.assert_allclose(lon_arr, lon_arr2)
+        numpy.testing.assert_allclose(lat_arr, lat_arr2)
+
+    def test_latlong_dateline_threads_match_serial(self):
+        lon_arr = create_test_longitude(165.0, -165.0, (50, 100), twist_factor=0.6, dtype=numpy.float64)
+        lat_arr = create_test_latitude(15.0, 30.0, (50, 100), twist_factor=-0.1, dtype=numpy.float64)
+        lon_arr2 = lon_arr.copy()
+        lat_arr2 = lat_arr.copy()
+        grid_info = dynamic_wgs84.copy()
+        grid_info2 = dynamic_wgs84.copy()
+        points_in_grid, _, _ = ll2cr.ll2cr(lon_arr, lat_arr, grid_info)
+        points_in_grid2, _, _ = ll2cr.ll2cr(lon_arr2, lat_arr2, grid_info2, num_threads=4)
+        assert points_in_grid == points_in_grid2
+        for k in ["origin_x", "origin_y", "width", "height"]:
+            assert grid_info[k] == grid_info2[k]
+        numpy.testing.assert_allclose(lon_arr, lon_arr2)
+        numpy.testing.assert_allclose(lat_arr, lat_arr2)
+
+
+class TestLL2CRFloat32(object):
+    def _compare_float_types(self, lon_arr, lat_arr, grid_info):
+        lon64 = lon_arr.astype(numpy.float64)
+        lat64 = lat_arr.astype(numpy.float64)
+        grid_info64 = grid_info.copy()
+        points_in_grid, lon_res, lat_res = ll2cr.ll2cr(lon_arr, lat_arr, grid_info)
+        points_in_grid64, _, _ = ll2cr.ll2cr(lon64, lat64, grid_info64)
+        assert lon_res is lon_arr and lon_res.dtype == numpy.float32
+        assert lat_res is lat_arr and lat_res.dtype == numpy.float32
+        assert abs(points_in_grid - points_in_grid64) <= lon_arr.size * 0.001
+        # 32-bit floats are accurate enough for pixel index calculations
+        numpy.testing.assert_allclose(lon_arr, lon64, atol=0.01)
+        numpy.testing.assert_allclose(lat_arr, lat64, atol=0.01)
+        return grid_info, grid_info64
+
+    def test_lcc_float32(self):
+        lon_arr = create_test_longitude(-95.0, -75.0, (50, 100))
+        lat_arr = create_test_latitude(18.0, 40.0, (50, 100))
+        self._compare_float_types(lon_arr, lat_arr, static_lcc.copy())
+
+    def test_latlong_dateline_float32(self):
+        lon_arr = create_test_longitude(165.0, -165.0, (50, 100), twist_factor=0.6)
+        lat_arr = create_test_latitude(15.0, 30.0, (50, 100), twist_factor=-0.1)
+        grid_info, grid_info64 = self._compare_float_types(lon_arr, lat_arr, dynamic_wgs84.copy())
+        assert grid_info["width"] == grid_info64["width"]
+        assert grid_info["height"] == grid_info64["height"]
+
+
+class TestXY2CR(object):
+    @pytest.mark.parametrize("dtype", [numpy.float32, numpy.float64])
+    def test_grids_match_ll2cr(self, dtype):
+        lon_arr = create_test_longitude(-95.0, -75.0, (50, 100), dtype=dtype)
+        lat_arr = create_test_latitude(18.0, 40.0, (50, 100), dtype=dtype)
+        x_arr, y_arr = ll2cr.project_swath(lon_arr, lat_arr, static_lcc["proj4_definition"], num_threads=2)
+        for cell_size in (1015.9, 2031.8):
+            grid_info = static_lcc.copy()
+            grid_info.update(cell_width=cell_size, cell_height=-cell_size, origin_x=-1000000.0)
+            cols_out = numpy.empty_like(lon_arr)
+            rows_out = numpy.empty_like(lat_arr)
+            points_in_grid, _, _ = ll2cr.xy2cr(x_arr, y_arr, grid_info, cols_out, rows_out)
+            exp_points_in_grid, exp_cols, exp_rows = ll2cr.ll2cr(lon_arr.copy(), lat_arr.copy(), grid_info)
+            assert points_in_grid == exp_points_in_grid
+            numpy.testing.assert_array_equal(cols_out, exp_cols)
+            numpy.testing.assert_array_equal(rows_out, exp_rows)
+
+
+class TestFootprintCoverage(object):
+    def test_lcc_inside(self):
+        lon_arr = create_test_longitude(-95.0, -75.0, (50, 100))
+        lat_arr = create_test_latitude(18.0, 40.0, (50, 100))
+        swath_fraction, grid_fraction = ll2cr.footprint_coverage(lon_arr, lat_arr, static_lcc.copy(), max_samples=8)
+        assert swath_fraction == 1.0
+        assert 0 < grid_fraction < 1.0
+
+    def test_lcc_outside(self):
+        lon_arr = create_test_longitude(-15.0, 15.0, (50, 100))
+        lat_arr = create_test_latitude(18.0, 40.0, (50, 100))
+        assert ll2cr.footprint_coverage(lon_arr, lat_arr, static_lcc.copy()) == (0, 0)
+
+    def test_lcc_partial_upper_bound(self):
+        lon_arr = create_test_longitude(-95.0, -75.0, (50, 100), dtype=numpy.float64)
+        lat_arr = create_test_latitude(18.0, 40.0, (50, 100), dtype=numpy.float64)
+        grid_info = static_lcc.copy()
+        grid_info["width"] = 2500
+        grid_info["height"] = 4000
+        swath_fraction, grid_fraction = ll2cr.footprint_coverage(lon_arr, lat_arr, grid_info, max_samples=8)
+        points_in_grid, _, _ = ll2cr.ll2cr(lon_arr, lat_arr, grid_info)
+        assert 0 < points_in_grid < lon_arr.size
+        assert points_in_grid / float(lon_arr.size) <= swath_fraction < 1.0
+
+
 def main():
     import os
     return pytest.main([os.path.dirname(os.path.realpath(__file__))])
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+# Copyright (C) 2018 Space Science and Engineering Center (SSEC),
+# University of Wisconsin-Madison.
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# This file is part of the polar2grid software package. Polar2grid takes
+# satellite observation data, remaps it, and writes it to a file format for
+# input into another program.
+# Documentation: http://www.ssec.wisc.edu/software/polar2grid/
+#
+#     Written by David Hoese    November 2018
+#     University of Wisconsin-Madison
+#     Space Science and Engineering Center
+#     1225 West Dayton Street
+#     Madison, WI  53706
+#     david.hoese@ssec.wisc.edu
+"""Test the grid based nearest neighbor search.
+
+:author:       David Hoese (davidh)
+:contact:      david.hoese@ssec.wisc.edu
+:organization: Space Science and Engineering Center (SSEC)
+:copyright:    Copyright (c) 2018 University of Wisconsin SSEC. All rights reserved.
+:date:         Nov 2018
+:license:      GNU GPLv3
+
+"""
+__docformat__ = "restructuredtext en"
+
+import sys
+
+import logging
+import numpy
+import pytest
+from scipy.spatial import cKDTree
+
+from polar2grid.remap.nearest import grid_nearest_index, NearestResamplePlan
+
+LOG = logging.getLogger(__name__)
+
+
+def kdtree_nearest_index(cols, rows, grid_shape, distance_upper_bound):
+    grid_y, grid_x = numpy.mgrid[:grid_shape[0], :grid_shape[1]]
+    tree = cKDTree(numpy.column_stack((cols, rows)))
+    xi = numpy.dstack((grid_x, grid_y))
+    return tree.query(xi, distance_upper_bound=distance_upper_bound)[1]
+
+
+class TestGridNearestIndex(object):
+    @pytest.mark.parametrize("distance_upper_bound", [0.7, 1.5, 3.0])
+    def test_matches_kdtree(self, distance_upper_bound):
+        rs = numpy.random.RandomState(42)
+        grid_shape = (40, 60)
+        # include points outside of the grid that can still be the nearest to edge cells
+        cols = rs.uniform(-3.0, 63.0, 1500)
+        rows = rs.uniform(-3.0, 43.0, 1500)
+        expected = kdtree_nearest_index(cols, rows, grid_shape, distance_upper_bound)
+        result = grid_nearest_index(cols, rows, grid_shape, distance_upper_bound)
+        numpy.testing.assert_array_equal(result, expected)
+
+    def test_float32_input(self):
+        rs = numpy.random.RandomState(0)
+        cols = rs.uniform(0.0, 20.0, 200).astype(numpy.float32)
+        rows = rs.uniform(0.0, 10.0, 200).astype(numpy.float32)
+        expected = kdtree_nearest_index(cols.astype(numpy.float64), rows.astype(numpy.float64), (10, 20), 2.0)
+        numpy.testing.assert_array_equal(grid_nearest_index(cols, rows, (10, 20), 2.0), expected)
+
+    def test_read_only_input(self):
+        rs = numpy.random.RandomState(0)
+        cols = rs.uniform(0.0, 20.0, 200)
+        rows = rs.uniform(0.0, 10.0, 200)
+        expected = grid_nearest_index(cols, rows, (10, 20), 2.0)
+        cols.flags.writeable = False
+        rows.flags.writeable = False
+        numpy.testing.assert_array_equal(grid_nearest_index(cols, rows, (10, 20), 2.0), expected)
+
+
+class TestNearestResamplePlan(object):
+    def _create_plan(self):
+        rs = numpy.random.RandomState(1)
+        swath_shape = (30, 40)
+        cols = rs.uniform(0.0, 20.0, swath_shape)
+        rows = rs.uniform(0.0, 10.0, swath_shape)
+        good_mask = (rs.uniform(size=swath_shape) > 0.2).ravel()
+        index = grid_nearest_index(cols.ravel()[good_mask], rows.ravel()[good_mask], (10, 20), 1.0)
+        return NearestResamplePlan.from_index(index, good_mask), index, good_mask
+
+    def test_resample_matches_fancy_index(self):
+        plan, index, good_mask = self._create_plan()
+        data = numpy.arange(30 * 40, dtype=numpy.float32).reshape((30, 40))
+        expected = numpy.append(data.ravel()[good_mask], numpy.float32(-999.0))[index]
+        out = numpy.zeros((10, 20), dtype=numpy.float32)
+        result = plan.resample(data, -999.0, out=out)
+        assert result is out
+        numpy.testing.assert_array_equal(out, expected)
+        assert plan.num_valid == numpy.count_nonzero(expected != -999.0)
+
+    def test_save_load(self, tmpdir):
+        plan, index, good_mask = self._create_plan()
+        plan_fn = str(tmpdir.join("plan.tmp"))
+        plan.save(plan_fn)
+        loaded_plan = NearestResamplePlan.load(plan_fn)
+        assert loaded_plan.grid_shape == plan.grid_shape
+        data = numpy.arange(30 * 40, dtype=numpy.int16)
+        numpy.testing.assert_array_equal(loaded_plan.resample(data, 0), plan.resample(data, 0))
+
+
+def main():
+    import os
+    return pytest.main([os.path.dirname(os.path.realpath(__file__))])
+
+
+if __name__ == "__main__":
+    sys.exit(main())
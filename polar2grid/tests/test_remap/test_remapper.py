@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+# Copyright (C) 2018 Space Science and Engineering Center (SSEC),
+# University of Wisconsin-Madison.
+#
+#     This program is free software: you can redistribute it and/or modify
+#     it under the terms of the GNU General Public License as published by
+#     the Free Software Foundation, either version 3 of the License, or
+#     (at your option) any later version.
+#
+#     This program is distributed in the hope that it will be useful,
+#     but WITHOUT ANY WARRANTY; without even the implied warranty of
+#     MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#     GNU General Public License for more details.
+#
+#     You should have received a copy of the GNU General Public License
+#     along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# This file is part of the polar2grid software package. Polar2grid takes
+# satellite observation data, remaps it, and writes it to a file format for
+# input into another program.
+# Documentation: http://www.ssec.wisc.edu/software/polar2grid/
+#
+#     Written by David Hoese    November 2018
+#     University of Wisconsin-Madison
+#     Space Science and Engineering Center
+#     1225 West Dayton Street
+#     Madison, WI  53706
+#     david.hoese@ssec.wisc.edu
+"""Test the Remapper's handling of intermediate results.
+
+:author:       David Hoese (davidh)
+:contact:      david.hoese@ssec.wisc.edu
+:organization: Space Science and Engineering Center (SSEC)
+:copyright:    Copyright (c) 2018 University of Wisconsin SSEC. All rights reserved.
+:date:         Nov 2018
+:license:      GNU GPLv3
+
+"""
+__docformat__ = "restructuredtext en"
+
+import sys
+
+import gc
+import logging
+import os
+
+import numpy
+import pytest
+
+from polar2grid.core.containers import SwathProduct, GridDefinition
+from polar2grid.remap import ll2cr
+from polar2grid.remap.remap import Remapper
+from polar2grid.tests.test_remap import create_test_swath_scene
+
+LOG = logging.getLogger(__name__)
+
+
+class TestInMemoryRemapping(object):
+    @pytest.mark.parametrize("method", ["ewa", "nearest_grid", "bilinear"])
+    def test_matches_files(self, tmpdir, monkeypatch, method):
+        # products left in reference cycles by earlier tests remove their (relative) files when collected
+        gc.collect()
+        monkeypatch.chdir(tmpdir)
+        swath_scene = create_test_swath_scene(".")
+        kwargs = dict(remap_method=method, grid_coverage=0, distance_upper_bound=2.0)
+        file_scene = Remapper(keep_intermediate=True).remap_scene(swath_scene, "wgs84_fit", **kwargs)
+        intermediate_files = sorted(os.listdir(str(tmpdir)))
+
+        memory_scene = Remapper(in_memory=True).remap_scene(swath_scene, "wgs84_fit", **kwargs)
+        # nothing else was written
+        assert sorted(os.listdir(str(tmpdir))) == intermediate_files
+        for product_name in ("p1", "p2"):
+            grid_data = memory_scene[product_name]["grid_data"]
+            assert isinstance(grid_data, numpy.ndarray) and not isinstance(grid_data, numpy.memmap)
+            numpy.testing.assert_array_equal(grid_data, file_scene[product_name].get_data_array())
+
+    def test_memory_limit(self, tmpdir, monkeypatch):
+        monkeypatch.chdir(tmpdir)
+        swath_scene = create_test_swath_scene(".")
+        # the ll2cr results (40000 bytes) fit but the gridded data does not
+        gridded_scene = Remapper(in_memory=True, in_memory_size=50000 / 1024. ** 3).remap_scene(
+            swath_scene, "wgs84_fit", remap_method="nearest_grid", grid_coverage=0)
+        assert not any(fn.startswith("ll2cr_") for fn in os.listdir(str(tmpdir)))
+        for product_name in ("p1", "p2"):
+            assert os.path.isfile(gridded_scene[product_name]["grid_data"])
+
+
+class TestEWAMixedTypes(object):
+    def test_fill_values(self, tmpdir, monkeypatch):
+        monkeypatch.chdir(tmpdir)
+        swath_scene = create_test_swath_scene(".")
+        p1 = swath_scene["p1"]
+        shape = (p1["swath_rows"], p1["swath_columns"])
+        (numpy.arange(shape[0] * shape[1]) % 100).astype(numpy.int8).reshape(shape).tofile("swath_cat.dat")
+        swath_scene["cat"] = SwathProduct(
+            product_name="cat", satellite="s", instrument="i", begin_time=p1["begin_time"], end_time=p1["end_time"],
+            data_type=numpy.int8, swath_data="swath_cat.dat", swath_definition=p1["swath_definition"],
+            fill_value=127, swath_rows=shape[0], swath_columns=shape[1])
+        remapper = Remapper()
+        # larger than the swath so the grid has fill pixels
+        remapper.grid_manager.add_proj4_grid_info("test_grid", "+proj=latlong +datum=WGS84 +no_defs",
+                                                  "100", "100", "0.3", "-0.3", "-100.0deg", "45.0deg")
+        gridded_scene = remapper.remap_scene(swath_scene, "test_grid", remap_method="ewa", grid_coverage=0)
+        assert numpy.isnan(gridded_scene["p1"]["fill_value"])
+        assert gridded_scene["cat"]["fill_value"] == 127
+        cat_data = gridded_scene["cat"].get_data_array()
+        assert cat_data.dtype == numpy.int8
+        mask = gridded_scene["cat"].get_data_mask()
+        assert 0 < mask.sum() < mask.size
+        numpy.testing.assert_array_equal(mask, cat_data == 127)
+
+
+class TestSharedProjection(object):
+    def test_grids_in_same_projection(self, tmpdir, monkeypatch):
+        monkeypatch.chdir(tmpdir)
+        swath_def = create_test_swath_scene(".")["p1"]["swath_definition"]
+        grid_defs = [GridDefinition(grid_name="test_lcc%d" % (idx,),
+                                    proj4_definition="+proj=lcc +a=6371200 +b=6371200 +lat_0=25 +lat_1=25 "
+                                                     "+lon_0=-95 +units=m +no_defs",
+                                    width=1000, height=1000, origin_x=origin_x, origin_y=1500000.0,
+                                    cell_width=cell_size, cell_height=-cell_size)
+                     for idx, (origin_x, cell_size) in enumerate(((-500000.0, 2000.0), (0.0, 1000.0), (0.0, 2500.0)))]
+        expected = []
+        for grid_def in grid_defs:
+            remapper = Remapper(in_memory=True)
+            expected.append([arr.copy() for arr in remapper.run_ll2cr(swath_def, grid_def)])
+
+        projected = []
+        orig_project_swath = ll2cr.project_swath
+
+        def _project_swath(*args, **kwargs):
+            projected.append(args)
+            return orig_project_swath(*args, **kwargs)
+        monkeypatch.setattr(ll2cr, "project_swath", _project_swath)
+        remapper = Remapper(in_memory=True)
+        for grid_def, (exp_cols, exp_rows) in zip(grid_defs, expected):
+            cols_arr, rows_arr = remapper.run_ll2cr(swath_def, grid_def)
+            numpy.testing.assert_array_equal(cols_arr, exp_cols)
+            numpy.testing.assert_array_equal(rows_arr, exp_rows)
+        # projected by ll2cr for the first grid and kept for the others
+        assert len(projected) == 1
+
+
+def main():
+    return pytest.main([os.path.dirname(os.path.realpath(__file__))])
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -54,39 +54,67 @@ from polar2grid.readers import normalize_satellite_name
 
 LOG = logging.getLogger(__name__)
 ORBIT_TRANSITION_THRESHOLD = timedelta(seconds=10)
+# number of threads used to open input files
+DEFAULT_OPEN_THREADS = int(os.getenv("P2G_OPEN_THREADS", 8))
 
 
 class HDF5Reader(object):
     """Generic HDF5 reading class.
+
+    Variables and attributes are looked up in the file the first time they
+    are requested instead of walking the entire file when it is opened. Keys
+    are variable paths (``All_Data/VIIRS-M1-SDR_All/Radiance``), variable
+    attributes (``<variable path>.<attribute name>``), or global attributes
+    (``.<attribute name>``). Where each key was found (or that it wasn't) is
+    remembered so every key is only looked up in the file once.
     """
     def __init__(self, filename):
         self.filename = os.path.basename(filename)
         self.filepath = os.path.realpath(filename)
         self._h5_handle = h5py.File(filename, 'r')
+        # resolved items for this file
         self.file_items = {}
-        self._h5_handle.visititems(self._visit_items)
-        # Also add the global attributes
-        for attr_name, attr_val in self._h5_handle.attrs.items():
-            try:    
-                self.file_items["." + attr_name] = attr_val[0][0]
-            except TypeError:
-                self.file_items["." + attr_name] = attr_val[0]        
-
-    def _visit_items(self, name, obj):
-        """Look at each variable in the HDF file and record its attributes.
-
-        We also store the variable name because sometimes h5py gives you an
-        unhelpful/weird KeyError if it doesn't have that key.
-        """
-        self.file_items[name] = obj
-        for attr_name, attr_obj in obj.attrs.items():
-            self.file_items[name + "." + attr_name] = attr_obj
+        # key -> (variable path, attribute name), None if the key is not in this file
+        self._locations = {}
+
+    def _find(self, key):
+        if key in self._h5_handle:
+            return key, None
+        if "." not in key:
+            return None
+        var_path, attr_name = key.rsplit(".", 1)
+        if var_path and var_path not in self._h5_handle:
+            return None
+        obj = self._h5_handle[var_path] if var_path else self._h5_handle
+        return (var_path, attr_name) if attr_name in obj.attrs else None
+
+    def _resolve(self, key):
+        """Split `key` in to (variable path, attribute name), None if the key is not in this file."""
+        if key not in self._locations:
+            self._locations[key] = self._find(key)
+        return self._locations[key]
+
+    def _load_item(self, key):
+        location = self._resolve(key)
+        if location is None:
+            raise KeyError(key)
+        var_path, attr_name = location
+        if attr_name is None:
+            return self._h5_handle[var_path]
+        if var_path:
+            return self._h5_handle[var_path].attrs[attr_name]
+        # global attributes
+        attr_val = self._h5_handle.attrs[attr_name]
+        try:
+            return attr_val[0][0]
+        except TypeError:
+            return attr_val[0]
 
     def __contains__(self, key):
         if key.startswith("/"):
             key = key[1:]
 
-        return key in self.file_items
+        return key in self.file_items or self._resolve(key) is not None
 
     def __getitem__(self, key):
         """Get HDF5 variable, making it easier to access attributes.
@@ -94,6 +122,8 @@ class HDF5Reader(object):
         if key.startswith("/"):
             key = key[1:]
 
+        if key not in self.file_items:
+            self.file_items[key] = self._load_item(key)
         return self.file_items[key]
 
 
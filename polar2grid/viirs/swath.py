@@ -204,13 +204,14 @@ import sys
 import logging
 import numpy
 import os
+from concurrent.futures import ThreadPoolExecutor
 from scipy.special import erf
 
 from polar2grid.core import containers, histogram, roles
 from polar2grid.core.frontend_utils import ProductDict, GeoPairDict
 from . import guidebook
 # FIXME: Actually use the Geo Readers
-from .io import VIIRSSDRMultiReader, HDF5Reader
+from .io import VIIRSSDRMultiReader, HDF5Reader, DEFAULT_OPEN_THREADS
 from .prescale import adaptive_dnb_scale, dnb_scale
 
 LOG = logging.getLogger(__name__)
@@ -544,14 +545,11 @@ class Frontend(roles.FrontendRole):
             self.file_readers[file_type] = cls(file_type_info)
         # Don't modify the passed list (we use in place operations)
         file_paths_left = []
-        for fp in file_paths:
-            h = HDF5Reader(fp)
-            for data_path, file_type in guidebook.DATA_PATHS.items():
-                if data_path in h:
-                    self.file_readers[file_type].add_file(h)
-                    break
-            else:
+        for fp, h, file_type in self._classify_files(file_paths):
+            if file_type is None:
                 file_paths_left.append(fp)
+            else:
+                self.file_readers[file_type].add_file(h)
 
         # Log what files we were given that we didn't understand
         for fp in file_paths_left:
@@ -575,6 +573,26 @@ class Frontend(roles.FrontendRole):
             LOG.debug("File types and number of files:\n\t%s", ft_str)
             raise RuntimeError("Corrupt directory: Varying number of files for each type")
 
+    @staticmethod
+    def _classify_file(fp):
+        h = HDF5Reader(fp)
+        for data_path, file_type in guidebook.DATA_PATHS.items():
+            if data_path in h:
+                return fp, h, file_type
+        return fp, h, None
+
+    def _classify_files(self, file_paths, num_threads=DEFAULT_OPEN_THREADS):
+        """Open each file and find its file type using a pool of threads.
+
+        :returns: list of (filepath, HDF5Reader, file type or None) in the same order as `file_paths`
+        """
+        file_paths = list(file_paths)
+        num_threads = max(1, min(num_threads, len(file_paths)))
+        if num_threads == 1:
+            return [self._classify_file(fp) for fp in file_paths]
+        with ThreadPoolExecutor(max_workers=num_threads) as executor:
+            return list(executor.map(self._classify_file, file_paths))
+
     @property
     def begin_time(self):
         return self.file_readers[next(iter(self.file_readers))].begin_time
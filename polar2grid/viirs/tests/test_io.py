@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# encoding: utf-8
+# Copyright (C) 2018 Space Science and Engineering Center (SSEC),
+# University of Wisconsin-Madison.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+#
+# This file is part of the polar2grid software package. Polar2grid takes
+# satellite observation data, remaps it, and writes it to a file format for
+#     input into another program.
+# Documentation: http://www.ssec.wisc.edu/software/polar2grid/
+#
+# Written by David Hoese    November 2018
+# University of Wisconsin-Madison
+# Space Science and Engineering Center
+# 1225 West Dayton Street
+# Madison, WI  53706
+# david.hoese@ssec.wisc.edu
+"""Test the VIIRS HDF5 file reader.
+
+:author:       David Hoese (davidh)
+:contact:      david.hoese@ssec.wisc.edu
+:organization: Space Science and Engineering Center (SSEC)
+:copyright:    Copyright (c) 2018 University of Wisconsin SSEC. All rights reserved.
+:date:         Nov 2018
+:license:      GNU GPLv3
+
+"""
+__docformat__ = "restructuredtext en"
+
+import os
+
+import h5py
+import numpy
+import pytest
+
+from polar2grid.viirs.io import HDF5Reader
+
+
+def _create_sdr_file(filename, band="1"):
+    with h5py.File(filename, "w") as h5_file:
+        h5_file.attrs["Platform_Short_Name"] = numpy.array([[b"NPP"]])
+        aggr = h5_file.create_dataset("Data_Products/VIIRS-M{0}-SDR/VIIRS-M{0}-SDR_Aggr".format(band), data=[0])
+        aggr.attrs["AggregateBeginningDate"] = numpy.array([[b"20181101"]])
+        h5_file.create_dataset("All_Data/VIIRS-M{}-SDR_All/Radiance".format(band), data=numpy.ones((4, 4)))
+
+
+class TestHDF5Reader(object):
+    def test_lookup(self, tmpdir):
+        fn = str(tmpdir.join("SVM01_npp.h5"))
+        _create_sdr_file(fn)
+        h = HDF5Reader(fn)
+        assert h[".Platform_Short_Name"] == b"NPP"
+        assert h["/Data_Products/VIIRS-M1-SDR/VIIRS-M1-SDR_Aggr.AggregateBeginningDate"][0][0] == b"20181101"
+        assert h["All_Data/VIIRS-M1-SDR_All/Radiance"][:].sum() == 16
+        assert "/All_Data/VIIRS-M1-SDR_All/Radiance" in h
+        assert "All_Data/VIIRS-M2-SDR_All/Radiance" not in h
+        assert "All_Data/VIIRS-M1-SDR_All/Radiance.missing" not in h
+        assert ".missing" not in h
+        with pytest.raises(KeyError):
+            h["All_Data/VIIRS-M2-SDR_All/Radiance"]
+
+    def test_lookups_cached(self, tmpdir):
+        fn = str(tmpdir.join("SVM01_npp.h5"))
+        _create_sdr_file(fn)
+        h = HDF5Reader(fn)
+        assert "All_Data/VIIRS-M1-SDR_All/Radiance" in h
+        assert "All_Data/VIIRS-M2-SDR_All/Radiance" not in h
+        assert ".Platform_Short_Name" in h
+        # the file isn't searched again for keys that were already looked up
+        h._h5_handle.close()
+        assert "All_Data/VIIRS-M1-SDR_All/Radiance" in h
+        assert "All_Data/VIIRS-M2-SDR_All/Radiance" not in h
+        assert ".Platform_Short_Name" in h
+
+
+class TestClassifyFiles(object):
+    @pytest.mark.parametrize("num_threads", [1, 4])
+    def test_order_and_unknown_files(self, tmpdir, monkeypatch, num_threads):
+        from polar2grid.viirs import guidebook
+        from polar2grid.viirs.swath import Frontend
+        monkeypatch.setattr(guidebook, "DATA_PATHS", {"All_Data/VIIRS-M1-SDR_All/Radiance": "m01",
+                                                      "All_Data/VIIRS-M2-SDR_All/Radiance": "m02"})
+        file_types = ["m01", None, "m02", "m01", None, "m02", "m01"]
+        file_paths = []
+        for idx, file_type in enumerate(file_types):
+            fn = str(tmpdir.join("file%d.h5" % (idx,)))
+            if file_type is None:
+                with h5py.File(fn, "w") as h5_file:
+                    h5_file.create_dataset("All_Data/OTHER_All/Radiance", data=[0])
+            else:
+                _create_sdr_file(fn, band=file_type[-1])
+            file_paths.append(fn)
+
+        results = Frontend._classify_files(Frontend.__new__(Frontend), file_paths, num_threads=num_threads)
+        assert [fp for fp, _, _ in results] == file_paths
+        assert [file_type for _, _, file_type in results] == file_types
+        assert all(isinstance(h, HDF5Reader) and h.filepath == os.path.realpath(fp) for fp, h, _ in results)
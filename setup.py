@@ -40,13 +40,21 @@ http://www.ssec.wisc.edu/software/polar2grid/
 """
 __docformat__ = "restructuredtext en"
 import os
+import sys
 from setuptools import setup, find_packages, Command
 from distutils.extension import Extension
 import numpy
 
+# OpenMP is used for multi-threaded remapping, the default compiler on OSX doesn't support it
+# so the extensions will run single threaded there
+openmp_args = [] if sys.platform == "darwin" else ["-fopenmp"]
+
 extensions = [
     Extension("polar2grid.remap._ll2cr", sources=["polar2grid/remap/_ll2cr.pyx"], extra_compile_args=["-O3", "-Wno-unused-function"]),
-    Extension("polar2grid.remap._fornav", sources=["polar2grid/remap/_fornav.pyx", "polar2grid/remap/_fornav_templates.cpp"], language="c++", extra_compile_args=["-O3", "-Wno-unused-function"])
+    Extension("polar2grid.remap._nearest", sources=["polar2grid/remap/_nearest.pyx"], extra_compile_args=["-O3", "-Wno-unused-function"]),
+    Extension("polar2grid.remap._bilinear", sources=["polar2grid/remap/_bilinear.pyx"], extra_compile_args=["-O3", "-Wno-unused-function"]),
+    Extension("polar2grid.remap._fornav", sources=["polar2grid/remap/_fornav.pyx", "polar2grid/remap/_fornav_templates.cpp"], language="c++",
+              extra_compile_args=["-O3", "-Wno-unused-function"] + openmp_args, extra_link_args=openmp_args)
 ]
 
 try:
@@ -122,6 +130,7 @@ extras_require = {
     "utils": ["matplotlib"],
     "docs": ["sphinx", "rst2pdf"],
     "coastlines": ["pycoast", "pydecorate"],
+    "msgpack": ["msgpack"],
     # Frontends (included separately):
     "viirs_sdr": ['h5py'],
     'modis_l1b': ['pyhdf'],